@@ -15,7 +15,7 @@ setup(
     ],
     install_requires=[
         "bs4", "matplotlib", "numpy", "pydub", "scipy", "selenium",
-        "sqlalchemy", "youtube-dl",
+        "sqlalchemy>=1.4", "youtube-dl",
     ],
     entry_points={
         "console_scripts": [
@@ -0,0 +1,78 @@
+import hashlib
+
+import pytest
+import sqlalchemy
+
+from youtube_audio_matcher.audio import align_matches
+from youtube_audio_matcher.database import Database
+from youtube_audio_matcher.database.database import (
+    OFFSET_HOP_SIZE, OFFSET_SAMPLE_RATE
+)
+
+
+def _hash(i):
+    return hashlib.sha1(str(i).encode()).hexdigest()
+
+
+def test_top_k_ranks_songs_not_bins(tmp_path):
+    hop = OFFSET_HOP_SIZE / OFFSET_SAMPLE_RATE
+    # Song 1 matches the query at two relative offsets (100 and 80
+    # fingerprints); song 2 matches 50 fingerprints at one offset.
+    query = [(_hash(i), i) for i in range(180)]
+    song1 = [(_hash(i), (i + 10) * hop) for i in range(100)] + [
+        (_hash(i), (i + 50) * hop) for i in range(100, 180)
+    ]
+    song2 = [(_hash(i), (i + 30) * hop) for i in range(50)]
+
+    db = Database(
+        user=None, password=None, db_name=str(tmp_path / "yam.db"),
+        dialect="sqlite"
+    )
+    db.add_songs(
+        [
+            {"title": "song1", "fingerprints": song1},
+            {"title": "song2", "fingerprints": song2},
+        ]
+    )
+
+    [candidates] = db.query_matches([query], offset_bin_size=hop, top_k=2)
+    assert [
+        (candidate["song_id"], candidate["num_matching_fingerprints"])
+        for candidate in candidates
+    ] == [(1, 100), (2, 50)]
+    assert candidates[0]["relative_offset"] == 10 * hop
+
+    best = align_matches(
+        [{"hash": hash_, "offset": offset} for hash_, offset in query],
+        db.query_fingerprints([hash_ for hash_, _ in query]),
+        offset_bin_size=hop, offset_unit=db.query_offset_unit()
+    )
+    assert best["song_id"] == candidates[0]["song_id"]
+    assert best["num_matching_fingerprints"] == 100
+
+
+def test_failed_query_error_not_masked(tmp_path):
+    db = Database(
+        user=None, password=None, db_name=str(tmp_path / "yam.db"),
+        dialect="sqlite"
+    )
+    db.add_songs([{"title": "song", "fingerprints": [(_hash(0), 0.0)]}])
+
+    # Fail the join (as e.g. a PostgreSQL statement timeout would, aborting
+    # the transaction), after which the temporary table can't be dropped.
+    statements = []
+
+    def fail_join(conn, cursor, statement, *args):
+        statements.append(statement)
+        if "row_number" in statement.lower():
+            raise RuntimeError("join failed")
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", fail_join)
+    try:
+        with pytest.raises(RuntimeError, match="join failed"):
+            db.query_matches([[(_hash(0), 0)]])
+    finally:
+        sqlalchemy.event.remove(
+            db.engine, "before_cursor_execute", fail_join
+        )
+    assert not any(s.lstrip().startswith("DROP") for s in statements)
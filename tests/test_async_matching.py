@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from youtube_audio_matcher import (
+    match_fingerprints_batch, match_fingerprints_batch_async
+)
+from youtube_audio_matcher.database import AsyncDatabase, Database
+
+
+def _song(title, seed):
+    return {
+        "title": title,
+        "fingerprints": [
+            (f"{seed:04x}{i:04x}", i * 0.1) for i in range(10)
+        ],
+    }
+
+
+def _queries():
+    queries = []
+    for seed in range(3):
+        query = _song(None, seed)
+        query["path"] = f"query{seed}"
+        query["filehash"] = f"file{seed}"
+        queries.append(query)
+    return queries
+
+
+@pytest.fixture
+def db_kwargs(tmp_path):
+    return dict(
+        user=None, password=None, db_name=str(tmp_path / "yam.db"),
+        dialect="sqlite"
+    )
+
+
+@pytest.mark.parametrize("match_kwargs", [
+    {},
+    {"max_hash_frequency": 0.9},
+    {"match_strategy": "sql"},
+    {"use_cache": True},
+])
+def test_async_matches_sync(db_kwargs, match_kwargs):
+    Database(**db_kwargs).add_songs([_song("a", 0), _song("b", 1)])
+
+    async def match(songs):
+        db = AsyncDatabase(**db_kwargs)
+        try:
+            return await match_fingerprints_batch_async(
+                songs, db, asyncio.get_running_loop(), **match_kwargs
+            )
+        finally:
+            await db.dispose()
+
+    expected = match_fingerprints_batch(_queries(), db_kwargs, **match_kwargs)
+    songs = asyncio.run(match(_queries()))
+    assert [song.get("matching_song") for song in songs] == [
+        song.get("matching_song") for song in expected
+    ]
+    assert expected[0]["matching_song"]["title"] == "a"
+    assert expected[1]["matching_song"]["title"] == "b"
+    assert "matching_song" not in expected[2]
+
+    # The async version uses the results the sync version cached.
+    if match_kwargs.get("use_cache"):
+        assert asyncio.run(match(_queries())) == songs
+
+
+def test_run_sync_database_attributes(db_kwargs):
+    db = Database(**db_kwargs)
+
+    async def sync_database():
+        async_db = AsyncDatabase(**db_kwargs)
+        try:
+            return async_db._sync_database(None)
+        finally:
+            await async_db.dispose()
+
+    assert set(vars(asyncio.run(sync_database()))) == set(vars(db))
@@ -0,0 +1,30 @@
+from youtube_audio_matcher.database import BloomFilter
+from youtube_audio_matcher.database.bloom import rebuild_bloom_filter
+
+
+def test_add_after_rebuild_reaches_new_file(tmp_path):
+    path = str(tmp_path / "hashes.bloom")
+    stale = BloomFilter.create(path, capacity=1000)
+    stale.add(["aaaa"])
+
+    rebuild_bloom_filter(path, [["bbbb"]], capacity=5000)
+    stale.add(["cccc"])
+
+    rebuilt = BloomFilter(path)
+    assert rebuilt.capacity == 5000
+    assert "bbbb" in rebuilt
+    assert "cccc" in rebuilt
+    assert "cccc" in stale
+
+
+def test_readd_after_rebuild(tmp_path):
+    path = str(tmp_path / "hashes.bloom")
+    bloom_filter = BloomFilter.create(path, capacity=1000)
+    generation = bloom_filter.add(["aaaa"])
+    bloom_filter.readd(["aaaa"], generation)
+    assert bloom_filter.num_items == 1
+
+    # The rebuild didn't see the (uncommitted) hash.
+    rebuild_bloom_filter(path, [["bbbb"]], capacity=1000)
+    bloom_filter.readd(["aaaa"], generation)
+    assert "aaaa" in BloomFilter(path)
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+import sqlalchemy
+
+from youtube_audio_matcher.database import AsyncDatabase, Database
+
+
+def _database(tmp_path):
+    return Database(
+        user=None, password=None, db_name=str(tmp_path / "yam.db"),
+        dialect="sqlite"
+    )
+
+
+def _song(seed):
+    return {
+        "title": f"song{seed}",
+        "fingerprints": [(f"{seed:04x}{i:04x}", i * 0.1) for i in range(10)],
+    }
+
+
+def test_version_bumped_last(tmp_path):
+    db = _database(tmp_path)
+    [song_id] = db.add_songs([_song(0)])
+    statements = []
+    sqlalchemy.event.listen(
+        db.engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+
+    version = db.query_content_version()
+    db.add_fingerprints(song_id, _song(1)["fingerprints"])
+    assert db.query_content_version() == version + 1
+
+    # Rows updated by every writer (the content version and the frequencies
+    # of common hashes) are only locked once the fingerprints are written.
+    writes = [
+        statement.split("(")[0] for statement in statements
+        if statement.startswith(("INSERT", "UPDATE", "DELETE"))
+    ]
+    tables = [
+        "fingerprint" if "fingerprint " in write
+        else "hash_frequency" if "hash_frequency" in write
+        else "database_info" if "database_info" in write
+        else None
+        for write in writes
+    ]
+    assert tables[-1] == "database_info"
+    assert tables.count("database_info") == 1
+    assert tables.index("hash_frequency") > tables.index("fingerprint")
+
+
+def test_version_unchanged_on_failure(tmp_path, monkeypatch):
+    db = _database(tmp_path)
+    version = db.query_content_version()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(db, "_insert_fingerprints", fail)
+    with pytest.raises(RuntimeError):
+        db.add_songs([_song(0)])
+    assert db.query_content_version() == version
+    assert db.count_songs() == 0
+
+
+def test_async_version_bumped(tmp_path):
+    async def add_songs():
+        db = AsyncDatabase(
+            user=None, password=None, db_name=str(tmp_path / "yam.db"),
+            dialect="sqlite"
+        )
+        try:
+            version = await db.query_content_version()
+            await db.add_songs([_song(0)])
+            await db.add_fingerprints(1, [("ffff0000", 1.0)])
+            return version, await db.query_content_version()
+        finally:
+            await db.dispose()
+
+    version, new_version = asyncio.run(add_songs())
+    assert new_version == version + 2
@@ -0,0 +1,30 @@
+import gc
+
+import pytest
+
+from youtube_audio_matcher.database import Database
+from youtube_audio_matcher.database.database import _get_database_url
+
+
+def test_sqlite_without_credentials(tmp_path):
+    db = Database(db_name=str(tmp_path / "yam.db"), dialect="sqlite")
+    assert db.count_songs() == 0
+
+
+def test_missing_db_name(recwarn):
+    with pytest.raises(ValueError):
+        Database(dialect="sqlite")
+    gc.collect()
+    assert not [w for w in recwarn if "__del__" in str(w.message)]
+
+
+@pytest.mark.parametrize("user, password, credentials", [
+    ("yam", "secret", "yam:secret@"),
+    ("yam", None, "yam@"),
+    (None, None, ""),
+])
+def test_postgresql_credentials(user, password, credentials):
+    url = _get_database_url(
+        user, password, "yam", "localhost", None, "postgresql", None
+    )
+    assert url == f"postgresql://{credentials}localhost/yam"
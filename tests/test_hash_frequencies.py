@@ -0,0 +1,110 @@
+import hashlib
+
+import pytest
+
+from youtube_audio_matcher import match_fingerprints_batch
+from youtube_audio_matcher.database import Database, HashFrequency
+
+
+def _hash(value):
+    return hashlib.sha1(str(value).encode("utf-8")).hexdigest()[:20]
+
+
+COMMON = _hash("common")
+
+
+def _song(seed, hashes=()):
+    hashes = [_hash(f"{seed}-{i}") for i in range(5)] + list(hashes)
+    return {
+        "title": f"song{seed}",
+        "fingerprints": [(hash_, i * 0.1) for i, hash_ in enumerate(hashes)],
+    }
+
+
+def _database(tmp_path, sharded=False):
+    shard_urls = None
+    if sharded:
+        shard_urls = [
+            f"sqlite:///{tmp_path / f'shard{i}.db'}" for i in range(3)
+        ]
+    return Database(
+        user=None, password=None, db_name=str(tmp_path / "yam.db"),
+        dialect="sqlite", shard_urls=shard_urls
+    )
+
+
+def _frequencies(db):
+    return dict(
+        db.session.query(HashFrequency.hash, HashFrequency.num_songs).all()
+    )
+
+
+def _assert_matches_rebuild(db):
+    maintained = _frequencies(db)
+    db.rebuild_hash_frequencies()
+    assert maintained == _frequencies(db)
+
+
+@pytest.mark.parametrize("sharded", [False, True])
+def test_frequencies_maintained(tmp_path, sharded):
+    db = _database(tmp_path, sharded=sharded)
+    db.add_songs([_song(0, [COMMON]), _song(1)])
+    db.rebuild_hash_frequencies()
+
+    song_ids = db.add_songs([_song(i, [COMMON]) for i in range(2, 5)])
+    assert db.query_hash_frequencies(COMMON) == {COMMON: 4}
+    _assert_matches_rebuild(db)
+
+    # Fingerprints added to an existing song only count new hashes.
+    db.add_fingerprints(song_ids[0], [(COMMON, 1.0), (_hash("new"), 1.0)])
+    assert db.query_hash_frequencies([COMMON, _hash("new")]) == {
+        COMMON: 4, _hash("new"): 1
+    }
+    _assert_matches_rebuild(db)
+
+    # Refingerprinted songs' old hashes are replaced by their new ones.
+    db.replace_fingerprints(
+        [
+            {"id": song_id, **_song(i + 10), "num_peaks": 10}
+            for i, song_id in enumerate(song_ids)
+        ],
+        profile_id=None
+    )
+    assert db.query_hash_frequencies([COMMON, _hash("new")]) == {COMMON: 1}
+    _assert_matches_rebuild(db)
+
+
+def test_imported_frequencies(tmp_path):
+    db = _database(tmp_path)
+    db.add_songs([_song(i, [COMMON]) for i in range(3)])
+    fpath = tmp_path / "export.ndjson"
+    db.export_ndjson(str(fpath), batch_size=4)
+
+    other = Database(
+        user=None, password=None, db_name=str(tmp_path / "other.db"),
+        dialect="sqlite"
+    )
+    other.import_ndjson(str(fpath))
+    other.import_ndjson(str(fpath))
+    assert other.query_hash_frequencies(COMMON) == {COMMON: 6}
+    _assert_matches_rebuild(other)
+
+
+def test_pruning_after_ingest(tmp_path):
+    db_kwargs = dict(
+        user=None, password=None, db_name=str(tmp_path / "yam.db"),
+        dialect="sqlite"
+    )
+    db = Database(**db_kwargs)
+    db.add_songs([_song(i) for i in range(2)])
+    db.rebuild_hash_frequencies()
+
+    # Hashes ingested after the rebuild are pruned once they're common.
+    db.add_songs([_song(i, [COMMON]) for i in range(2, 5)])
+    query = _song(2, [COMMON])
+    query["path"] = "query"
+    [song] = match_fingerprints_batch(
+        [query], db_kwargs, max_hash_frequency=0.5
+    )
+    assert song["query_stats"]["num_pruned_hashes"] == 1
+    assert song["matching_song"]["title"] == "song2"
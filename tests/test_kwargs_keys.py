@@ -0,0 +1,22 @@
+import importlib
+import inspect
+
+import youtube_audio_matcher as yam
+
+main = importlib.import_module("youtube_audio_matcher.main")
+
+
+def _params(func):
+    return set(inspect.signature(func).parameters)
+
+
+def test_db_keys():
+    assert set(main._DB_KEYS) == _params(yam.database.Database)
+
+
+def test_fingerprint_keys():
+    assert set(main._FINGERPRINT_KEYS) == set(yam.audio.fingerprint_params())
+
+
+def test_match_keys():
+    assert set(main._MATCH_KEYS) <= _params(yam.match_fingerprints_batch)
@@ -0,0 +1,73 @@
+import sqlite3
+
+import sqlalchemy.orm
+
+from youtube_audio_matcher.database import Database
+
+
+def _database(tmp_path):
+    return Database(
+        user=None, password=None, db_name=str(tmp_path / "yam.db"),
+        dialect="sqlite"
+    )
+
+
+def _num_results(tmp_path):
+    conn = sqlite3.connect(tmp_path / "yam.db")
+    try:
+        return conn.execute("SELECT COUNT(*) FROM match_result").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_match_result_is_replaced(tmp_path):
+    db = _database(tmp_path)
+    db.add_match_result("file", "params", 1, {"match": 1})
+    db.add_match_result("file", "params", 2, {"match": 2})
+
+    assert _num_results(tmp_path) == 1
+    assert db.query_match_result("file", "params", 2) == {"match": 2}
+
+
+def test_concurrently_cached_match_result(tmp_path, monkeypatch):
+    db = _database(tmp_path)
+    other = _database(tmp_path)
+
+    # Another process caches a result after this one's update (which finds
+    # no row) but before its insert.
+    update = sqlalchemy.orm.Query.update
+    calls = []
+
+    def update_before_other(query, *args, **kwargs):
+        if query.session is db.session:
+            calls.append(query)
+            if len(calls) == 1:
+                other.add_match_result("file", "params", 1, {"match": 1})
+                return 0
+        return update(query, *args, **kwargs)
+
+    monkeypatch.setattr(sqlalchemy.orm.Query, "update", update_before_other)
+    db.add_match_result("file", "params", 2, {"match": 2})
+    monkeypatch.undo()
+
+    assert len(calls) == 2
+    assert _num_results(tmp_path) == 1
+    assert db.query_match_result("file", "params", 2) == {"match": 2}
+
+
+def test_upgrade_removes_duplicate_match_results(tmp_path):
+    _database(tmp_path)
+    conn = sqlite3.connect(tmp_path / "yam.db")
+    conn.execute("DROP INDEX ix_match_result_filehash_params_hash")
+    conn.executemany(
+        "INSERT INTO match_result (filehash, params_hash, content_version, "
+        "result) VALUES ('file', 'params', 1, ?)", [("{}",), ("{}",)]
+    )
+    conn.commit()
+    conn.close()
+
+    db = _database(tmp_path)
+    db.upgrade_schema()
+    assert _num_results(tmp_path) == 0
+    db.add_match_result("file", "params", 1, {"match": 1})
+    assert db.query_match_result("file", "params", 1) == {"match": 1}
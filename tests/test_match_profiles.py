@@ -0,0 +1,86 @@
+import pytest
+
+from youtube_audio_matcher import (
+    audio, get_match_profile_id, match_fingerprints_batch
+)
+from youtube_audio_matcher.database import Database
+
+
+def _song(title, seed):
+    return {
+        "title": title,
+        "fingerprints": [
+            (f"{seed:04x}{i:04x}", i * 0.1) for i in range(10)
+        ],
+    }
+
+
+def _query(seed):
+    query = _song(None, seed)
+    query["path"] = f"query{seed}"
+    return query
+
+
+@pytest.fixture
+def db_kwargs(tmp_path):
+    return dict(
+        user=None, password=None, db_name=str(tmp_path / "yam.db"),
+        dialect="sqlite"
+    )
+
+
+def test_unknown_profile_songs_matched(db_kwargs):
+    db = Database(**db_kwargs)
+    db.add_songs([_song("unknown", 0)])
+    db.add_songs(
+        [_song("tagged", 1)],
+        fingerprint_params=audio.fingerprint_params(fanout=5)
+    )
+
+    # No songs have the query's profile, so only the songs with an unknown
+    # profile are matched.
+    fingerprint_kwargs = {"fanout": 15}
+    profile_id = get_match_profile_id(db, fingerprint_kwargs)
+    assert profile_id is not None
+    songs = match_fingerprints_batch(
+        [_query(0), _query(1)], db_kwargs,
+        fingerprint_kwargs=fingerprint_kwargs
+    )
+    assert songs[0]["matching_song"]["title"] == "unknown"
+    assert "matching_song" not in songs[1]
+
+
+def test_no_matchable_songs(db_kwargs):
+    db = Database(**db_kwargs)
+    db.add_songs(
+        [_song("tagged", 1)],
+        fingerprint_params=audio.fingerprint_params(fanout=5)
+    )
+    with pytest.raises(ValueError):
+        get_match_profile_id(db, {"fanout": 15})
+    with pytest.raises(ValueError):
+        match_fingerprints_batch(
+            [_query(1)], db_kwargs, fingerprint_kwargs={"fanout": 15}
+        )
+
+
+def test_precomputed_profile_id(db_kwargs, monkeypatch):
+    db = Database(**db_kwargs)
+    db.add_songs([_song("unknown", 0)])
+    params = audio.fingerprint_params(fanout=5)
+    db.add_songs([_song("tagged", 1)], fingerprint_params=params)
+    db.add_songs([_song("other", 2)], fingerprint_params={"fanout": 1})
+    profile_id = get_match_profile_id(db, {"fanout": 5})
+    assert profile_id == db.get_profile_id(params, create=False)
+
+    def query_profiles(self):
+        raise AssertionError("profiles queried for a batch")
+
+    monkeypatch.setattr(Database, "query_profiles", query_profiles)
+    songs = match_fingerprints_batch(
+        [_query(0), _query(1), _query(2)], db_kwargs,
+        fingerprint_kwargs={"fanout": 5}, profile_id=profile_id
+    )
+    assert [song.get("matching_song", {}).get("title") for song in songs] == [
+        "unknown", "tagged", None
+    ]
@@ -0,0 +1,71 @@
+import importlib
+import io
+
+import numpy as np
+
+import youtube_audio_matcher as yam
+
+# The module, rather than the function imported into the package.
+main = importlib.import_module("youtube_audio_matcher.main")
+
+
+class FakeFingerprinter:
+    """
+    Returns one hash per update, with an offset that lags behind the stream
+    time by the value of the channel's samples (in seconds).
+    """
+    def __init__(self, sample_rate, **kwargs):
+        self.sample_rate = sample_rate
+        self.num_samples = 0
+
+    @property
+    def time(self):
+        return self.num_samples / self.sample_rate
+
+    def update(self, samples):
+        self.num_samples += len(samples)
+        lag = int(samples[0])
+        return [(f"lag{lag}", self.time - lag)]
+
+    def flush(self):
+        return []
+
+
+def test_match_stream_window_per_channel(monkeypatch):
+    monkeypatch.setattr(yam.audio, "StreamFingerprinter", FakeFingerprinter)
+    windows = []
+    monkeypatch.setattr(
+        main, "match_fingerprints",
+        lambda song, *args, **kwargs: windows.append(song) or song
+    )
+
+    # Two channels, the first of whose hashes lag 5 s behind the second's.
+    sample_rate = 100
+    frames = np.tile(np.array([5, 0], dtype="<i2"), 20 * sample_rate)
+    stream = io.BytesIO(frames.tobytes())
+    window = 3
+    list(
+        main.match_stream(
+            stream, {}, sample_rate=sample_rate, num_channels=2,
+            window=window, interval=1
+        )
+    )
+
+    assert windows
+    for song in windows:
+        stream_time = song["stream_time"]
+        # Each channel's hashes from the last `window` seconds, in order.
+        for lag in (0, 5):
+            emitted = [
+                10 * i / sample_rate - lag
+                for i in range(1, round(stream_time * 10) + 1)
+            ]
+            expected = [
+                offset for offset in emitted
+                if offset >= stream_time - window
+            ]
+            offsets = [
+                offset for hash_, offset in song["fingerprints"]
+                if hash_ == f"lag{lag}"
+            ]
+            assert offsets == expected
@@ -0,0 +1,15 @@
+from youtube_audio_matcher.database import Database
+
+
+def test_migration_bumps_content_version(tmp_path):
+    kwargs = dict(
+        user=None, password=None, db_name=str(tmp_path / "yam.db"),
+        dialect="sqlite"
+    )
+    db = Database(**kwargs)
+    db.add_songs([{"title": "song", "fingerprints": [("abcd", 1.0)]}])
+    version = db.query_content_version()
+    db.session.commit()
+
+    db.migrate_fingerprint_table(drop_id=True)
+    assert Database(**kwargs).query_content_version() == version + 1
@@ -0,0 +1,98 @@
+import hashlib
+
+from youtube_audio_matcher.database import Database, lookup
+from youtube_audio_matcher.database.database import (
+    OFFSET_HOP_SIZE, OFFSET_SAMPLE_RATE
+)
+
+
+def _song(seed, num_fingerprints=200):
+    hop = OFFSET_HOP_SIZE / OFFSET_SAMPLE_RATE
+    return {
+        "title": f"song{seed}",
+        "fingerprints": [
+            (hashlib.sha1(f"{seed}-{i}".encode()).hexdigest(), i * hop)
+            for i in range(num_fingerprints)
+        ],
+    }
+
+
+def _db_kwargs(path, **kwargs):
+    return dict(
+        user=None, password=None, db_name=str(path), dialect="sqlite",
+        **kwargs
+    )
+
+
+def _replica_db(tmp_path, **kwargs):
+    """
+    Create a primary and a (not actually replicated) replica database file
+    and return a Database that writes to the former and reads from the
+    latter.
+    """
+    replica_path = tmp_path / "replica.db"
+    # Replicas' schema must already exist.
+    Database(**_db_kwargs(replica_path))
+    return Database(
+        **_db_kwargs(
+            tmp_path / "primary.db", read_urls=[f"sqlite:///{replica_path}"],
+            **kwargs
+        )
+    )
+
+
+def test_writes_go_to_primary(tmp_path):
+    db = _replica_db(tmp_path)
+    db.add_songs([_song(0)])
+
+    primary = Database(**_db_kwargs(tmp_path / "primary.db"))
+    replica = Database(**_db_kwargs(tmp_path / "replica.db"))
+    assert primary.count_songs() == 1
+    assert replica.count_songs() == 0
+
+
+def test_reads_go_to_replica(tmp_path):
+    song = _song(0)
+    hashes = [hash_ for hash_, _ in song["fingerprints"]]
+    db = _replica_db(tmp_path)
+    db.add_songs([dict(song)])
+    assert db.count_songs() == 0
+    assert db.query_fingerprints(hashes) == []
+
+    replica = Database(**_db_kwargs(tmp_path / "replica.db"))
+    replica.add_songs([dict(song), _song(1)])
+    db = _replica_db(tmp_path)
+    assert db.count_songs() == 2
+    assert len(db.query_fingerprints(hashes)) == len(hashes)
+
+
+def test_no_temp_tables_on_replica(tmp_path, monkeypatch):
+    def _fail(*args, **kwargs):
+        raise AssertionError("Temporary table created on a read replica")
+
+    monkeypatch.setattr(lookup, "_temp_table_lookup", _fail)
+    song = _song(0)
+    replica = Database(**_db_kwargs(tmp_path / "replica.db"))
+    replica.add_songs([dict(song)])
+
+    db = _replica_db(tmp_path, lookup_strategy="temp_table")
+    fingerprints = db.query_fingerprints(
+        [hash_ for hash_, _ in song["fingerprints"]]
+    )
+    assert len(fingerprints) == len(song["fingerprints"])
+
+
+def test_query_matches_runs_on_primary(tmp_path):
+    song = _song(0)
+    db = _replica_db(tmp_path)
+    db.add_songs([dict(song)])
+
+    query = [
+        (hash_, offset + 10)
+        for hash_, offset in zip(
+            (hash_ for hash_, _ in song["fingerprints"]), range(100)
+        )
+    ]
+    [candidates] = db.query_matches([query])
+    assert candidates[0]["song_id"] == 1
+    assert candidates[0]["num_matching_fingerprints"] == 100
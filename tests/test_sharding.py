@@ -0,0 +1,147 @@
+import hashlib
+import sqlite3
+
+import pytest
+
+from youtube_audio_matcher.database import Database, shard_bounds
+from youtube_audio_matcher.database.sharding import (
+    route_fingerprints, shard_index, shards_in_range
+)
+
+NUM_SHARDS = 4
+
+
+def _hash(i):
+    return hashlib.sha1(str(i).encode()).hexdigest()
+
+
+def _song(seed, num_fingerprints=400):
+    return {
+        "title": f"song{seed}",
+        "fingerprints": [
+            (_hash(f"{seed}-{i}"), i * 0.1) for i in range(num_fingerprints)
+        ],
+    }
+
+
+def _shard_paths(tmp_path):
+    return [tmp_path / f"shard{i}.db" for i in range(NUM_SHARDS)]
+
+
+def _sharded_db(tmp_path):
+    return Database(
+        user=None, password=None, db_name=str(tmp_path / "primary.db"),
+        dialect="sqlite",
+        shard_urls=[f"sqlite:///{path}" for path in _shard_paths(tmp_path)]
+    )
+
+
+def _shard_hashes(tmp_path):
+    """
+    Read the hashes stored in each shard file directly.
+    """
+    shard_hashes = []
+    for path in _shard_paths(tmp_path):
+        with sqlite3.connect(path) as conn:
+            rows = conn.execute("SELECT hash FROM fingerprint").fetchall()
+        shard_hashes.append([row[0] for row in rows])
+    return shard_hashes
+
+
+def _key(fingerprints):
+    return sorted(
+        (fp["song_id"], fp["hash"], fp["offset"]) for fp in fingerprints
+    )
+
+
+def test_shard_bounds():
+    assert shard_bounds(1) == []
+    assert shard_bounds(4) == ["4000", "8000", "c000"]
+
+
+def test_shard_index_by_hash_prefix():
+    bounds = shard_bounds(4)
+    assert shard_index(bounds, "0000" + "f" * 36) == 0
+    assert shard_index(bounds, "3fff" + "f" * 36) == 0
+    assert shard_index(bounds, "4000" + "0" * 36) == 1
+    assert shard_index(bounds, "bfff") == 2
+    assert shard_index(bounds, "ffff") == 3
+
+
+def test_route_fingerprints():
+    bounds = shard_bounds(4)
+    fingerprints = [("0abc", 1), ("9abc", 2), ("0def", 3), ("fabc", 4)]
+    assert route_fingerprints(bounds, fingerprints) == {
+        0: [("0abc", 1), ("0def", 3)],
+        2: [("9abc", 2)],
+        3: [("fabc", 4)],
+    }
+    assert route_fingerprints(bounds, ["9abc"]) == {2: ["9abc"]}
+
+
+def test_shards_in_range():
+    bounds = shard_bounds(4)
+    assert shards_in_range(bounds) == [0, 1, 2, 3]
+    assert shards_in_range(bounds, "4000", "8000") == [1]
+    assert shards_in_range(bounds, "3000", "9000") == [0, 1, 2]
+
+
+def test_fingerprints_routed_to_shards(tmp_path):
+    db = _sharded_db(tmp_path)
+    song = _song(0)
+    db.add_songs([dict(song)])
+
+    bounds = shard_bounds(NUM_SHARDS)
+    shard_hashes = _shard_hashes(tmp_path)
+    assert sum(map(len, shard_hashes)) == len(song["fingerprints"])
+    for index, hashes in enumerate(shard_hashes):
+        assert hashes
+        assert all(shard_index(bounds, hash_) == index for hash_ in hashes)
+
+
+@pytest.mark.parametrize("strategy", ["in", "chunked", "temp_table"])
+def test_query_across_shards(tmp_path, strategy):
+    songs = [_song(seed) for seed in range(3)]
+    sharded = _sharded_db(tmp_path)
+    sharded.lookup_kwargs["strategy"] = strategy
+    unsharded = Database(
+        user=None, password=None, db_name=str(tmp_path / "unsharded.db"),
+        dialect="sqlite", lookup_strategy=strategy
+    )
+    sharded.add_songs([dict(song) for song in songs])
+    unsharded.add_songs([dict(song) for song in songs])
+
+    hashes = [
+        hash_ for song in songs for hash_, _ in song["fingerprints"][::3]
+    ] + ["0" * 40, "f" * 40]
+    fingerprints = sharded.query_fingerprints(hashes)
+    assert len(fingerprints) == len(hashes) - 2
+    assert _key(fingerprints) == _key(unsharded.query_fingerprints(hashes))
+    assert _key(sharded.query_fingerprints(hashes, song_ids=[2])) == _key(
+        unsharded.query_fingerprints(hashes, song_ids=[2])
+    )
+
+
+def test_shards_cleaned_up_when_primary_commit_fails(tmp_path):
+    db = _sharded_db(tmp_path)
+    song = _song(0)
+
+    def _fail():
+        raise RuntimeError("Primary commit failed")
+
+    commit = db.session.commit
+    db.session.commit = _fail
+    with pytest.raises(RuntimeError):
+        db.add_songs([dict(song)])
+    db.session.commit = commit
+
+    assert db.count_songs() == 0
+    assert _shard_hashes(tmp_path) == [[]] * NUM_SHARDS
+
+    # The song id of the failed song is reused without conflicts.
+    [song_id] = db.add_songs([dict(song)])
+    assert db.count_fingerprints([song_id]) == {
+        song_id: len(song["fingerprints"])
+    }
+    hashes = [hash_ for hash_, _ in song["fingerprints"]]
+    assert len(db.query_fingerprints(hashes)) == len(hashes)
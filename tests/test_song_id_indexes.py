@@ -0,0 +1,62 @@
+import sqlite3
+
+import pytest
+
+from youtube_audio_matcher.database import Database
+
+
+def _database(tmp_path, shard_urls=None):
+    return Database(
+        user=None, password=None, db_name=str(tmp_path / "yam.db"),
+        dialect="sqlite", shard_urls=shard_urls
+    )
+
+
+def _delete_plan(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return " ".join(
+            row[-1] for row in conn.execute(
+                f"EXPLAIN QUERY PLAN DELETE FROM {table} WHERE song_id IN (1)"
+            )
+        )
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("table", ["fingerprint", "sketch_band"])
+def test_song_rows_deleted_via_index(tmp_path, table):
+    _database(tmp_path)
+    plan = _delete_plan(tmp_path / "yam.db", table)
+    assert f"ix_{table}_song_id" in plan
+
+
+def test_shard_song_rows_deleted_via_index(tmp_path):
+    shard_paths = [tmp_path / f"shard{i}.db" for i in range(2)]
+    _database(tmp_path, [f"sqlite:///{path}" for path in shard_paths])
+    for path in shard_paths:
+        assert "ix_fingerprint_song_id" in _delete_plan(path, "fingerprint")
+
+
+def test_indexes_added_to_existing_tables(tmp_path):
+    db = _database(tmp_path)
+    conn = sqlite3.connect(tmp_path / "yam.db")
+    conn.execute("DROP INDEX ix_fingerprint_song_id")
+    conn.execute("DROP INDEX ix_sketch_band_song_id")
+    conn.commit()
+    conn.close()
+
+    db.upgrade_schema()
+    for table in ("fingerprint", "sketch_band"):
+        plan = _delete_plan(tmp_path / "yam.db", table)
+        assert f"ix_{table}_song_id" in plan
+
+
+@pytest.mark.parametrize("drop_id", [False, True])
+def test_migration_keeps_index(tmp_path, drop_id):
+    db = _database(tmp_path)
+    db.add_songs([{"title": "song", "fingerprints": [("abcd", 1.0)]}])
+    db.session.commit()
+    db.migrate_fingerprint_table(drop_id=drop_id)
+    plan = _delete_plan(tmp_path / "yam.db", "fingerprint")
+    assert "ix_fingerprint_song_id" in plan
@@ -1,7 +1,13 @@
-from . import audio, database, download
-from .main import main, match_fingerprints, match_songs
+from . import audio, database, download, server
+from .main import (
+    get_match_profile_id, main, match_fingerprints, match_fingerprints_batch,
+    match_fingerprints_batch_async, match_songs, match_stream,
+    run_match_stream,
+)
 
 __all__ = [
-    "audio", "database", "download",
-    "main", "match_fingerprints", "match_songs"
+    "audio", "database", "download", "server",
+    "get_match_profile_id", "main", "match_fingerprints",
+    "match_fingerprints_batch", "match_fingerprints_batch_async",
+    "match_songs", "match_stream", "run_match_stream",
 ]
@@ -2,8 +2,10 @@ import argparse
 from datetime import datetime
 import logging
 import os
+import sys
 
 import youtube_audio_matcher
+from . import server
 from .database import _argparsers as db_argparsers
 from .download import _argparsers as dl_argparsers
 from .audio import _argparsers as fp_argparsers
@@ -43,22 +45,81 @@ def get_parser():
         help="Add files to the database after fingerprinting instead of "
         "searching the database for matches"
     )
+    parser.add_argument(
+        "--async-db", action="store_true",
+        help="Query/update the database directly from the asyncio event loop "
+        "(requires an asyncio driver: asyncpg, aiomysql, or aiosqlite) so "
+        "that worker processes are only used for CPU-bound work"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1, metavar="<num>",
+        help="Max number of songs to match against the database per query"
+    )
+    parser.add_argument(
+        "--batch-timeout", type=float, default=0, metavar="<ms>",
+        help="Max time (in milliseconds) to wait for additional songs to "
+        "fill a batch before matching it"
+    )
     parser.add_argument(
         "-c", "--conf-thresh", type=float, default=0.05, metavar="<float>",
         help="Confidence threshold for matches"
     )
+    parser.add_argument(
+        "--cache", action="store_true", dest="use_cache",
+        help="Cache match results in the database and reuse cached results "
+        "for previously matched files (the cache is invalidated whenever the "
+        "database contents change)"
+    )
     parser.add_argument(
         "-D", "--delete", action="store_true",
         help="Delete downloaded files after fingerprinting"
     )
+    parser.add_argument(
+        "--ingest-batch-rows", type=int, default=100000, metavar="<num>",
+        help="When adding songs to the database (-A), commit songs in "
+        "batches of up to <num> fingerprints per transaction"
+    )
+    parser.add_argument(
+        "--ingest-batch-timeout", type=float, default=1000, metavar="<ms>",
+        help="When adding songs to the database (-A), max time (in "
+        "milliseconds) to wait for additional songs to fill a batch"
+    )
+    parser.add_argument(
+        "--match-strategy", type=str, choices=["client", "sql"],
+        default="client",
+        help="Align matches client-side (client) or in the database (sql), "
+        "which only returns the best match for each song instead of all "
+        "fingerprints with matching hashes"
+    )
+    parser.add_argument(
+        "--max-candidates", type=int, metavar="<num>",
+        help="Only match each song against the (up to) <num> database songs "
+        "whose MinHash sketches are most similar to it (songs added by "
+        "earlier versions require yamdb --rebuild-sketches)"
+    )
+    parser.add_argument(
+        "--max-hash-frequency", type=float, metavar="<float>",
+        help="Do not query hashes occurring in more than this fraction of "
+        "database songs (songs added by earlier versions require yamdb "
+        "--rebuild-hash-frequencies)"
+    )
     parser.add_argument(
         "--max-processes", type=int, metavar="<num>",
         help="Max number of CPUs for parallel processing"
     )
+    parser.add_argument(
+        "--max-query-hashes", type=int, metavar="<num>",
+        help="Only query the (up to) <num> rarest unique hashes of each song"
+    )
     parser.add_argument(
         "--max-threads", type=int, metavar="<num>",
         help="Max number of threads for concurrent tasks"
     )
+    parser.add_argument(
+        "--no-skip-existing", action="store_false", dest="skip_existing",
+        help="When adding songs to the database (-A), don't skip videos and "
+        "files (by YouTube id and file hash) already in the database"
+    )
     parser.add_argument(
         "-o", "--output", nargs="?", metavar="path", const=0,
         help="Path to output file containing matches in JSON format; if this "
@@ -66,6 +127,54 @@ def get_parser():
         "generated and written to the current directory"
     )
 
+    shard_args = parser.add_argument_group("Shard arguments")
+    shard_args.add_argument(
+        "--shard-dir", type=str, metavar="<dir>",
+        help="Write songs and their fingerprints to shard files in <dir> "
+        "instead of adding them to or matching them against the database "
+        "(which isn't accessed); load the shards later with yamdb "
+        "--load-shards"
+    )
+    shard_args.add_argument(
+        "--shard-rows", type=int, default=1000000, metavar="<num>",
+        help="With --shard-dir, max number of fingerprints per shard file"
+    )
+    shard_args.add_argument(
+        "--shard-timeout", type=float, default=60000, metavar="<ms>",
+        help="With --shard-dir, max time (in milliseconds) to wait for "
+        "additional songs to fill a shard before writing it"
+    )
+
+    stream_args = parser.add_argument_group("Stream arguments")
+    stream_args.add_argument(
+        "--stream", action="store_true",
+        help="Continuously match a raw signed 16-bit little-endian PCM audio "
+        "stream against the database; the (first) input is the path to the "
+        "stream file or - to read from stdin"
+    )
+    stream_args.add_argument(
+        "--follow", action="store_true",
+        help="Wait for more data at the end of the stream (e.g., to read a "
+        "recording that is still being written)"
+    )
+    stream_args.add_argument(
+        "--interval", type=float, default=2, metavar="<sec>",
+        help="Stream time between matches"
+    )
+    stream_args.add_argument(
+        "--num-channels", type=int, default=1, metavar="<num>",
+        help="Number of interleaved channels in the stream"
+    )
+    stream_args.add_argument(
+        "--sample-rate", type=int, default=44100, metavar="<Hz>",
+        help="Stream sample rate"
+    )
+    stream_args.add_argument(
+        "--window", type=float, default=10, metavar="<sec>",
+        help="Duration of the sliding window of audio matched against the "
+        "database"
+    )
+
     verbose_args = parser.add_argument_group("Verbosity arguments")
     verbose_args.add_argument(
         "--debug", action="store_true", help="Print verbose debugging info"
@@ -78,18 +187,115 @@ def get_parser():
     return parser
 
 
-def cli():
-    parser = get_parser()
-    args = vars(parser.parse_args())
+def get_serve_parser():
+    """
+    Parser for ``yam serve``, which runs a long-running match server (see
+    :func:`youtube_audio_matcher.server.serve`).
+    """
+    db_parser = db_argparsers.get_core_parser()
+    fp_parser = fp_argparsers.get_core_parser(extra_args=True)
 
+    parser = argparse.ArgumentParser(
+        prog="yam serve",
+        description="Run a match server that keeps worker processes and "
+        "database connections open and accepts match/add requests over a "
+        "local HTTP or Unix socket API",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        parents=[db_parser, fp_parser]
+    )
+
+    server_args = parser.add_argument_group("server arguments")
+    server_args.add_argument(
+        "--server-host", type=str, default="127.0.0.1", metavar="<host>",
+        help="Host on which to listen for HTTP requests"
+    )
+    server_args.add_argument(
+        "--server-port", type=int, default=8000, metavar="<port>",
+        help="Port on which to listen for HTTP requests"
+    )
+    server_args.add_argument(
+        "--socket", type=str, metavar="<path>", dest="socket_path",
+        help="Listen on a Unix socket at <path> instead of a TCP port"
+    )
+    server_args.add_argument(
+        "--max-processes", type=int, metavar="<num>",
+        help="Number of worker processes"
+    )
+    server_args.add_argument(
+        "--max-requests", type=int, metavar="<num>",
+        help="Max number of concurrent requests (default: 2 * number of "
+        "worker processes)"
+    )
+
+    match_args = parser.add_argument_group("match arguments")
+    match_args.add_argument(
+        "-c", "--conf-thresh", type=float, default=0.05, metavar="<float>",
+        help="Confidence threshold for matches"
+    )
+    match_args.add_argument(
+        "--cache", action="store_true", dest="use_cache",
+        help="Cache match results in the database and reuse cached results "
+        "for previously matched files"
+    )
+    match_args.add_argument(
+        "--match-strategy", type=str, choices=["client", "sql"],
+        default="client",
+        help="Align matches client-side (client) or in the database (sql)"
+    )
+    match_args.add_argument(
+        "--max-candidates", type=int, metavar="<num>",
+        help="Only match each song against the (up to) <num> database songs "
+        "whose MinHash sketches are most similar to it"
+    )
+    match_args.add_argument(
+        "--max-hash-frequency", type=float, metavar="<float>",
+        help="Do not query hashes occurring in more than this fraction of "
+        "database songs"
+    )
+    match_args.add_argument(
+        "--max-query-hashes", type=int, metavar="<num>",
+        help="Only query the (up to) <num> rarest unique hashes of each song"
+    )
+
+    verbose_args = parser.add_argument_group("Verbosity arguments")
+    verbose_args.add_argument(
+        "--debug", action="store_true", help="Print verbose debugging info"
+    )
+    verbose_args.add_argument(
+        "-s", "--silent", action="store_true",
+        help="Suppress youtube-audio-matcher terminal output"
+    )
+    return parser
+
+
+def _init_logging(debug=False, silent=False):
     log_level = logging.INFO
-    if args["debug"]:
+    if debug:
         log_level = logging.DEBUG
-    elif args["silent"]:
+    elif silent:
         log_level = logging.CRITICAL
     log_format = "[%(levelname)s] %(message)s"
     logging.basicConfig(format=log_format, level=log_level)
 
+
+def serve_cli(argv):
+    parser = get_serve_parser()
+    args = vars(parser.parse_args(argv))
+    _init_logging(debug=args.pop("debug"), silent=args.pop("silent"))
+    server.serve(**args)
+
+
+def cli():
+    # Run the match server if called as ``yam serve``.
+    if sys.argv[1:2] == ["serve"]:
+        serve_cli(sys.argv[2:])
+        return
+
+    parser = get_parser()
+    args = vars(parser.parse_args())
+
+    _init_logging(debug=args["debug"], silent=args["silent"])
+
     args["dst_dir"] = args["dst_dir"].expanduser().resolve()
 
     if args["num_retries"] < 0:
@@ -109,8 +315,19 @@ def cli():
 
     del args["inputs"], args["debug"], args["output"], args["silent"]
 
+    stream_keys = [
+        "follow", "interval", "num_channels", "sample_rate", "stream",
+        "window",
+    ]
+    stream_kwargs = {k: args.pop(k) for k in stream_keys}
+
     try:
-        youtube_audio_matcher.main(inputs, out_fpath=out_fpath, **args)
+        if stream_kwargs.pop("stream"):
+            youtube_audio_matcher.run_match_stream(
+                inputs[0], out_fpath=out_fpath, **stream_kwargs, **args
+            )
+        else:
+            youtube_audio_matcher.main(inputs, out_fpath=out_fpath, **args)
     except Exception as e:
         raise e
     finally:
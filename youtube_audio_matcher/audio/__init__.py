@@ -1,15 +1,16 @@
 from .fingerprint import (
     align_matches, find_peaks_2d, fingerprint_from_file,
-    fingerprint_from_signal, fingerprint_song, fingerprint_songs,
-    get_spectrogram, hash_peaks, plot_peaks, plot_fingerprints,
-    plot_spectrogram,
+    fingerprint_from_signal, fingerprint_params, fingerprint_song,
+    fingerprint_songs, get_spectrogram, hash_peaks, plot_peaks,
+    plot_fingerprints, plot_spectrogram,
 )
-
+from .stream import StreamFingerprinter
 from .util import generate_waveform, hash_file, read_file
 
 __all__ = [
     "align_matches", "find_peaks_2d", "fingerprint_from_file",
-    "fingerprint_from_signal", "fingerprint_song", "fingerprint_songs",
-    "get_spectrogram", "hash_peaks", "plot_peaks", "plot_fingerprints",
-    "plot_spectrogram", "generate_waveform", "hash_file", "read_file",
+    "fingerprint_from_signal", "fingerprint_params", "fingerprint_song",
+    "fingerprint_songs", "get_spectrogram", "hash_peaks", "plot_peaks",
+    "plot_fingerprints", "plot_spectrogram", "StreamFingerprinter",
+    "generate_waveform", "hash_file", "read_file",
 ]
@@ -3,6 +3,7 @@ import collections
 import copy
 import functools
 import hashlib
+import inspect
 import logging
 import os
 
@@ -17,30 +18,41 @@ from . import util
 # TODO: get duration on file read
 
 
-def align_matches(song_fingerprints, db_fingerprints, offset_bin_size=0.2):
+def align_matches(
+    song_fingerprints, db_fingerprints, offset_bin_size=0.2, offset_unit=None
+):
     """
     Args:
         song_fingerprints (List[dict]): List of fingerprints for the song to
             be matched, where each fingerprint is a dict containing the hash
-            and the time offset in seconds::
+            and the time offset (in seconds or, if ``offset_unit`` is given,
+            as an integer number of ``offset_unit``)::
 
                 {
                     "hash": str,
-                    "offset": float
+                    "offset": float|int
                 }
         db_fingerprints (List[dict]): List of fingerprints from the database
             with matching hashes, where each fingerprint is a dict containing
-            the database song id, hash, and offset::
+            the database song id, hash, and offset (in the same unit as
+            ``song_fingerprints``)::
 
                 {
                     "song_id": int,
                     "hash": str,
-                    "offset": float
+                    "offset": float|int
                 }
-        offset_bin_size (float): Size of offset bin in seconds;
-            each offset is divided by this value and converted to an
-            integer to prevent floating point errors and inaccuracies from
-            affecting the results.
+        offset_bin_size (float): Size of offset bin in seconds. If
+            ``offset_unit`` is ``None``, each offset is divided by this value
+            and converted to an integer to prevent floating point errors and
+            inaccuracies from affecting the results. Otherwise, integer
+            offsets are used as is and the relative offsets are binned into
+            bins of ``round(offset_bin_size / offset_unit)`` offset units
+            (at least one).
+        offset_unit (float): Unit of the (integer) offsets in seconds, e.g.,
+            the spectrogram hop duration (see
+            :meth:`youtube_audio_matcher.database.Database.query_offset_unit`).
+            If ``None``, offsets are in seconds.
 
     Returns:
         result: dict|None
@@ -60,10 +72,19 @@ def align_matches(song_fingerprints, db_fingerprints, offset_bin_size=0.2):
         fingerprints with non-matching hashes should be filtered out before
         being passed to this function.
     """
+    # Offsets in seconds are divided by the bin size and converted to
+    # integers. Integer offsets are used as is; only the (distinct) relative
+    # offsets are binned, below.
+    bin_size = None
+    if offset_unit is not None:
+        bin_size = max(1, int(round(offset_bin_size / offset_unit)))
+
     # Map input song hashes to a list of offsets for each hash.
     inp_hash_to_offsets = collections.defaultdict(list)
     for fp in song_fingerprints:
-        offset = int(fp["offset"] / offset_bin_size)
+        offset = fp["offset"]
+        if bin_size is None:
+            offset = int(offset / offset_bin_size)
         inp_hash_to_offsets[fp["hash"]].append(offset)
 
     # Do the same as above but for each song in the database that's a potential
@@ -73,7 +94,9 @@ def align_matches(song_fingerprints, db_fingerprints, offset_bin_size=0.2):
     for fp in db_fingerprints:
         song_id = fp["song_id"]
         hash_ = fp["hash"]
-        offset = int(fp["offset"] / offset_bin_size)
+        offset = fp["offset"]
+        if bin_size is None:
+            offset = int(offset / offset_bin_size)
 
         if song_id not in db_song_to_hashes_offsets:
             db_song_to_hashes_offsets[song_id] = collections.defaultdict(list)
@@ -121,6 +144,11 @@ def align_matches(song_fingerprints, db_fingerprints, offset_bin_size=0.2):
     for song_id, rel_offsets in db_song_to_rel_offsets.items():
         # Get the relative offset with the greatest frequency for this song.
         counter = collections.Counter(rel_offsets)
+        if bin_size is not None and bin_size > 1:
+            binned_counter = collections.Counter()
+            for rel_offset, count in counter.items():
+                binned_counter[rel_offset // bin_size] += count
+            counter = binned_counter
         peak_rel_offset, peak_count = counter.most_common(1)[0]
 
         if peak_count > num_matching_fingerprints:
@@ -136,24 +164,30 @@ def align_matches(song_fingerprints, db_fingerprints, offset_bin_size=0.2):
                 min(num_matching_fingerprints, len(song_fingerprints)),
             "relative_offset": match_rel_offset * offset_bin_size,
         }
+        if bin_size is not None:
+            result["relative_offset"] = (
+                match_rel_offset * bin_size * offset_unit
+            )
     return result
 
 
-def fingerprint_from_signal(samples, **kwargs):
+def fingerprint_from_signal(samples, return_num_peaks=False, **kwargs):
     """
     Fingerprint an audio signal by obtaining its spectrogram and returning
     its hashes.
 
     Args:
         samples (np.ndarray): Array representing the audio signal.
+        return_num_peaks (bool): Also return the number of spectrogram peaks.
         sample_rate (int): Audio signal sample rate (in Hz).
         **kwargs: Optional keyword args for :func:`get_spectrogram`,
             :func:`find_peaks_2d`, and :func:`hash_peaks`.
 
     Returns:
-        List[Tuple[str, float]]: hashes
+        List[Tuple[str, float]]|tuple: hashes
             List of tuples where each tuple is a (hash, absolute_offset) pair.
-            See :func:`hash_peaks`.
+            See :func:`hash_peaks`. If ``return_num_peaks=True``, a tuple
+            ``(hashes, num_peaks)`` is returned instead.
     """
     get_spectrogram_keys = [
         "sample_rate", "win_size", "win_overlap_ratio", "spectrogram_backend",
@@ -186,10 +220,48 @@ def fingerprint_from_signal(samples, **kwargs):
     }
     hashes = hash_peaks(peak_times, peak_freqs, **hash_peaks_kwargs)
 
+    if return_num_peaks:
+        return hashes, len(peak_times)
     return hashes
 
 
-def fingerprint_from_file(fpath, delete=False, **kwargs):
+def fingerprint_params(**kwargs):
+    """
+    Get the parameters that determine the hashes returned by
+    :func:`fingerprint_from_signal`, i.e., the keyword args of
+    :func:`get_spectrogram` (other than the sample rate),
+    :func:`find_peaks_2d`, and :func:`hash_peaks`, with their defaults
+    filled in. Hashes computed with different parameters generally don't
+    match, even for the same audio.
+
+    Args:
+        **kwargs: Keyword args for :func:`fingerprint_from_signal`; any other
+            args (e.g., ``sample_rate`` or ``delete``) are ignored.
+
+    Returns:
+        dict: params
+            Dict mapping each parameter name to its value. Floats with
+            integral values are converted to ints, so that, e.g.,
+            ``min_time_delta=0`` and ``min_time_delta=0.0`` produce the same
+            params.
+    """
+    non_params = {"samples", "sample_rate", "x", "times", "frequencies"}
+
+    params = {}
+    for func in (get_spectrogram, find_peaks_2d, hash_peaks):
+        for name, param in inspect.signature(func).parameters.items():
+            if name in non_params:
+                continue
+            value = kwargs.get(name, param.default)
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            params[name] = value
+    return params
+
+
+def fingerprint_from_file(
+    fpath, delete=False, return_stats=False, filehash=None, **kwargs
+):
     """
     Fingerprint an audio file by reading the file and obtaining the fingerprint
     for each audio channel. Wraps :func:`fingerprint_from_signal`.
@@ -197,29 +269,48 @@ def fingerprint_from_file(fpath, delete=False, **kwargs):
     Args:
         fpath (str): Path to audio file.
         delete (bool): Delete file after fingerprinting.
+        return_stats (bool): Also return a dict of file statistics.
+        filehash (str): SHA1 hash of the file, if already known (it isn't
+            computed again). See :func:`read_file`.
         **kwargs: Keyword args for :func:`fingerprint_from_signal`.
 
     Returns:
-        tuple: (hashes, filehash)
+        tuple: (hashes, filehash) or (hashes, filehash, stats)
             - hashes (List[Tuple[str, float]]): List of tuples where each tuple
               is a (hash, absolute_offset) pair. See :func:`hash_peaks`.
             - filehash (str): SHA1 hash of the file.
+            - stats (dict): Only returned if ``return_stats=True``. Contains
+              the audio duration in seconds and the total number of
+              spectrogram peaks across all channels::
+
+                {
+                    "duration": float,
+                    "num_peaks": int
+                }
 
     .. note::
         Sample rate is obtained from the file. ``sample_rate`` should not be
         passed as part of ``**kwargs``.
     """
-    channels, sample_rate, filehash = util.read_file(fpath)
+    channels, sample_rate, filehash = util.read_file(fpath, filehash)
 
     hashes = []
+    num_peaks = 0
     for channel in channels:
         samples = channel
-        hashes.extend(
-            fingerprint_from_signal(samples, sample_rate=sample_rate, **kwargs)
+        channel_hashes, channel_num_peaks = fingerprint_from_signal(
+            samples, return_num_peaks=True, sample_rate=sample_rate, **kwargs
         )
+        hashes.extend(channel_hashes)
+        num_peaks += channel_num_peaks
     if delete:
         os.remove(fpath)
         logging.info(f"Deleted file {fpath}")
+
+    if return_stats:
+        duration = len(channels[0]) / sample_rate if channels else 0
+        stats = {"duration": duration, "num_peaks": num_peaks}
+        return hashes, filehash, stats
     return hashes, filehash
 
 
@@ -233,7 +324,9 @@ async def fingerprint_song(song, loop, executor, out_queue=None, **kwargs):
         song (dict): Dict corresponding to an audio file. Must contain a
             ``path`` key containing the path to the downloaded audio file
             (or ``None``) if the download wasn't successful and the file
-            doesn't exist.
+            doesn't exist. If it contains a ``filehash`` key (e.g., computed
+            to skip files already in the database), the file isn't hashed
+            again.
         loop (asyncio.BaseEventLoop): asyncio EventLoop.
         executor (concurrent.futures.Executor): ``concurrent.futures``
             ThreadPoolExecutor or ProcessPoolExecutor in which the audio file
@@ -244,30 +337,41 @@ async def fingerprint_song(song, loop, executor, out_queue=None, **kwargs):
 
     Returns:
         dict: song
-            Input dict with a ``filehash`` key and a ``fingerprints`` key
+            Input dict with a ``filehash`` key, a ``fingerprints`` key
             containing a list of fingerprints (returned by
-            :func:`fingerprint_from_file`) added to it::
+            :func:`fingerprint_from_file`), and a ``num_peaks`` key
+            containing the number of spectrogram peaks added to it::
 
                 {
                     "filehash": str,
                     "fingerprints": List[Tuple[str, int]],
+                    "num_peaks": int,
                 }
+
+            If the song's ``duration`` is ``None`` (e.g., for local files),
+            it's set to the duration of the audio file.
     """
+    known_filehash = song.get("filehash")
     song["filehash"] = None
     song["fingerprints"] = None
+    song["num_peaks"] = None
 
     if song["path"]:
         # Make partial with kwargs since run_in_executor only takes *args.
         fingerprint_from_file_partial = functools.partial(
-            fingerprint_from_file, song["path"], **kwargs
+            fingerprint_from_file, song["path"], return_stats=True,
+            filehash=known_filehash, **kwargs
         )
 
-        hashes, filehash = await loop.run_in_executor(
+        hashes, filehash, stats = await loop.run_in_executor(
             executor, fingerprint_from_file_partial
         )
 
         song["fingerprints"] = hashes
         song["filehash"] = filehash
+        song["num_peaks"] = stats["num_peaks"]
+        if song.get("duration") is None:
+            song["duration"] = stats["duration"]
         logging.info(f"Fingerprinted {song['path']} ({len(hashes)} hashes)")
 
     if out_queue is not None:
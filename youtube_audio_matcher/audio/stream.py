@@ -0,0 +1,270 @@
+import numpy as np
+
+from .fingerprint import find_peaks_2d, get_spectrogram, hash_peaks
+
+
+class StreamFingerprinter:
+    """
+    Incrementally fingerprint a single channel of a continuous audio stream
+    (e.g., raw PCM from a capture process). Samples are added as they arrive
+    via :meth:`update`, which returns only the hashes that became available
+    as a result. Spectrogram frames, peaks, and hashes are computed once; only
+    a small margin of spectrogram columns (needed for peak finding) is
+    recomputed on each update.
+
+    The hashes are the same as those returned by
+    :func:`youtube_audio_matcher.audio.fingerprint_from_signal` for the
+    complete signal, except that the background mask used by
+    :func:`youtube_audio_matcher.audio.find_peaks_2d` is determined from the
+    buffered columns rather than the whole spectrogram.
+    """
+
+    def __init__(
+        self, sample_rate=44100, win_size=4096, win_overlap_ratio=0.5,
+        spectrogram_backend="scipy", filter_connectivity=1,
+        filter_dilation=10, erosion_iterations=1, min_amplitude=None,
+        **kwargs
+    ):
+        """
+        Args:
+            sample_rate (int): Audio sample rate (Hz).
+            win_size (int): See
+                :func:`youtube_audio_matcher.audio.get_spectrogram`.
+            win_overlap_ratio (float): See
+                :func:`youtube_audio_matcher.audio.get_spectrogram`.
+            spectrogram_backend (str): See
+                :func:`youtube_audio_matcher.audio.get_spectrogram`.
+            filter_connectivity (int): See
+                :func:`youtube_audio_matcher.audio.find_peaks_2d`.
+            filter_dilation (int): See
+                :func:`youtube_audio_matcher.audio.find_peaks_2d`.
+            erosion_iterations (int): See
+                :func:`youtube_audio_matcher.audio.find_peaks_2d`.
+            min_amplitude (float): See
+                :func:`youtube_audio_matcher.audio.find_peaks_2d`.
+            **kwargs: Keyword arguments for
+                :func:`youtube_audio_matcher.audio.hash_peaks`.
+        """
+        self.sample_rate = sample_rate
+        self.win_size = win_size
+        self.hop_size = win_size - int(win_size * win_overlap_ratio)
+
+        self._spectrogram_kwargs = {
+            "sample_rate": sample_rate,
+            "win_size": win_size,
+            "win_overlap_ratio": win_overlap_ratio,
+            "spectrogram_backend": spectrogram_backend,
+        }
+        self._peaks_kwargs = {
+            "filter_connectivity": filter_connectivity,
+            "filter_dilation": filter_dilation,
+            "erosion_iterations": erosion_iterations,
+            "min_amplitude": min_amplitude,
+        }
+
+        hash_peaks_keys = [
+            "fanout", "min_time_delta", "max_time_delta", "hash_length",
+            "time_bin_size", "freq_bin_size",
+        ]
+        self._hash_kwargs = {
+            k: v for k, v in kwargs.items() if k in hash_peaks_keys
+        }
+        self.fanout = self._hash_kwargs.get("fanout", 10)
+        self.min_time_delta = self._hash_kwargs.get("min_time_delta", 0)
+        self.max_time_delta = self._hash_kwargs.get("max_time_delta", 100)
+
+        # Number of spectrogram columns on either side of a column needed to
+        # determine whether it contains a peak (half the filter kernel size).
+        self._margin = filter_dilation
+
+        # Buffered samples, beginning at sample index `_sample_start`.
+        self._samples = np.zeros(0)
+        self._sample_start = 0
+
+        # Index of the next spectrogram frame (column) to compute.
+        self._next_frame = 0
+
+        # Buffered spectrogram columns, beginning at frame `_spec_start`.
+        self._spectrogram = None
+        self._freq = None
+        self._spec_start = 0
+
+        # Index of the first frame whose peaks haven't been finalized.
+        self._final_frame = 0
+
+        # Peaks (sorted by time) that haven't been used as anchors yet.
+        self._peak_times = np.zeros(0)
+        self._peak_freqs = np.zeros(0)
+
+    @property
+    def time(self):
+        """
+        float: Stream time (in seconds) up to which samples have been added.
+        """
+        return (self._sample_start + len(self._samples)) / self.sample_rate
+
+    def _frame_time(self, frame):
+        """
+        Time (in seconds) of a spectrogram frame, i.e., the center of its
+        window (as returned by
+        :func:`youtube_audio_matcher.audio.get_spectrogram`).
+        """
+        return (frame * self.hop_size + self.win_size / 2) / self.sample_rate
+
+    def update(self, samples):
+        """
+        Add samples to the stream.
+
+        Args:
+            samples (np.ndarray): 1D array of new audio samples.
+
+        Returns:
+            List[Tuple[str, float]]: hashes
+                New (hash, absolute_offset) pairs, where offsets are relative
+                to the beginning of the stream. See
+                :func:`youtube_audio_matcher.audio.hash_peaks`.
+        """
+        self._samples = np.concatenate((self._samples, samples))
+        self._update_spectrogram()
+        self._update_peaks(final=False)
+        return self._update_hashes(final=False)
+
+    def flush(self):
+        """
+        Signal the end of the stream and get all remaining hashes.
+
+        Returns:
+            List[Tuple[str, float]]: hashes
+                See :meth:`update`.
+        """
+        self._update_peaks(final=True)
+        return self._update_hashes(final=True)
+
+    def _update_spectrogram(self):
+        """
+        Compute spectrogram columns for all complete frames in the sample
+        buffer and drop samples that are no longer needed.
+        """
+        num_samples = self._sample_start + len(self._samples)
+        num_frames = (num_samples - self.win_size) // self.hop_size + 1
+        if num_frames <= self._next_frame:
+            return
+
+        start = self._next_frame * self.hop_size - self._sample_start
+        end = (
+            (num_frames - 1) * self.hop_size + self.win_size
+            - self._sample_start
+        )
+        spectrogram, _, freq = get_spectrogram(
+            self._samples[start:end], **self._spectrogram_kwargs
+        )
+        self._freq = freq
+
+        if self._spectrogram is None:
+            self._spectrogram = spectrogram
+        else:
+            self._spectrogram = np.concatenate(
+                (self._spectrogram, spectrogram), axis=1
+            )
+        self._next_frame = num_frames
+
+        # Drop samples that were only needed for the computed frames.
+        drop = self._next_frame * self.hop_size - self._sample_start
+        self._samples = self._samples[drop:]
+        self._sample_start += drop
+
+    def _update_peaks(self, final):
+        """
+        Find peaks in spectrogram columns that have enough columns on either
+        side to be finalized (or in all remaining columns if ``final``), add
+        them to the peak buffer, and drop columns that are no longer needed.
+        """
+        if self._spectrogram is None:
+            return
+
+        final_end = self._next_frame
+        if not final:
+            final_end -= self._margin
+        if final_end <= self._final_frame:
+            return
+
+        peaks = find_peaks_2d(self._spectrogram, **self._peaks_kwargs)
+
+        # Only keep peaks in the newly finalized columns.
+        col_start = self._final_frame - self._spec_start
+        col_end = final_end - self._spec_start
+        peak_freq_idxs, peak_time_idxs = np.where(
+            peaks[:, col_start:col_end]
+        )
+        peak_frames = peak_time_idxs + self._final_frame
+
+        # Sort by time (stable, to preserve frequency order for peaks in the
+        # same column) as in hash_peaks.
+        order = np.argsort(peak_frames, kind="stable")
+        self._peak_times = np.concatenate(
+            (self._peak_times, self._frame_time(peak_frames[order]))
+        )
+        self._peak_freqs = np.concatenate(
+            (self._peak_freqs, self._freq[peak_freq_idxs[order]])
+        )
+        self._final_frame = final_end
+
+        # Keep only the columns needed to finalize subsequent columns.
+        keep_start = max(self._final_frame - self._margin, self._spec_start)
+        self._spectrogram = self._spectrogram[
+            :, keep_start - self._spec_start:
+        ]
+        self._spec_start = keep_start
+
+    def _update_hashes(self, final):
+        """
+        Hash buffered peaks whose target zone is complete, i.e., anchor peaks
+        that either have ``fanout`` target peaks or for which no target peaks
+        can be added by future samples (or all peaks if ``final``).
+        """
+        times = self._peak_times
+        if not len(times):
+            return []
+
+        # For each anchor peak, the range of indices of its candidate target
+        # peaks (peaks after it within the target zone).
+        idxs = np.arange(len(times))
+        lo = np.maximum(
+            idxs + 1,
+            np.searchsorted(times, times + self.min_time_delta, side="left")
+        )
+        hi = np.searchsorted(times, times + self.max_time_delta, side="right")
+        num_pairs = np.clip(hi - lo, 0, self.fanout)
+
+        if final:
+            num_ready = len(times)
+        else:
+            # Peaks in frames that haven't been finalized have a time of at
+            # least that of the first non-finalized frame.
+            next_time = self._frame_time(self._final_frame)
+            ready = (
+                (hi - lo >= self.fanout)
+                | (next_time - times > self.max_time_delta)
+            )
+            # Anchors are emitted in order, so only hash up to the first
+            # anchor that isn't ready.
+            not_ready = np.flatnonzero(~ready)
+            num_ready = not_ready[0] if len(not_ready) else len(times)
+
+        if not num_ready:
+            return []
+
+        # Hash only the peaks needed by the ready anchors and keep only the
+        # hashes belonging to them (hash_peaks returns hashes in anchor order).
+        num_hashes = int(np.sum(num_pairs[:num_ready]))
+        num_peaks = max(
+            num_ready, int(np.max((lo + num_pairs)[:num_ready]))
+        )
+        hashes = hash_peaks(
+            times[:num_peaks], self._peak_freqs[:num_peaks],
+            **self._hash_kwargs
+        )[:num_hashes]
+
+        self._peak_times = self._peak_times[num_ready:]
+        self._peak_freqs = self._peak_freqs[num_ready:]
+        return hashes
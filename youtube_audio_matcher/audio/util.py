@@ -82,12 +82,15 @@ def hash_file(fpath, block_size=2**16):
     return hash_.hexdigest()
 
 
-def read_file(fpath):
+def read_file(fpath, filehash=None):
     """
     Read an audio file and extract audio information and file SHA1 hash.
 
     Args:
         fpath (str): Path to file.
+        filehash (str): SHA1 hash of the file, if already known (e.g.,
+            computed by :func:`hash_file`), in which case the file isn't
+            hashed again.
 
     Returns:
         tuple: (channel_data, sample_rate, sha1_hash)
@@ -104,6 +107,7 @@ def read_file(fpath):
     num_channels = audio_seg.channels
     channel_data = [raw_data[ch::num_channels] for ch in range(num_channels)]
     sample_rate = audio_seg.frame_rate
-    filehash = hash_file(fpath)
+    if filehash is None:
+        filehash = hash_file(fpath)
 
     return channel_data, sample_rate, filehash
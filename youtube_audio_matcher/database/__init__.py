@@ -1,4 +1,26 @@
-from .database import Database, update_database
-from .schema import Fingerprint, Song
+from .align import align_fingerprints
+from .async_database import AsyncDatabase
+from .bloom import BloomFilter
+from .bulk import bulk_insert_fingerprints
+from .database import Database, load_shards, update_database
+from .duplicates import find_duplicates
+from .lookup import lookup_fingerprints
+from .minhash import lsh_buckets, minhash_signature
+from .postings_cache import PostingsCache
+from .refingerprint import refingerprint_songs
+from .schema import (
+    DatabaseInfo, Fingerprint, FingerprintProfile, HashFrequency,
+    MatchResult, SketchBand, Song, SongSketch
+)
+from .sharding import shard_bounds
+from .shards import read_shard, write_shard, write_shards
 
-__all__ = ["Database", "Fingerprint", "Song", "update_database"]
+__all__ = [
+    "AsyncDatabase", "BloomFilter", "Database", "DatabaseInfo", "Fingerprint",
+    "FingerprintProfile", "HashFrequency", "MatchResult", "PostingsCache",
+    "SketchBand", "Song", "SongSketch", "align_fingerprints",
+    "bulk_insert_fingerprints", "find_duplicates", "load_shards",
+    "lookup_fingerprints", "lsh_buckets", "minhash_signature", "read_shard",
+    "refingerprint_songs", "shard_bounds", "update_database", "write_shard",
+    "write_shards",
+]
@@ -1,27 +1,151 @@
 import json
+import sys
 
+import youtube_audio_matcher.audio
 import youtube_audio_matcher.database
 from ._argparsers import get_parser
 
 
+def _print_progress(num_done, num_partitions, num_rows):
+    print(
+        f"Scanned {num_done}/{num_partitions} partitions "
+        f"({num_rows} fingerprints)",
+        file=sys.stderr
+    )
+
+
+def _print_load_progress(num_done, num_total):
+    print(f"Processed {num_done}/{num_total} shards", file=sys.stderr)
+
+
+def _print_refingerprint_progress(num_done, num_total, num_skipped):
+    print(
+        f"Processed {num_done}/{num_total} songs ({num_skipped} skipped)",
+        file=sys.stderr
+    )
+
+
 def cli():
     parser = get_parser()
     args = parser.parse_args()
 
-    db = youtube_audio_matcher.database.Database(
-        user=args.user, password=args.password, db_name=args.db_name,
-        host=args.host, port=args.port, dialect=args.dialect,
-        driver=args.driver
-    )
+    db_kwargs = {
+        "user": args.user, "password": args.password,
+        "db_name": args.db_name, "host": args.host, "port": args.port,
+        "dialect": args.dialect, "driver": args.driver,
+        "bloom_filter_path": args.bloom_filter_path,
+        "pool_size": args.pool_size, "max_overflow": args.max_overflow,
+        "insert_batch_size": args.insert_batch_size,
+        "lookup_strategy": args.lookup_strategy,
+        "lookup_threshold": args.lookup_threshold,
+        "lookup_chunk_size": args.lookup_chunk_size,
+        "lookup_workers": args.lookup_workers, "read_urls": args.read_urls,
+        "shard_urls": args.shard_urls,
+        "postings_cache_size": args.postings_cache_size,
+    }
+    fingerprint_keys = [
+        "erosion_iterations", "fanout", "filter_connectivity",
+        "filter_dilation", "hash_length", "max_time_delta", "min_time_delta",
+        "min_amplitude", "spectrogram_backend", "win_overlap_ratio",
+        "win_size",
+    ]
+    fingerprint_kwargs = {k: getattr(args, k) for k in fingerprint_keys}
+    db = youtube_audio_matcher.database.Database(**db_kwargs)
 
     if args.output:
         db_dict = db.as_dict()
         with open(args.output, "w") as f:
             json.dump(db_dict, f, indent=2)
+    elif args.backfill_song_stats:
+        num_songs = db.backfill_song_stats()
+        print(f"Updated stats for {num_songs} songs")
     elif args.delete:
         db.delete_all()
     elif args.drop:
         db.drop_all_tables()
+    elif args.export_path:
+        num_songs, num_fingerprints = db.export_ndjson(
+            args.export_path, batch_size=args.export_batch_size
+        )
+        print(
+            f"Exported {num_songs} songs and {num_fingerprints} fingerprints "
+            f"to {args.export_path}"
+        )
+    elif args.duplicates_path:
+        clusters = youtube_audio_matcher.database.find_duplicates(
+            db_kwargs, num_workers=args.duplicate_workers,
+            num_partitions=args.duplicate_partitions,
+            min_matches=args.duplicate_min_matches,
+            min_confidence=args.duplicate_min_confidence,
+            max_postings=args.duplicate_max_postings,
+            progress=_print_progress
+        )
+        with open(args.duplicates_path, "w") as f:
+            json.dump(clusters, f, indent=2)
+        print(
+            f"Found {len(clusters)} duplicate clusters; written to "
+            f"{args.duplicates_path}"
+        )
+    elif args.import_path:
+        num_songs, num_fingerprints = db.import_ndjson(args.import_path)
+        print(
+            f"Imported {num_songs} songs and {num_fingerprints} fingerprints "
+            f"from {args.import_path}"
+        )
+    elif args.shard_paths:
+        num_songs, num_fingerprints, num_failed = (
+            youtube_audio_matcher.database.load_shards(
+                db_kwargs, args.shard_paths, num_workers=args.load_workers,
+                progress=_print_load_progress
+            )
+        )
+        print(
+            f"Loaded {num_songs} songs and {num_fingerprints} fingerprints "
+            f"({num_failed} shards failed)"
+        )
+    elif args.migrate:
+        num_rows = db.migrate_fingerprint_table(
+            drop_id=args.drop_fingerprint_id
+        )
+        print(f"Migrated fingerprint table ({num_rows} rows)")
+    elif args.rebuild_bloom_filter:
+        if args.bloom_filter_path is None:
+            parser.error("--rebuild-bloom-filter requires --bloom-filter")
+        num_hashes = db.rebuild_bloom_filter(
+            capacity=args.bloom_capacity, error_rate=args.bloom_error_rate
+        )
+        print(f"Rebuilt Bloom filter ({num_hashes} hashes)")
+    elif args.rebuild_hash_frequencies:
+        num_hashes = db.rebuild_hash_frequencies()
+        print(f"Rebuilt hash frequency table ({num_hashes} hashes)")
+    elif args.rebuild_sketches:
+        num_songs = db.rebuild_song_sketches()
+        print(f"Rebuilt song sketches ({num_songs} songs)")
+    elif args.profiles:
+        print(json.dumps(db.query_profiles(), indent=2))
+    elif args.refingerprint:
+        profile_id, num_songs, num_skipped = (
+            youtube_audio_matcher.database.refingerprint_songs(
+                db_kwargs, fingerprint_kwargs,
+                num_workers=args.refingerprint_workers,
+                batch_size=args.refingerprint_batch_size,
+                progress=_print_refingerprint_progress
+            )
+        )
+        print(
+            f"Refingerprinted {num_songs} songs with fingerprint profile "
+            f"{profile_id} ({num_skipped} skipped)"
+        )
+    elif args.tag_profile:
+        profile_id = db.get_profile_id(
+            youtube_audio_matcher.audio.fingerprint_params(
+                **fingerprint_kwargs
+            )
+        )
+        num_songs = db.set_song_profiles(profile_id)
+        print(
+            f"Tagged {num_songs} songs with fingerprint profile {profile_id}"
+        )
     elif args.songs:
         songs = db.query_songs()
         songs_str = json.dumps(songs, indent=2)
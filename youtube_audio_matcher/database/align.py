@@ -0,0 +1,183 @@
+import uuid
+
+import sqlalchemy
+from sqlalchemy.ext.compiler import compiles
+
+from .schema import Fingerprint
+
+
+class _int_div(sqlalchemy.sql.expression.FunctionElement):
+    """
+    Integer division of two non-negative integer expressions (``DIV`` on
+    MySQL, where ``/`` returns a decimal, and ``/`` on other dialects).
+    """
+    type = sqlalchemy.Integer()
+    name = "int_div"
+    inherit_cache = True
+
+
+@compiles(_int_div)
+def _compile_int_div(element, compiler, **kwargs):
+    dividend, divisor = list(element.clauses)
+    return (
+        f"(({compiler.process(dividend, **kwargs)}) / "
+        f"({compiler.process(divisor, **kwargs)}))"
+    )
+
+
+@compiles(_int_div, "mysql")
+def _compile_int_div_mysql(element, compiler, **kwargs):
+    dividend, divisor = list(element.clauses)
+    return (
+        f"(({compiler.process(dividend, **kwargs)}) DIV "
+        f"({compiler.process(divisor, **kwargs)}))"
+    )
+
+
+def align_fingerprints(
+    conn, songs_fingerprints, bin_size=1, top_k=1, chunk_size=500,
+    song_ids=None
+):
+    """
+    Align the fingerprints of one or more query songs with the Fingerprint
+    table in the database, i.e., the database-side equivalent of
+    :func:`youtube_audio_matcher.audio.align_matches`. The query
+    fingerprints are loaded into a temporary table (visible only to this
+    connection and dropped afterward, or discarded when the transaction is
+    rolled back if the query fails) that is joined with the Fingerprint
+    table on hash. The relative offsets of the matching pairs are binned and
+    counted per (query song, database song, bin), each database song is
+    reduced to its peak bin, and only the ``top_k`` database songs with the
+    most matches in their peak bin are returned for each query song, so the
+    matching rows never leave the database.
+    Requires window function support (PostgreSQL, MySQL 8.0+, or SQLite
+    3.25+) and integer offsets (see
+    :meth:`youtube_audio_matcher.database.Database.query_offset_unit`).
+
+    Args:
+        conn (sqlalchemy.engine.Connection): Database connection.
+        songs_fingerprints (List[List[tuple]]): For each query song, a list
+            of (hash, offset) fingerprints with integer offsets (in the same
+            unit as the database offsets).
+        bin_size (int): Size of relative offset bins, in offset units.
+        top_k (int): Max number of candidate database songs returned per
+            query song.
+        chunk_size (int): Number of fingerprints per insert statement when
+            loading the temporary table.
+        song_ids (List[int]): If provided, only these database songs are
+            matched (e.g., candidates returned by
+            :meth:`youtube_audio_matcher.database.Database.query_candidates`).
+
+    Returns:
+        List[List[dict]]: For each query song, a list of up to ``top_k``
+        candidates ordered by decreasing number of matches, where each
+        candidate is a dict containing the database song id, the number of
+        matching fingerprints in the peak bin, and the relative offset (the
+        start of the peak bin, in offset units)::
+
+            {
+                "song_id": int,
+                "num_matching_fingerprints": int,
+                "relative_offset": int
+            }
+    """
+    rows = [
+        {"query_id": query_id, "hash": hash_, "offset": offset}
+        for query_id, fingerprints in enumerate(songs_fingerprints)
+        for hash_, offset in fingerprints
+    ]
+    candidates = [[] for _ in songs_fingerprints]
+    if not rows:
+        return candidates
+
+    # Relative offsets (database offset - query offset) are shifted by a
+    # multiple of the bin size so that they're non-negative, i.e., so that
+    # integer division (which truncates toward zero) bins them like floor
+    # division would.
+    max_offset = max(row["offset"] for row in rows)
+    shift_bins = max_offset // bin_size + 1
+
+    # The table is only dropped if the query succeeds: on PostgreSQL, a
+    # failed statement aborts the transaction, so dropping the table would
+    # fail too (and mask the original error), and the rollback discards the
+    # table anyway. Use a unique name in case a previous query on the same
+    # (pooled) connection of another dialect left its table behind.
+    tmp_table = sqlalchemy.Table(
+        f"tmp_query_fp_{uuid.uuid4().hex[:12]}", sqlalchemy.MetaData(),
+        sqlalchemy.Column("query_id", sqlalchemy.Integer, nullable=False),
+        sqlalchemy.Column("hash", sqlalchemy.String(40), nullable=False),
+        sqlalchemy.Column("offset", sqlalchemy.Integer, nullable=False),
+        prefixes=["TEMPORARY"]
+    )
+    tmp_table.create(conn)
+    for i in range(0, len(rows), chunk_size):
+        conn.execute(tmp_table.insert(), rows[i:i + chunk_size])
+    if conn.dialect.name == "postgresql":
+        # Temporary tables aren't analyzed automatically; without
+        # statistics, the planner may not use the hash index.
+        preparer = conn.dialect.identifier_preparer
+        conn.execute(
+            sqlalchemy.text(f"ANALYZE {preparer.format_table(tmp_table)}")
+        )
+
+    # The shift and bin size are rendered inline (rather than as bound
+    # parameters) so that the expression in the GROUP BY clause is
+    # identical to the one selected, as PostgreSQL requires.
+    rel_bin = _int_div(
+        Fingerprint.offset - tmp_table.c.offset
+        + sqlalchemy.literal_column(str(int(shift_bins * bin_size))),
+        sqlalchemy.literal_column(str(int(bin_size)))
+    )
+    joined = sqlalchemy.select(
+        tmp_table.c.query_id, Fingerprint.song_id,
+        rel_bin.label("rel_bin"),
+        sqlalchemy.func.count().label("num_matches")
+    ).join(
+        Fingerprint.__table__, Fingerprint.hash == tmp_table.c.hash
+    )
+    if song_ids is not None:
+        # Compared as an expression so that it only filters the joined
+        # rows (see youtube_audio_matcher.database.lookup).
+        joined = joined.where((Fingerprint.song_id + 0).in_(song_ids))
+    binned = joined.group_by(
+        tmp_table.c.query_id, Fingerprint.song_id, rel_bin
+    ).subquery("binned")
+
+    # Reduce each database song to its peak bin first, so that a song
+    # only takes up one of the top_k candidates per query song.
+    bin_rank = sqlalchemy.func.row_number().over(
+        partition_by=(binned.c.query_id, binned.c.song_id),
+        order_by=(binned.c.num_matches.desc(), binned.c.rel_bin)
+    )
+    ranked_bins = sqlalchemy.select(
+        binned, bin_rank.label("bin_rank")
+    ).subquery("ranked_bins")
+    peaks = sqlalchemy.select(
+        ranked_bins.c.query_id, ranked_bins.c.song_id,
+        ranked_bins.c.rel_bin, ranked_bins.c.num_matches
+    ).where(ranked_bins.c.bin_rank == 1).subquery("peaks")
+
+    rank = sqlalchemy.func.row_number().over(
+        partition_by=peaks.c.query_id,
+        order_by=(peaks.c.num_matches.desc(), peaks.c.song_id)
+    )
+    ranked = sqlalchemy.select(
+        peaks, rank.label("match_rank")
+    ).subquery("ranked")
+    select = sqlalchemy.select(
+        ranked.c.query_id, ranked.c.song_id, ranked.c.rel_bin,
+        ranked.c.num_matches
+    ).where(ranked.c.match_rank <= top_k).order_by(
+        ranked.c.query_id, ranked.c.match_rank
+    )
+
+    for row in conn.execute(select):
+        candidates[row.query_id].append(
+            {
+                "song_id": row.song_id,
+                "num_matching_fingerprints": row.num_matches,
+                "relative_offset": (row.rel_bin - shift_bins) * bin_size,
+            }
+        )
+    tmp_table.drop(conn)
+    return candidates
@@ -0,0 +1,276 @@
+import asyncio
+import itertools
+import logging
+import os
+
+import sqlalchemy
+import sqlalchemy.ext.asyncio
+
+from .bloom import BloomFilter
+from .database import (
+    Database, _engines_with_schema, _get_database_url, _set_sqlite_pragmas
+)
+from .postings_cache import PostingsCache
+
+# Default asyncio driver for each dialect.
+ASYNC_DRIVERS = {
+    "mysql": "aiomysql",
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+# Database methods that only read and are sent to read replicas, if any.
+# query_matches isn't one of them because it creates a temporary table,
+# which replicas (e.g., PostgreSQL hot standbys) may reject.
+READ_METHODS = {
+    "count_fingerprints", "count_songs", "query_candidates",
+    "query_content_version", "query_fingerprints", "query_hash_frequencies",
+    "query_profiles", "query_songs",
+}
+
+
+class _RunSyncDatabase(Database):
+    """
+    :class:`Database` whose session and engine are the synchronous facades
+    of an ``AsyncSession`` and ``AsyncEngine``. Its methods must only be
+    called inside ``AsyncSession.run_sync`` (see :class:`AsyncDatabase`).
+    """
+
+    def __init__(
+        self, session, engine, bloom_filter, insert_batch_size, lookup_kwargs,
+        postings_cache=None, read_from_replica=False, bloom_filter_path=None
+    ):
+        # Chunks can't be queried in parallel threads because database I/O
+        # must happen in the event loop's thread.
+        self._init_attributes(
+            session, engine, insert_batch_size,
+            dict(lookup_kwargs, num_workers=1),
+            bloom_filter_path=bloom_filter_path, bloom_filter=bloom_filter,
+            postings_cache=postings_cache, read_from_replica=read_from_replica
+        )
+
+    def __del__(self):
+        # The session is closed by AsyncDatabase.
+        pass
+
+
+def _create_async_engine(url, engine_kwargs):
+    """
+    Create a SQLAlchemy asyncio engine, using the driver in
+    :data:`ASYNC_DRIVERS` if ``url`` doesn't specify one. SQLite engines set
+    :data:`youtube_audio_matcher.database.database.SQLITE_PRAGMAS` on each
+    new connection.
+    """
+    url = sqlalchemy.engine.make_url(url)
+    backend = url.get_backend_name()
+    if "+" not in url.drivername and backend in ASYNC_DRIVERS:
+        url = url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+    engine_kwargs = dict(engine_kwargs)
+    if backend == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            raise ValueError(
+                "AsyncDatabase doesn't support in-memory SQLite databases"
+            )
+        engine_kwargs.pop("pool_size", None)
+        engine_kwargs.pop("max_overflow", None)
+        engine_kwargs["connect_args"] = {"check_same_thread": False}
+
+    engine = sqlalchemy.ext.asyncio.create_async_engine(url, **engine_kwargs)
+    if backend == "sqlite":
+        sqlalchemy.event.listen(
+            engine.sync_engine, "connect", _set_sqlite_pragmas
+        )
+    return engine
+
+
+def _async_method(name):
+    """
+    Create an :class:`AsyncDatabase` coroutine method that runs the
+    :class:`Database` method ``name`` in its own session.
+    """
+    async def method(self, *args, **kwargs):
+        return await self._run(name, *args, **kwargs)
+
+    method.__name__ = name
+    method.__doc__ = (
+        f"Coroutine version of :meth:`Database.{name}`; takes the same "
+        "arguments and returns the same result."
+    )
+    return method
+
+
+class AsyncDatabase:
+    """
+    asyncio counterpart of :class:`Database` that uses a SQLAlchemy asyncio
+    engine (with an asyncio driver, e.g., asyncpg, aiomysql, or aiosqlite)
+    so that database queries can be awaited directly from coroutines
+    instead of occupying an executor worker.
+
+    Each method call runs the corresponding :class:`Database` method in its
+    own ``AsyncSession`` (and transaction), so a single instance can be
+    shared by concurrent tasks. If ``read_urls`` are provided, read-only
+    queries (:data:`READ_METHODS`) are sent to the read replicas round-robin,
+    one call at a time. All methods must be awaited from the event loop in
+    which the instance was first used, and :meth:`dispose` should be awaited
+    when the instance is no longer needed.
+    """
+
+    def __init__(
+        self, user=None, password=None, db_name=None, host="localhost",
+        port=None, dialect="postgresql", driver=None, bloom_filter_path=None,
+        pool_size=None, max_overflow=None, pool_pre_ping=True,
+        insert_batch_size=10000, lookup_strategy=None, lookup_threshold=5000,
+        lookup_chunk_size=500, lookup_workers=4, read_urls=None,
+        shard_urls=None, postings_cache_size=0
+    ):
+        """
+        Args:
+            driver (str): asyncio SQL database driver to use. Defaults to the
+                driver in :data:`ASYNC_DRIVERS` for ``dialect``.
+            lookup_workers (int): Ignored; chunks of hashes are always
+                queried sequentially.
+            read_urls (List[str]): SQLAlchemy database URLs of read replicas.
+                URLs without a driver use the driver in
+                :data:`ASYNC_DRIVERS`.
+            shard_urls (List[str]): Not supported; must be ``None``.
+            postings_cache_size (float): Max size (in MiB) of the instance's
+                postings cache, or 0 to disable it. Unlike :class:`Database`
+                instances, each instance has its own cache.
+
+        See :class:`Database` for the remaining arguments.
+
+        Raises:
+            ValueError: if no ``db_name`` or if ``shard_urls`` are provided.
+        """
+        if shard_urls:
+            raise ValueError("AsyncDatabase doesn't support sharded databases")
+        if driver is None:
+            driver = ASYNC_DRIVERS.get(dialect)
+
+        url = _get_database_url(
+            user, password, db_name, host, port, dialect, driver
+        )
+        logging.debug(f"Connecting to database URL {url}")
+
+        engine_kwargs = {"pool_pre_ping": pool_pre_ping}
+        if pool_size is not None:
+            engine_kwargs["pool_size"] = pool_size
+        if max_overflow is not None:
+            engine_kwargs["max_overflow"] = max_overflow
+
+        self.engine = _create_async_engine(url, engine_kwargs)
+        self.Session = sqlalchemy.orm.sessionmaker(
+            self.engine, class_=sqlalchemy.ext.asyncio.AsyncSession
+        )
+
+        self.read_engines = [
+            _create_async_engine(read_url, engine_kwargs)
+            for read_url in (read_urls or [])
+        ]
+        self._read_sessions = itertools.cycle(
+            [
+                sqlalchemy.orm.sessionmaker(
+                    read_engine, class_=sqlalchemy.ext.asyncio.AsyncSession
+                )
+                for read_engine in self.read_engines
+            ] or [self.Session]
+        )
+        self._schema_key = (os.getpid(), url, "async")
+        self._schema_lock = None
+
+        self.insert_batch_size = insert_batch_size
+        self.lookup_kwargs = {
+            "strategy": lookup_strategy,
+            "threshold": lookup_threshold,
+            "chunk_size": lookup_chunk_size,
+            "num_workers": lookup_workers,
+        }
+        self.bloom_filter_path = bloom_filter_path
+        self.bloom_filter = None
+        if bloom_filter_path is not None and os.path.exists(bloom_filter_path):
+            self.bloom_filter = BloomFilter(bloom_filter_path)
+        self.postings_cache = None
+        if postings_cache_size:
+            self.postings_cache = PostingsCache(
+                int(postings_cache_size * 2 ** 20)
+            )
+
+    def _sync_database(self, sync_session, read_from_replica=False):
+        return _RunSyncDatabase(
+            sync_session, self.engine.sync_engine, self.bloom_filter,
+            self.insert_batch_size, self.lookup_kwargs, self.postings_cache,
+            read_from_replica, self.bloom_filter_path
+        )
+
+    async def _init_schema(self):
+        """
+        Create tables, upgrade the schema, and initialize the content version
+        (once per process and database URL).
+        """
+        if self._schema_key in _engines_with_schema:
+            return
+
+        if self._schema_lock is None:
+            self._schema_lock = asyncio.Lock()
+        async with self._schema_lock:
+            if self._schema_key not in _engines_with_schema:
+                async with self.Session() as session:
+                    await session.run_sync(
+                        lambda sync_session: (
+                            self._sync_database(sync_session)._init_schema()
+                        )
+                    )
+                _engines_with_schema.add(self._schema_key)
+
+    async def _run(self, name, *args, **kwargs):
+        """
+        Run the :class:`Database` method ``name`` in a new session (of the
+        next read replica if ``name`` is in :data:`READ_METHODS`).
+        """
+        await self._init_schema()
+        Session = self.Session
+        read_from_replica = False
+        if name in READ_METHODS:
+            Session = next(self._read_sessions)
+            read_from_replica = bool(self.read_engines)
+
+        async with Session() as session:
+            return await session.run_sync(
+                lambda sync_session: getattr(
+                    self._sync_database(sync_session, read_from_replica), name
+                )(*args, **kwargs)
+            )
+
+    def postings_cache_stats(self):
+        """
+        See :meth:`Database.postings_cache_stats`.
+        """
+        if self.postings_cache is None:
+            return None
+        return self.postings_cache.stats()
+
+    async def dispose(self):
+        """
+        Close all pooled connections.
+        """
+        await self.engine.dispose()
+        for read_engine in self.read_engines:
+            await read_engine.dispose()
+
+    add_fingerprints = _async_method("add_fingerprints")
+    add_match_result = _async_method("add_match_result")
+    add_song = _async_method("add_song")
+    add_songs = _async_method("add_songs")
+    count_fingerprints = _async_method("count_fingerprints")
+    count_songs = _async_method("count_songs")
+    query_candidates = _async_method("query_candidates")
+    query_content_version = _async_method("query_content_version")
+    query_existing = _async_method("query_existing")
+    query_fingerprints = _async_method("query_fingerprints")
+    query_hash_frequencies = _async_method("query_hash_frequencies")
+    query_match_result = _async_method("query_match_result")
+    query_matches = _async_method("query_matches")
+    query_offset_unit = _async_method("query_offset_unit")
+    query_profiles = _async_method("query_profiles")
+    query_songs = _async_method("query_songs")
@@ -0,0 +1,315 @@
+import contextlib
+import hashlib
+import math
+import os
+import struct
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # fcntl is unavailable on Windows, in which case concurrent writers are
+    # not synchronized.
+    fcntl = None
+
+
+@contextlib.contextmanager
+def _lock_file(path):
+    """
+    Open a file and hold an exclusive lock on it (where supported). If the
+    file is replaced (see :func:`rebuild_bloom_filter`) while waiting for the
+    lock, the new file is locked instead, so the file at ``path`` can't be
+    replaced while the lock is held.
+
+    Yields:
+        file: The locked file, opened for reading and writing.
+    """
+    while True:
+        f = open(path, "rb+")
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+            break
+        f.close()
+
+    try:
+        yield f
+    finally:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+
+class BloomFilter:
+    """
+    File-backed `Bloom filter`_ over fingerprint hashes. Used to determine
+    which hashes may exist in the database (and which definitely don't) so
+    that only hashes that may exist are queried.
+
+    The filter is stored as a small header followed by the bit array and is
+    memory-mapped, so it's shared by all processes that open it. Writes are
+    synchronized with an exclusive file lock (where supported). If the file
+    is replaced by :func:`rebuild_bloom_filter`, instances that have the old
+    file open reopen the new file the next time they're used (see
+    :meth:`readd`).
+
+    .. _`Bloom filter`:
+        https://en.wikipedia.org/wiki/Bloom_filter
+    """
+    # Header: magic string, number of bits, number of hash functions,
+    # capacity (expected number of items), number of items added.
+    _magic = b"YAMBLOOM"
+    _header_fmt = "<8sQQQQ"
+    _header_size = struct.calcsize(_header_fmt)
+
+    def __init__(self, path):
+        """
+        Open an existing Bloom filter file. See :meth:`create`.
+
+        Args:
+            path (str): Path to the Bloom filter file.
+
+        Raises:
+            ValueError: If the file is not a valid Bloom filter file.
+        """
+        self.path = path
+        self._open()
+
+    def _open(self):
+        """
+        Open (or reopen) the file at :attr:`path` and memory-map its bit
+        array.
+        """
+        with open(self.path, "rb+") as f:
+            header = f.read(self._header_size)
+            if len(header) < self._header_size:
+                raise ValueError(f"Invalid Bloom filter file {self.path}")
+            magic, num_bits, num_hashes, capacity, _ = struct.unpack(
+                self._header_fmt, header
+            )
+            if magic != self._magic:
+                raise ValueError(f"Invalid Bloom filter file {self.path}")
+
+            self.num_bits = num_bits
+            self.num_hashes = num_hashes
+            self.capacity = capacity
+            # The inode number identifies the file, so that a rebuilt filter
+            # (which replaces the file) can be detected.
+            self.generation = os.fstat(f.fileno()).st_ino
+            self._bits = np.memmap(
+                f, dtype=np.uint8, mode="r+", offset=self._header_size,
+                shape=(math.ceil(num_bits / 8),)
+            )
+
+    def _reopen_if_replaced(self):
+        if os.stat(self.path).st_ino != self.generation:
+            self._open()
+
+    @classmethod
+    def create(cls, path, capacity, error_rate=0.01):
+        """
+        Create a new, empty Bloom filter file, overwriting any existing file.
+
+        Args:
+            path (str): Path to the Bloom filter file.
+            capacity (int): Expected number of unique hashes. The false
+                positive rate increases beyond ``error_rate`` if more hashes
+                than this are added.
+            error_rate (float): Desired false positive rate in the range
+                (0, 1).
+
+        Returns:
+            BloomFilter: The new Bloom filter.
+        """
+        capacity = max(int(capacity), 1)
+        num_bits = math.ceil(
+            -capacity * math.log(error_rate) / (math.log(2) ** 2)
+        )
+        num_hashes = max(round(num_bits / capacity * math.log(2)), 1)
+
+        with open(path, "wb") as f:
+            f.write(
+                struct.pack(
+                    cls._header_fmt, cls._magic, num_bits, num_hashes,
+                    capacity, 0
+                )
+            )
+            f.truncate(cls._header_size + math.ceil(num_bits / 8))
+        return cls(path)
+
+    @property
+    def num_items(self):
+        """
+        int: Number of hashes added to the filter (including duplicates).
+        """
+        with open(self.path, "rb") as f:
+            header = f.read(self._header_size)
+        return struct.unpack(self._header_fmt, header)[4]
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """
+        Lock the file at :attr:`path`, reopening it first if it was replaced
+        since it was opened.
+        """
+        with _lock_file(self.path) as f:
+            if os.fstat(f.fileno()).st_ino != self.generation:
+                self._open()
+            yield f
+
+    def _positions(self, hashes):
+        """
+        Get the bit positions of each hash via double hashing.
+
+        Returns:
+            np.ndarray: Array of shape ``(len(hashes), num_hashes)``.
+        """
+        digests = b"".join(
+            hashlib.blake2b(hash_.encode("utf-8"), digest_size=16).digest()
+            for hash_ in hashes
+        )
+        h = np.frombuffer(digests, dtype=np.uint64).reshape(-1, 2)
+        i = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h[:, :1] + i * h[:, 1:]) % np.uint64(self.num_bits)
+
+    def add(self, hashes):
+        """
+        Add hashes to the filter.
+
+        Args:
+            hashes (List[str]): Hashes to add.
+
+        Returns:
+            int: The :attr:`generation` of the file the hashes were added
+            to (see :meth:`readd`).
+        """
+        with self._lock() as f:
+            self._add(f, hashes)
+            return self.generation
+
+    def readd(self, hashes, generation):
+        """
+        Add hashes again if the filter was rebuilt (i.e., its file was
+        replaced) since they were added. A rebuild may not see rows whose
+        transaction hadn't committed when it read the database, so writers
+        call this after committing the rows whose hashes they added with
+        :meth:`add`. Since :func:`rebuild_bloom_filter` holds the file's lock
+        while it reads the database, a rebuild that started before the
+        commit has replaced the file by the time the lock is acquired here.
+
+        Args:
+            hashes (List[str]): Hashes passed to :meth:`add`.
+            generation (int): :attr:`generation` returned by :meth:`add`.
+        """
+        with self._lock() as f:
+            if self.generation != generation:
+                self._add(f, hashes)
+
+    def _add(self, f, hashes):
+        """
+        Helper function for :meth:`add` and :meth:`readd`; must be called
+        with the (locked) file ``f``.
+        """
+        if not hashes:
+            return
+
+        positions = self._positions(hashes).ravel()
+        masks = np.left_shift(1, positions % 8).astype(np.uint8)
+
+        np.bitwise_or.at(self._bits, positions // 8, masks)
+        self._bits.flush()
+
+        # Update the number of items in the header.
+        f.seek(0)
+        header = struct.unpack(self._header_fmt, f.read(self._header_size))
+        f.seek(0)
+        f.write(
+            struct.pack(self._header_fmt, *header[:4], header[4] + len(hashes))
+        )
+
+    def clear(self):
+        """
+        Remove all hashes from the filter.
+        """
+        with self._lock() as f:
+            self._bits[:] = 0
+            self._bits.flush()
+
+            f.seek(0)
+            header = struct.unpack(
+                self._header_fmt, f.read(self._header_size)
+            )
+            f.seek(0)
+            f.write(struct.pack(self._header_fmt, *header[:4], 0))
+
+    def contains(self, hashes):
+        """
+        Test whether each of a list of hashes may be in the filter.
+
+        Args:
+            hashes (List[str]): Hashes to test.
+
+        Returns:
+            np.ndarray: Boolean array that is ``False`` for each hash that is
+            definitely not in the filter and ``True`` for each hash that may
+            be in the filter.
+        """
+        if not hashes:
+            return np.zeros(0, dtype=bool)
+
+        self._reopen_if_replaced()
+        positions = self._positions(hashes)
+        masks = np.left_shift(1, positions % 8).astype(np.uint8)
+        return np.all(self._bits[positions // 8] & masks, axis=1)
+
+    def filter(self, hashes):
+        """
+        Args:
+            hashes (List[str]): Hashes to filter.
+
+        Returns:
+            List[str]: The hashes that may be in the filter.
+        """
+        hashes = list(hashes)
+        return [
+            hash_ for hash_, in_filter in zip(hashes, self.contains(hashes))
+            if in_filter
+        ]
+
+    def __contains__(self, hash_):
+        return bool(self.contains([hash_])[0])
+
+
+def rebuild_bloom_filter(path, hashes, capacity, error_rate=0.01):
+    """
+    Build a new Bloom filter from an iterable of hashes and atomically replace
+    the filter file at ``path`` with it. The existing file (if any) is locked
+    until it's replaced, so ``hashes`` should be read from the database
+    while iterating over it (e.g., from a generator); hashes added by other
+    processes in the meantime wait for the rebuild and are then added to
+    the new file (see :meth:`BloomFilter.readd`).
+
+    Args:
+        path (str): Path to the Bloom filter file.
+        hashes (Iterable[List[str]]): Iterable of lists (chunks) of hashes.
+        capacity (int): See :meth:`BloomFilter.create`.
+        error_rate (float): See :meth:`BloomFilter.create`.
+
+    Returns:
+        BloomFilter: The new Bloom filter.
+    """
+    lock = contextlib.nullcontext()
+    if os.path.exists(path):
+        lock = _lock_file(path)
+
+    with lock:
+        tmp_path = f"{path}.tmp"
+        bloom_filter = BloomFilter.create(
+            tmp_path, capacity, error_rate=error_rate
+        )
+        for chunk in hashes:
+            bloom_filter.add(chunk)
+        del bloom_filter
+        os.replace(tmp_path, path)
+    return BloomFilter(path)
@@ -0,0 +1,114 @@
+import io
+
+from .schema import Fingerprint
+
+
+def _batches(rows, batch_size):
+    for i in range(0, len(rows), batch_size):
+        yield rows[i:i + batch_size]
+
+
+def _copy_fingerprints(conn, rows, batch_size):
+    """
+    Insert fingerprints with PostgreSQL ``COPY FROM STDIN`` (psycopg2 only).
+    """
+    preparer = conn.dialect.identifier_preparer
+    table = Fingerprint.__table__
+    columns = ", ".join(
+        preparer.format_column(table.c[name])
+        for name in ("song_id", "hash", "offset")
+    )
+    sql = f"COPY {preparer.format_table(table)} ({columns}) FROM STDIN"
+
+    cursor = conn.connection.cursor()
+    try:
+        for batch in _batches(rows, batch_size):
+            # Hashes are hex strings and don't need to be escaped.
+            buf = io.StringIO(
+                "".join(
+                    f"{row['song_id']}\t{row['hash']}\t{row['offset']!r}\n"
+                    for row in batch
+                )
+            )
+            cursor.copy_expert(sql, buf)
+    finally:
+        cursor.close()
+
+
+def _multirow_insert_fingerprints(conn, rows, batch_size):
+    """
+    Insert fingerprints with one multi-row ``INSERT ... VALUES`` statement
+    per batch.
+    """
+    for batch in _batches(rows, batch_size):
+        conn.execute(Fingerprint.__table__.insert().values(batch))
+
+
+def _executemany_fingerprints(conn, rows, batch_size):
+    """
+    Insert fingerprints with a SQLAlchemy Core ``executemany`` per batch.
+    """
+    for batch in _batches(rows, batch_size):
+        conn.execute(Fingerprint.__table__.insert(), batch)
+
+
+def get_insert_method(dialect):
+    """
+    Get the fastest supported method of bulk inserting rows for a SQLAlchemy
+    dialect.
+
+    Args:
+        dialect (sqlalchemy.engine.Dialect): SQLAlchemy dialect.
+
+    Returns:
+        str: method
+            ``"copy"`` for PostgreSQL with psycopg2, ``"multirow"`` for
+            MySQL, or ``"executemany"`` for all other dialects.
+    """
+    if dialect.name == "postgresql" and dialect.driver == "psycopg2":
+        return "copy"
+    elif dialect.name == "mysql":
+        return "multirow"
+    return "executemany"
+
+
+def bulk_insert_fingerprints(
+    conn, song_id, fingerprints, batch_size=10000, method=None
+):
+    """
+    Insert fingerprints directly (without creating ORM objects) in batches
+    using the fastest method supported by the database. All batches are
+    executed on the given connection, i.e., as part of its current
+    transaction.
+
+    Args:
+        conn (sqlalchemy.engine.Connection): Database connection.
+        song_id (int): Song table song id the fingerprints correspond to.
+        fingerprints (List[tuple]): A list of (hash, offset) fingerprints.
+        batch_size (int): Number of rows per ``COPY``/``INSERT`` statement.
+        method (str): One of ``"copy"`` (PostgreSQL ``COPY FROM STDIN``),
+            ``"multirow"`` (multi-row ``INSERT``), or ``"executemany"``
+            (SQLAlchemy Core ``executemany``). Defaults to the method
+            returned by :func:`get_insert_method`.
+
+    Returns:
+        str: The method used.
+    """
+    if method is None:
+        method = get_insert_method(conn.dialect)
+
+    insert_funcs = {
+        "copy": _copy_fingerprints,
+        "executemany": _executemany_fingerprints,
+        "multirow": _multirow_insert_fingerprints,
+    }
+    if method not in insert_funcs:
+        raise ValueError(f"Invalid insert method {method}")
+
+    rows = [
+        {"song_id": song_id, "hash": hash_, "offset": offset}
+        for hash_, offset in fingerprints
+    ]
+    if rows:
+        insert_funcs[method](conn, rows, batch_size)
+    return method
@@ -0,0 +1,321 @@
+import collections
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+import multiprocessing
+import time
+
+import sqlalchemy
+
+from .database import Database
+from .schema import Fingerprint
+from .sharding import shard_bounds
+
+
+def _hash_ranges(num_partitions):
+    """
+    Split the (hex) hash space into ``num_partitions`` contiguous ranges.
+
+    Returns:
+        List[tuple]: (lower, upper) bounds of each range (``None`` for no
+        bound); a hash is in a range if ``lower <= hash < upper``.
+    """
+    bounds = shard_bounds(num_partitions)
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def _prune_evidence(evidence, max_entries):
+    """
+    Bound the size of an evidence counter by dropping the entries with the
+    lowest counts (first those seen once, then twice, etc.) until at most
+    half of ``max_entries`` remain. Entries of true duplicates accumulate
+    much higher counts than incidental ones, so they survive pruning
+    (though their counts may be underestimated).
+    """
+    min_count = 1
+    while len(evidence) > max_entries // 2:
+        for key in [
+            key for key, count in evidence.items() if count <= min_count
+        ]:
+            del evidence[key]
+        min_count += 1
+    logging.debug(f"Pruned pair evidence with counts up to {min_count - 1}")
+
+
+def _scan_partition(
+    db_kwargs, lower, upper, bin_width, max_postings, max_entries,
+    min_partition_matches, batch_size
+):
+    """
+    Helper function for :func:`find_duplicates`. Scan the fingerprints whose
+    hashes are in a range (ordered by hash, i.e., along the hash index) and
+    count, for each pair of songs sharing a hash, the matching fingerprints
+    in each bin of relative offset.
+
+    Returns:
+        tuple: (evidence, num_rows)
+            - evidence (dict): Dict mapping (song id, song id, relative
+              offset bin) to the number of matching fingerprints, for
+              entries with at least ``min_partition_matches`` matches.
+            - num_rows (int): Number of fingerprints scanned.
+    """
+    db = Database(**db_kwargs)
+    select = sqlalchemy.select(
+        Fingerprint.hash, Fingerprint.song_id, Fingerprint.offset
+    ).order_by(Fingerprint.hash)
+    if lower is not None:
+        select = select.where(Fingerprint.hash >= lower)
+    if upper is not None:
+        select = select.where(Fingerprint.hash < upper)
+
+    evidence = collections.Counter()
+    num_rows = 0
+
+    def _add_postings(postings):
+        # Hashes shared by many songs (e.g., from silence) are skipped; they
+        # carry little evidence and the number of pairs is quadratic.
+        if len(postings) < 2 or len(postings) > max_postings:
+            return
+        postings.sort()
+        for i, (song_a, offset_a) in enumerate(postings):
+            for song_b, offset_b in postings[i + 1:]:
+                if song_a != song_b:
+                    offset_bin = int((offset_b - offset_a) // bin_width)
+                    evidence[(song_a, song_b, offset_bin)] += 1
+
+    # The shards of a sharded database overlapping the range are scanned in
+    # hash order, so rows remain ordered by hash.
+    current_hash = None
+    postings = []
+    for engine in db.fingerprint_engines(lower, upper):
+        with engine.connect() as conn:
+            conn = conn.execution_options(stream_results=True)
+            for rows in conn.execute(select).partitions(batch_size):
+                for hash_, song_id, offset in rows:
+                    if hash_ != current_hash:
+                        _add_postings(postings)
+                        current_hash = hash_
+                        postings = []
+                    postings.append((song_id, offset))
+                num_rows += len(rows)
+                if len(evidence) > max_entries:
+                    _prune_evidence(evidence, max_entries)
+    _add_postings(postings)
+
+    del db
+    return (
+        {
+            key: count for key, count in evidence.items()
+            if count >= min_partition_matches
+        },
+        num_rows
+    )
+
+
+def _cluster_pairs(pairs):
+    """
+    Group songs into clusters (connected components) of duplicate pairs.
+
+    Returns:
+        List[List[dict]]: The pairs belonging to each cluster.
+    """
+    parent = {}
+
+    def _find(song_id):
+        parent.setdefault(song_id, song_id)
+        while parent[song_id] != song_id:
+            parent[song_id] = parent[parent[song_id]]
+            song_id = parent[song_id]
+        return song_id
+
+    for pair in pairs:
+        song_a, song_b = pair["song_ids"]
+        parent[_find(song_a)] = _find(song_b)
+
+    clusters = collections.defaultdict(list)
+    for pair in pairs:
+        clusters[_find(pair["song_ids"][0])].append(pair)
+    return list(clusters.values())
+
+
+def find_duplicates(
+    db_kwargs, num_workers=None, num_partitions=None, offset_bin_size=0.2,
+    min_matches=20, min_confidence=0.05, max_postings=50,
+    max_entries=2000000, min_partition_matches=2, batch_size=10000,
+    progress=None
+):
+    """
+    Find duplicate songs (e.g., re-uploads of the same song, or songs that
+    contain another song) in the database in a single pass over the
+    Fingerprint table, rather than matching each song against the database.
+
+    The hash space is split into ``num_partitions`` ranges that are scanned
+    by ``num_workers`` processes in parallel, each along the hash index.
+    For each hash, every pair of songs containing it is credited with a
+    match in the bin of its relative offset (as in
+    :func:`youtube_audio_matcher.audio.align_matches`). Each worker's
+    counts are bounded to ``max_entries`` entries by repeatedly dropping
+    the lowest counts, and only entries with at least
+    ``min_partition_matches`` matches in a partition are kept, so pairs
+    with fewer than roughly ``num_partitions * min_partition_matches``
+    matching fingerprints may be missed.
+
+    A pair of songs is a duplicate if its best offset bin has at least
+    ``min_matches`` matching fingerprints and its confidence (the number
+    of matching fingerprints divided by the number of fingerprints of the
+    smaller song) is at least ``min_confidence``. Duplicate pairs are
+    grouped into clusters of songs that are (transitively) duplicates.
+
+    Args:
+        db_kwargs (dict): Keyword arguments for instantiating a
+            :class:`youtube_audio_matcher.database.Database` class instance
+            in each worker process (in-memory SQLite databases aren't
+            supported).
+        num_workers (int): Number of worker processes. Defaults to the
+            number of CPUs.
+        num_partitions (int): Number of hash ranges (at most 65536).
+            Defaults to four per worker.
+        offset_bin_size (float): Size of relative offset bins in seconds.
+        min_matches (int): Min number of matching fingerprints of a
+            duplicate pair.
+        min_confidence (float): Min confidence of a duplicate pair.
+        max_postings (int): Hashes occurring more than this many times in
+            the database are skipped.
+        max_entries (int): Max number of (song pair, offset bin) entries
+            counted by each worker at a time.
+        min_partition_matches (int): Min number of matches of an entry in a
+            partition for it to be kept.
+        batch_size (int): Number of rows fetched from the database per
+            round trip.
+        progress (callable): Function called with the number of completed
+            partitions, the total number of partitions, and the number of
+            fingerprints scanned so far after each partition is scanned.
+
+    Returns:
+        List[dict]: clusters
+            Duplicate clusters, ordered by decreasing size and confidence.
+            Each cluster contains the ids of its songs, its confidence (the
+            lowest confidence of its pairs), and its duplicate pairs, where
+            ``relative_offset`` is the offset (in seconds) of the second
+            song's fingerprints relative to the first song's::
+
+                {
+                    "song_ids": List[int],
+                    "confidence": float,
+                    "pairs": [
+                        {
+                            "song_ids": [int, int],
+                            "num_matching_fingerprints": int,
+                            "confidence": float,
+                            "relative_offset": float
+                        },
+                        ...
+                    ]
+                }
+    """
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    if num_partitions is None:
+        num_partitions = 4 * num_workers
+    num_partitions = max(1, min(num_partitions, 0x10000))
+
+    db = Database(**db_kwargs)
+    offset_unit = db.query_offset_unit()
+
+    # Bin width in the unit of stored offsets (hops, or seconds for
+    # databases that store offsets in seconds).
+    bin_width = offset_bin_size
+    if offset_unit is not None:
+        bin_width = max(1, int(round(offset_bin_size / offset_unit)))
+
+    start_t = time.time()
+    evidence = collections.Counter()
+    num_rows = 0
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [
+            executor.submit(
+                _scan_partition, db_kwargs, lower, upper, bin_width,
+                max_postings, max_entries, min_partition_matches, batch_size
+            )
+            for lower, upper in _hash_ranges(num_partitions)
+        ]
+        for num_done, future in enumerate(as_completed(futures), start=1):
+            partition_evidence, partition_rows = future.result()
+            evidence.update(partition_evidence)
+            num_rows += partition_rows
+
+            elapsed = time.time() - start_t
+            logging.info(
+                f"Scanned {num_done}/{num_partitions} partitions "
+                f"({num_rows} fingerprints) in {elapsed:.1f} s"
+            )
+            if progress is not None:
+                progress(num_done, num_partitions, num_rows)
+
+    # Keep the best offset bin of each pair.
+    best = {}
+    for (song_a, song_b, offset_bin), count in evidence.items():
+        if count > best.get((song_a, song_b), (0, None))[0]:
+            best[(song_a, song_b)] = (count, offset_bin)
+
+    song_ids = sorted(set(song_id for pair in best for song_id in pair))
+    num_fingerprints = {}
+    for i in range(0, len(song_ids), 500):
+        for song in db.query_songs(id_=song_ids[i:i + 500]):
+            num_fingerprints[song["id"]] = song["num_fingerprints"]
+    missing_counts = [
+        song_id for song_id, count in num_fingerprints.items()
+        if count is None
+    ]
+    if missing_counts:
+        num_fingerprints.update(db.count_fingerprints(missing_counts))
+    del db
+
+    scale = bin_width * (offset_unit if offset_unit is not None else 1)
+    pairs = []
+    for (song_a, song_b), (count, offset_bin) in best.items():
+        min_fingerprints = min(
+            num_fingerprints.get(song_a) or 0,
+            num_fingerprints.get(song_b) or 0
+        )
+        if count < min_matches or not min_fingerprints:
+            continue
+        confidence = min(count / min_fingerprints, 1.0)
+        if confidence < min_confidence:
+            continue
+        pairs.append(
+            {
+                "song_ids": [song_a, song_b],
+                "num_matching_fingerprints": count,
+                "confidence": confidence,
+                "relative_offset": offset_bin * scale,
+            }
+        )
+
+    clusters = []
+    for cluster_pairs in _cluster_pairs(pairs):
+        clusters.append(
+            {
+                "song_ids": sorted(
+                    set(
+                        song_id for pair in cluster_pairs
+                        for song_id in pair["song_ids"]
+                    )
+                ),
+                "confidence": min(
+                    pair["confidence"] for pair in cluster_pairs
+                ),
+                "pairs": sorted(
+                    cluster_pairs, key=lambda pair: -pair["confidence"]
+                ),
+            }
+        )
+    clusters.sort(
+        key=lambda cluster: (-len(cluster["song_ids"]), -cluster["confidence"])
+    )
+
+    elapsed = time.time() - start_t
+    logging.info(
+        f"Found {len(clusters)} duplicate clusters ({len(pairs)} pairs) "
+        f"among {num_rows} fingerprints in {elapsed:.1f} s"
+    )
+    return clusters
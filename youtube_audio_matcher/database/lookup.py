@@ -0,0 +1,194 @@
+from concurrent.futures import ThreadPoolExecutor
+import uuid
+
+import sqlalchemy
+
+from .schema import Fingerprint
+
+_fingerprint_columns = (
+    Fingerprint.song_id, Fingerprint.hash, Fingerprint.offset
+)
+
+
+def _chunks(hashes, chunk_size):
+    for i in range(0, len(hashes), chunk_size):
+        yield hashes[i:i + chunk_size]
+
+
+def _filter_song_ids(select, song_ids):
+    """
+    Restrict a fingerprint query to the given song ids (if not ``None``).
+    """
+    if song_ids is None:
+        return select
+    # The song id is compared as an expression (rather than the column
+    # itself) so that it's only used to filter the rows found through the
+    # hash index; otherwise, SQLite seeks every combination of hash and song
+    # id in the (hash, song_id, offset) index.
+    return select.where((Fingerprint.song_id + 0).in_(song_ids))
+
+
+def _in_lookup(conn, hashes, song_ids=None):
+    """
+    Query fingerprints with a single ``IN`` list containing all hashes.
+    """
+    select = _filter_song_ids(
+        sqlalchemy.select(*_fingerprint_columns).where(
+            Fingerprint.hash.in_(hashes)
+        ),
+        song_ids
+    )
+    return [dict(row._mapping) for row in conn.execute(select)]
+
+
+def _temp_table_lookup(conn, hashes, chunk_size, song_ids=None):
+    """
+    Load the hashes into a temporary table and join it with the Fingerprint
+    table. The temporary table is only visible to this connection and is
+    dropped afterward (or discarded when the transaction is rolled back if
+    the lookup fails).
+    """
+    # The table is only dropped if the lookup succeeds, since dropping it
+    # would fail (and mask the original error) on PostgreSQL, where a failed
+    # statement aborts the transaction (see align_fingerprints). Use a
+    # unique name in case a previous lookup on the same (pooled) connection
+    # of another dialect left its table behind.
+    tmp_table = sqlalchemy.Table(
+        f"tmp_query_hash_{uuid.uuid4().hex[:12]}", sqlalchemy.MetaData(),
+        sqlalchemy.Column("hash", sqlalchemy.String(40), primary_key=True),
+        prefixes=["TEMPORARY"]
+    )
+    tmp_table.create(conn)
+    for chunk in _chunks(hashes, chunk_size):
+        conn.execute(
+            tmp_table.insert(), [{"hash": hash_} for hash_ in chunk]
+        )
+    select = _filter_song_ids(
+        sqlalchemy.select(*_fingerprint_columns).join(
+            tmp_table, tmp_table.c.hash == Fingerprint.hash
+        ),
+        song_ids
+    )
+    fingerprints = [dict(row._mapping) for row in conn.execute(select)]
+    tmp_table.drop(conn)
+    return fingerprints
+
+
+def _chunked_lookup(
+    engine, conn, hashes, chunk_size, num_workers, song_ids=None
+):
+    """
+    Query fingerprints with one ``IN`` query per chunk of ``chunk_size``
+    hashes. If ``num_workers > 1``, chunks are queried in parallel, each
+    thread using its own connection from the engine's pool.
+    """
+    chunks = list(_chunks(hashes, chunk_size))
+    if num_workers <= 1 or len(chunks) == 1:
+        fingerprints = []
+        for chunk in chunks:
+            fingerprints.extend(_in_lookup(conn, chunk, song_ids))
+        return fingerprints
+
+    def _lookup_chunk(chunk):
+        with engine.connect() as chunk_conn:
+            return _in_lookup(chunk_conn, chunk, song_ids)
+
+    fingerprints = []
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for chunk_fingerprints in executor.map(_lookup_chunk, chunks):
+            fingerprints.extend(chunk_fingerprints)
+    return fingerprints
+
+
+def get_lookup_strategy(engine, num_hashes, threshold=5000, temp_tables=True):
+    """
+    Get the strategy :func:`lookup_fingerprints` uses to query a number of
+    hashes.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): Database engine.
+        num_hashes (int): Number of hashes to query.
+        threshold (int): Max number of hashes queried with a single ``IN``
+            list.
+        temp_tables (bool): Whether temporary tables can be created on the
+            connection (not on read replicas, e.g., PostgreSQL hot
+            standbys).
+
+    Returns:
+        str: strategy
+            ``"in"`` if ``num_hashes <= threshold``. Otherwise,
+            ``"temp_table"`` for PostgreSQL and MySQL (if ``temp_tables``)
+            or ``"chunked"`` for other dialects (e.g., SQLite, which limits
+            the number of bound parameters per statement and whose readers
+            don't block each other).
+    """
+    if num_hashes <= threshold:
+        return "in"
+    if temp_tables and engine.dialect.name in ("mysql", "postgresql"):
+        return "temp_table"
+    return "chunked"
+
+
+def lookup_fingerprints(
+    engine, conn, hashes, strategy=None, threshold=5000, chunk_size=500,
+    num_workers=4, song_ids=None, temp_tables=True
+):
+    """
+    Query the Fingerprint table for all fingerprints matching a list of
+    hashes, using a strategy suited to the number of hashes and the database
+    dialect (see :func:`get_lookup_strategy`). Very long ``IN`` lists can
+    exceed driver/database limits on the number of bound parameters and
+    produce poor query plans, so larger queries are either split into
+    chunks or performed as a join with a temporary table of hashes.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): Database engine, used to open
+            additional connections for parallel chunked queries.
+        conn (sqlalchemy.engine.Connection): Database connection.
+        hashes (List[str]): Unique hashes to query.
+        strategy (str): ``"in"`` (single ``IN`` list), ``"temp_table"``
+            (temporary table join), or ``"chunked"`` (``IN`` queries of
+            ``chunk_size`` hashes). Defaults to the strategy returned by
+            :func:`get_lookup_strategy`.
+        threshold (int): See :func:`get_lookup_strategy`.
+        chunk_size (int): Number of hashes per chunk for the ``"chunked"``
+            strategy, and per insert statement when loading the temporary
+            table for the ``"temp_table"`` strategy.
+        num_workers (int): Number of threads used to query chunks in
+            parallel for the ``"chunked"`` strategy.
+        song_ids (List[int]): If provided, only fingerprints belonging to
+            these songs are returned.
+        temp_tables (bool): Whether temporary tables can be created on
+            ``conn``. If ``False``, the ``"chunked"`` strategy is used
+            instead of ``"temp_table"``.
+
+    Returns:
+        tuple: (fingerprints, strategy)
+            - fingerprints (List[dict]): See
+              :meth:`youtube_audio_matcher.database.Database.query_fingerprints`.
+            - strategy (str): The strategy used.
+    """
+    if strategy is None:
+        strategy = get_lookup_strategy(
+            engine, len(hashes), threshold, temp_tables
+        )
+    elif strategy == "temp_table" and not temp_tables:
+        strategy = "chunked"
+
+    if strategy == "in":
+        fingerprints = _in_lookup(conn, hashes, song_ids)
+    elif strategy == "temp_table":
+        fingerprints = _temp_table_lookup(
+            conn, hashes, chunk_size, song_ids
+        )
+    elif strategy == "chunked":
+        # Connections to an in-memory SQLite database can't be opened per
+        # thread.
+        if isinstance(engine.pool, sqlalchemy.pool.StaticPool):
+            num_workers = 1
+        fingerprints = _chunked_lookup(
+            engine, conn, hashes, chunk_size, num_workers, song_ids
+        )
+    else:
+        raise ValueError(f"Invalid lookup strategy {strategy}")
+    return fingerprints, strategy
@@ -0,0 +1,121 @@
+import functools
+import hashlib
+import struct
+
+import numpy as np
+
+# Number of hash functions (permutations) in a MinHash signature and number
+# of signature values per LSH band. Songs are matched against short clips,
+# whose hashes are a small subset of the song's, so the Jaccard similarity of
+# a clip and its song is low (roughly the clip's fraction of the song) and
+# single-value bands are needed for the song to reliably share a band with
+# the clip. Changing either value requires rebuilding the sketches (see
+# youtube_audio_matcher.database.Database.rebuild_song_sketches).
+MINHASH_NUM_PERM = 128
+MINHASH_BAND_SIZE = 1
+
+# Number of hashes processed at a time when computing a signature, which
+# bounds the size of the intermediate (num_perm x chunk) array.
+_CHUNK_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=None)
+def _seeds(num_perm):
+    """
+    Fixed (across processes and runs) random seeds of the ``num_perm`` hash
+    functions.
+    """
+    return np.random.RandomState(1).randint(
+        0, 2 ** 64, size=num_perm, dtype=np.uint64
+    )
+
+
+def _mix(x):
+    """
+    SplitMix64 finalizer, applied elementwise to a uint64 array. Used (with
+    a different seed XORed into the input for each hash function) to
+    simulate random permutations of 64-bit hash values.
+    """
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def minhash_signature(hashes, num_perm=MINHASH_NUM_PERM):
+    """
+    Compute the `MinHash`_ signature of a set of fingerprint hashes, i.e.,
+    the minimum value of each of ``num_perm`` hash functions over the set.
+    The fraction of values two signatures have in common estimates the
+    Jaccard similarity of their sets of hashes, and the elementwise minimum
+    of two signatures is the signature of the union of their sets.
+
+    Args:
+        hashes (Iterable[str]): Hex fingerprint hashes (only the first 16
+            characters, i.e., 64 bits, of each hash are used).
+        num_perm (int): Number of hash functions.
+
+    Returns:
+        np.ndarray: signature
+            uint64 array of length ``num_perm``, or ``None`` if ``hashes``
+            is empty.
+
+    .. _`MinHash`:
+        https://en.wikipedia.org/wiki/MinHash
+    """
+    values = np.fromiter(
+        (int(hash_[:16], 16) for hash_ in set(hashes)), dtype=np.uint64
+    )
+    if not len(values):
+        return None
+
+    seeds = _seeds(num_perm)[:, np.newaxis]
+    signature = np.full(num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for i in range(0, len(values), _CHUNK_SIZE):
+            chunk = values[np.newaxis, i:i + _CHUNK_SIZE]
+            np.minimum(
+                signature, _mix(chunk ^ seeds).min(axis=1), out=signature
+            )
+    return signature
+
+
+def signature_to_bytes(signature):
+    """
+    Serialize a signature returned by :func:`minhash_signature`.
+    """
+    return signature.astype("<u8").tobytes()
+
+
+def signature_from_bytes(data):
+    """
+    Deserialize a signature serialized by :func:`signature_to_bytes`.
+    """
+    return np.frombuffer(data, dtype="<u8").astype(np.uint64)
+
+
+def lsh_buckets(signature, band_size=MINHASH_BAND_SIZE):
+    """
+    Split a MinHash signature into bands of ``band_size`` values and hash
+    each band (along with its index) to an LSH bucket. Two sets share a
+    bucket with probability ``1 - (1 - J ** band_size) ** num_bands``, where
+    ``J`` is their Jaccard similarity, so the number of buckets a database
+    song shares with a query song is used to rank candidate songs.
+
+    Args:
+        signature (np.ndarray): Signature returned by
+            :func:`minhash_signature`.
+        band_size (int): Number of signature values per band.
+
+    Returns:
+        List[int]: One non-negative 63-bit bucket per (complete) band.
+    """
+    signature = signature.astype("<u8")
+    buckets = []
+    for band, i in enumerate(
+        range(0, len(signature) - band_size + 1, band_size)
+    ):
+        digest = hashlib.sha1(
+            struct.pack("<I", band) + signature[i:i + band_size].tobytes()
+        ).digest()
+        buckets.append(int.from_bytes(digest[:8], "little") >> 1)
+    return buckets
@@ -0,0 +1,222 @@
+import array
+import collections
+import sys
+import threading
+
+# Postings of hashes that aren't in the database (shared by all such
+# entries, so that they only cost the hash and the entry).
+_NO_POSTINGS = (array.array("q"), array.array("q"))
+
+
+class PostingsCache:
+    """
+    Bounded, memory-accounted LRU cache mapping fingerprint hashes to their
+    postings, i.e., the song ids and offsets of all fingerprints with the
+    hash, so that the hashes queried most often (e.g., those of popular
+    reference songs and common hashes) are only read from the database once.
+    Hashes without fingerprints are cached too.
+
+    Postings are stored as compact arrays rather than fingerprint dicts, and
+    the size of each entry (the hash, its arrays, and the cache's own
+    bookkeeping) is counted against ``max_size``; the least recently used
+    entries are evicted when it's exceeded. The cache is tagged with the
+    database content version its entries were read at and is cleared when
+    the version changes (see :meth:`validate`), i.e., when songs are added
+    or deleted.
+
+    Instances are thread-safe. Hit, miss, eviction, and invalidation
+    counters are returned by :meth:`stats`.
+    """
+    # Approximate size (in bytes) of the cache's bookkeeping for each entry
+    # (the OrderedDict entry and the tuple holding the arrays).
+    ENTRY_OVERHEAD = 160
+
+    def __init__(self, max_size):
+        """
+        Args:
+            max_size (int): Max size of the cache's entries (in bytes).
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.content_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _entry_size(hash_, postings):
+        size = sys.getsizeof(hash_) + PostingsCache.ENTRY_OVERHEAD
+        if postings is not _NO_POSTINGS:
+            size += sum(sys.getsizeof(arr) for arr in postings)
+        return size
+
+    def _evict(self):
+        """
+        Evict least recently used entries until the cache fits in
+        ``max_size``. Must be called with the lock held.
+        """
+        while self.size > self.max_size and self._entries:
+            hash_, postings = self._entries.popitem(last=False)
+            self.size -= self._entry_size(hash_, postings)
+            self.evictions += 1
+
+    def resize(self, max_size):
+        """
+        Change the max size of the cache, evicting entries if necessary.
+
+        Args:
+            max_size (int): Max size of the cache's entries (in bytes).
+        """
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def validate(self, content_version):
+        """
+        Clear the cache if its entries were read at a different database
+        content version. Must be called with the current content version
+        *before* the postings of cache misses are queried (and added with
+        :meth:`put`), so entries are never older than the version they're
+        tagged with.
+
+        Args:
+            content_version (int): Current database content version, as
+                returned by ``Database.query_content_version``.
+
+        Returns:
+            bool: ``True`` if the cache was invalidated.
+        """
+        with self._lock:
+            if content_version == self.content_version:
+                return False
+            invalidated = self.content_version is not None and bool(
+                self._entries
+            )
+            self._entries.clear()
+            self.size = 0
+            self.content_version = content_version
+            if invalidated:
+                self.invalidations += 1
+            return invalidated
+
+    def get(self, hashes):
+        """
+        Look up hashes, marking those found as most recently used.
+
+        Args:
+            hashes (List[str]): Hashes to look up.
+
+        Returns:
+            tuple: (postings, missing)
+                - postings (dict): Dict mapping each cached hash to a tuple
+                  ``(song_ids, offsets)`` of arrays (empty if the hash has
+                  no fingerprints).
+                - missing (List[str]): Hashes that aren't cached.
+        """
+        postings = {}
+        missing = []
+        with self._lock:
+            for hash_ in hashes:
+                entry = self._entries.get(hash_)
+                if entry is None:
+                    missing.append(hash_)
+                else:
+                    self._entries.move_to_end(hash_)
+                    postings[hash_] = entry
+            self.hits += len(postings)
+            self.misses += len(missing)
+        return postings, missing
+
+    def put(self, hashes, fingerprints, content_version):
+        """
+        Add the postings of hashes queried from the database. Hashes with
+        postings larger than ``max_size`` aren't cached, and nothing is
+        cached if the cache was invalidated since the hashes were queried.
+
+        Args:
+            hashes (List[str]): Queried hashes (including those without
+                fingerprints).
+            fingerprints (List[dict]): All fingerprints with these hashes,
+                as returned by ``Database.query_fingerprints``.
+            content_version (int): Content version passed to
+                :meth:`validate` before the hashes were queried.
+        """
+        grouped = {}
+        for fp in fingerprints:
+            grouped.setdefault(fp["hash"], []).append(fp)
+
+        entries = []
+        for hash_ in hashes:
+            fps = grouped.get(hash_)
+            if not fps:
+                postings = _NO_POSTINGS
+            else:
+                offsets = [fp["offset"] for fp in fps]
+                # Offsets are integer hops, except in databases that store
+                # them in seconds (see Database.query_offset_unit).
+                typecode = "q" if isinstance(offsets[0], int) else "d"
+                postings = (
+                    array.array("q", [fp["song_id"] for fp in fps]),
+                    array.array(typecode, offsets)
+                )
+            entries.append((hash_, postings))
+
+        with self._lock:
+            if content_version != self.content_version:
+                return
+            for hash_, postings in entries:
+                size = self._entry_size(hash_, postings)
+                if size > self.max_size:
+                    continue
+                if hash_ in self._entries:
+                    self.size -= self._entry_size(hash_, self._entries[hash_])
+                self._entries[hash_] = postings
+                self._entries.move_to_end(hash_)
+                self.size += size
+            self._evict()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Cache statistics::
+
+                {
+                    "entries": int,
+                    "size": int,
+                    "max_size": int,
+                    "hits": int,
+                    "misses": int,
+                    "evictions": int,
+                    "invalidations": int,
+                    "hit_rate": float
+                }
+
+            Sizes are in bytes; counters are cumulative since the cache was
+            created.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size": self.size,
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,133 @@
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+import time
+
+from ..audio import fingerprint_from_file, fingerprint_params
+from .database import Database
+
+
+def _fingerprint_file(fpath, fingerprint_kwargs):
+    """
+    Helper function for :func:`refingerprint_songs`. Fingerprint a song's
+    file (without deleting it).
+
+    Returns:
+        tuple: (hashes, num_peaks)
+    """
+    hashes, _, stats = fingerprint_from_file(
+        fpath, return_stats=True, **fingerprint_kwargs
+    )
+    return hashes, stats["num_peaks"]
+
+
+def refingerprint_songs(
+    db_kwargs, fingerprint_kwargs=None, num_workers=None, batch_size=None,
+    progress=None
+):
+    """
+    Migrate the songs in the database to a fingerprint profile by
+    refingerprinting each song that wasn't fingerprinted with it (including
+    songs with an unknown profile) from its ``filepath``. Files are
+    fingerprinted by ``num_workers`` processes in parallel, and each batch of
+    ``batch_size`` songs replaces its fingerprints in a single transaction
+    (see :meth:`youtube_audio_matcher.database.Database.replace_fingerprints`)
+    and is tagged with the profile, so an interrupted migration resumes where
+    it left off when run again. Songs whose files are missing or can't be
+    fingerprinted are skipped (and keep their fingerprints and profile).
+
+    Args:
+        db_kwargs (dict): Keyword arguments for instantiating a
+            :class:`youtube_audio_matcher.database.Database` class instance.
+        fingerprint_kwargs (dict): Keyword arguments for
+            :func:`youtube_audio_matcher.audio.fingerprint_from_file` (other
+            than ``delete``), which determine the profile (see
+            :func:`youtube_audio_matcher.audio.fingerprint_params`).
+        num_workers (int): Number of worker processes. Defaults to the
+            number of CPUs.
+        batch_size (int): Number of songs per transaction. Defaults to 16
+            songs per worker.
+        progress (callable): Function called with the number of songs
+            processed, the total number of songs to process, and the number
+            of songs skipped so far after each batch.
+
+    Returns:
+        tuple: (profile_id, num_songs, num_skipped)
+            Id of the profile, number of songs refingerprinted, and number of
+            songs skipped.
+    """
+    fingerprint_kwargs = {
+        k: v for k, v in (fingerprint_kwargs or {}).items() if k != "delete"
+    }
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    if batch_size is None:
+        batch_size = 16 * num_workers
+
+    db = Database(**db_kwargs)
+    profile_id = db.get_profile_id(fingerprint_params(**fingerprint_kwargs))
+    num_total = len(db.query_songs_to_refingerprint(profile_id))
+    logging.info(
+        f"Refingerprinting {num_total} songs with fingerprint profile "
+        f"{profile_id}"
+    )
+
+    start_t = time.time()
+    num_songs = 0
+    num_skipped = 0
+    after_id = 0
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        while True:
+            songs = db.query_songs_to_refingerprint(
+                profile_id, after_id=after_id, limit=batch_size
+            )
+            if not songs:
+                break
+            after_id = songs[-1]["id"]
+
+            futures = {}
+            for song in songs:
+                fpath = song["filepath"]
+                if fpath and os.path.isfile(fpath):
+                    futures[song["id"]] = executor.submit(
+                        _fingerprint_file, fpath, fingerprint_kwargs
+                    )
+                else:
+                    logging.error(
+                        f"Skipping song {song['id']}: file {fpath} not found"
+                    )
+
+            updated = []
+            for song_id, future in futures.items():
+                try:
+                    hashes, num_peaks = future.result()
+                except Exception as e:
+                    logging.error(
+                        f"Skipping song {song_id}: error fingerprinting file "
+                        f"({str(e)})"
+                    )
+                    continue
+                updated.append(
+                    {
+                        "id": song_id,
+                        "fingerprints": hashes,
+                        "num_peaks": num_peaks,
+                    }
+                )
+
+            num_rows = db.replace_fingerprints(updated, profile_id)
+            num_songs += len(updated)
+            num_skipped += len(songs) - len(updated)
+
+            elapsed = time.time() - start_t
+            logging.info(
+                f"Refingerprinted {len(updated)} songs ({num_rows} "
+                f"fingerprints); {num_songs + num_skipped}/{num_total} songs "
+                f"processed in {elapsed:.1f} s"
+            )
+            if progress is not None:
+                progress(num_songs + num_skipped, num_total, num_skipped)
+
+    del db
+    return profile_id, num_songs, num_skipped
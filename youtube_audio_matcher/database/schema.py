@@ -1,5 +1,6 @@
 from sqlalchemy import (
-    Column, Float, ForeignKey, Integer, String, UniqueConstraint
+    BigInteger, Column, Float, ForeignKey, Index, Integer, LargeBinary,
+    String, Text, UniqueConstraint
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -7,6 +8,33 @@ from sqlalchemy.orm import relationship
 Base = declarative_base()
 
 
+class DatabaseInfo(Base):
+    """
+    SQLAlchemy class representing database ``database_info`` table schema,
+    which holds key/value metadata about the database itself.
+
+    Attributes:
+        key (str): Metadata key, e.g., ``content_version``.
+        value (str): Metadata value.
+
+    .. note::
+        The ``content_version`` key holds an integer that is incremented
+        whenever songs or fingerprints are added or deleted. It's used to
+        invalidate cached match results (see :class:`MatchResult`).
+
+    .. note::
+        The ``offset_hop_size`` and ``offset_sample_rate`` keys hold the
+        unit of fingerprint offsets (see :class:`Fingerprint`). Databases
+        created by earlier versions, which stored offsets in seconds, don't
+        have these keys until the Fingerprint table is migrated (see
+        :meth:`youtube_audio_matcher.database.Database.migrate_fingerprint_table`).
+    """
+    __tablename__ = "database_info"
+
+    key = Column("key", String(64), primary_key=True)
+    value = Column("value", String)
+
+
 class Fingerprint(Base):
     """
     SQLAlchemy class representing database ``fingerprint`` table schema.
@@ -14,27 +42,145 @@ class Fingerprint(Base):
     Attributes:
         id (int): ``fingerprint`` table primary key.
         hash (str): SHA1 hash.
-        offset (float): Fingerprint offset from beginning of file in seconds.
+        offset (int): Fingerprint offset from beginning of file as a number
+            of spectrogram hops (frames), i.e., in units of
+            ``offset_hop_size / offset_sample_rate`` seconds (see
+            :class:`DatabaseInfo`).
         song_id (int): Song id from the ``song`` table (:class:`Song`) to which
             this fingerprint belongs.
 
     .. note::
         There is a `UNIQUE constraint`_  on the combination of
-        (``song_id``, ``hash``, ``offset``) keys.
+        (``hash``, ``song_id``, ``offset``) keys. Its index, which leads with
+        ``hash``, also serves as a covering index for hash lookups (the
+        ``song_id`` and ``offset`` of matching rows are read from the index
+        without fetching the rows themselves). ``song_id`` is indexed
+        separately so that a song's fingerprints can be deleted (e.g., when
+        it's refingerprinted) without scanning the table.
+
+    .. note::
+        The ``id`` column may be dropped from existing databases (see
+        :meth:`youtube_audio_matcher.database.Database.migrate_fingerprint_table`),
+        so fingerprints should only be queried/inserted by column (e.g.,
+        ``session.query(Fingerprint.hash, ...)``) rather than as
+        ``Fingerprint`` objects.
 
     .. _`UNIQUE constraint`:
         https://docs.sqlalchemy.org/en/13/core/constraints.html#unique-constraint
     """
     __tablename__ = "fingerprint"
+    __table_args__ = (UniqueConstraint("hash", "song_id", "offset"),)
 
     id = Column("id", Integer, primary_key=True)
-    song_id = Column("song_id", ForeignKey("song.id"), nullable=False)
+    song_id = Column(
+        "song_id", ForeignKey("song.id"), nullable=False, index=True
+    )
 
     # Indexable String requires a max length to be set. We set it to 40 since
     # this is the max length of a SHA1 hash.
-    hash = Column("hash", String(40), nullable=False, index=True)
-    offset = Column("offset", Float, nullable=False)
-    UniqueConstraint("song_id", "hash", "offset")
+    hash = Column("hash", String(40), nullable=False)
+    offset = Column("offset", Integer, nullable=False)
+
+
+class FingerprintProfile(Base):
+    """
+    SQLAlchemy class representing database ``fingerprint_profile`` table
+    schema. Each row is a set of fingerprinting parameters (see
+    :func:`youtube_audio_matcher.audio.fingerprint_params`) that songs in
+    the database have been fingerprinted with; songs are only comparable to
+    songs (and query files) fingerprinted with the same profile.
+
+    Attributes:
+        id (int): ``fingerprint_profile`` table primary key (the profile
+            version).
+        params_hash (str): SHA1 hash of ``params``.
+        params (str): Fingerprinting parameters as a JSON string (with
+            sorted keys).
+    """
+    __tablename__ = "fingerprint_profile"
+
+    id = Column("id", Integer, primary_key=True)
+    params_hash = Column(
+        "params_hash", String(40), nullable=False, unique=True
+    )
+    params = Column("params", Text, nullable=False)
+
+
+class HashFrequency(Base):
+    """
+    SQLAlchemy class representing database ``hash_frequency`` table schema.
+    Stores the document frequency of each hash, i.e., the number of songs in
+    the ``song`` table containing the hash, updated in the same transaction
+    as the fingerprints. Used to prune very common hashes (e.g., from silence
+    or test tones) when matching.
+
+    Attributes:
+        hash (str): SHA1 hash.
+        num_songs (int): Number of distinct songs containing this hash.
+    """
+    __tablename__ = "hash_frequency"
+
+    hash = Column("hash", String(40), primary_key=True)
+    num_songs = Column("num_songs", Integer, nullable=False)
+
+
+class MatchResult(Base):
+    """
+    SQLAlchemy class representing database ``match_result`` table schema,
+    which caches the result of matching a file against the database.
+
+    Attributes:
+        id (int): ``match_result`` table primary key.
+        filehash (str): SHA1 hash of the matched file.
+        params_hash (str): SHA1 hash of the fingerprint/match parameters used
+            to obtain the result.
+        content_version (int): Database content version (see
+            :class:`DatabaseInfo`) at the time of the match.
+        result (str): Match result as a JSON string.
+
+    .. note::
+        There's at most one result per (``filehash``, ``params_hash``),
+        enforced by a unique index (rather than a constraint) so that it can
+        be added to existing tables (see
+        :meth:`youtube_audio_matcher.database.Database.upgrade_schema`).
+    """
+    __tablename__ = "match_result"
+    __table_args__ = (
+        Index(
+            "ix_match_result_filehash_params_hash", "filehash", "params_hash",
+            unique=True
+        ),
+    )
+
+    id = Column("id", Integer, primary_key=True)
+    filehash = Column("filehash", String(40), nullable=False, index=True)
+    params_hash = Column("params_hash", String(40), nullable=False)
+    content_version = Column("content_version", Integer, nullable=False)
+    result = Column("result", Text, nullable=False)
+
+
+class SketchBand(Base):
+    """
+    SQLAlchemy class representing database ``sketch_band`` table schema,
+    the locality-sensitive hashing (LSH) index of song MinHash signatures
+    (see :class:`SongSketch`). Each song has one row per band of its
+    signature, and songs that share a bucket with a query song are candidate
+    matches.
+
+    Attributes:
+        bucket (int): Hash of a band of a signature (and the band's index).
+            See :func:`youtube_audio_matcher.database.minhash.lsh_buckets`.
+        song_id (int): Song id from the ``song`` table (:class:`Song`),
+            indexed separately (the primary key leads with ``bucket``) so
+            that a song's rows can be deleted without scanning the table.
+    """
+    __tablename__ = "sketch_band"
+
+    bucket = Column("bucket", BigInteger, primary_key=True)
+    song_id = Column(
+        "song_id", ForeignKey("song.id"), primary_key=True,
+        autoincrement=False, index=True
+    )
 
 
 class Song(Base):
@@ -49,6 +195,15 @@ class Song(Base):
         title (str): Song title.
         youtube_id (str): The YouTube id of the song (if the song was
             downloaded from YouTube).
+        num_fingerprints (int): Number of fingerprints belonging to this
+            song, maintained as fingerprints are added (denormalized from the
+            ``fingerprint`` table).
+        num_peaks (int): Number of spectrogram peaks found when the song was
+            fingerprinted.
+        profile_id (int): Id of the fingerprint profile
+            (:class:`FingerprintProfile`) the song was fingerprinted with,
+            or ``None`` if unknown (e.g., for songs added by earlier
+            versions).
 
         fingerprints (List[Fingerprint]): A list of fingerprints (Fingerprint
             objects) belonging to this song.
@@ -58,9 +213,36 @@ class Song(Base):
     id = Column("id", Integer, primary_key=True)
     duration = Column("duration", Float)
     filepath = Column("filepath", String)
-    filehash = Column("filehash", String)
+    filehash = Column("filehash", String, index=True)
     title = Column("title", String)
-    youtube_id = Column("youtube_id", String)
+    youtube_id = Column("youtube_id", String, index=True)
+    num_fingerprints = Column("num_fingerprints", Integer)
+    num_peaks = Column("num_peaks", Integer)
+    profile_id = Column(
+        "profile_id", ForeignKey("fingerprint_profile.id"), index=True
+    )
 
     # One-to-many mapping of audio file to all its associated fingerprints.
     fingerprints = relationship("Fingerprint")
+
+
+class SongSketch(Base):
+    """
+    SQLAlchemy class representing database ``song_sketch`` table schema,
+    which holds the MinHash signature of each song's set of fingerprint
+    hashes (see
+    :func:`youtube_audio_matcher.database.minhash.minhash_signature`). The
+    signature is split into bands in the :class:`SketchBand` table.
+
+    Attributes:
+        song_id (int): Song id from the ``song`` table (:class:`Song`).
+        signature (bytes): Serialized signature (see
+            :func:`youtube_audio_matcher.database.minhash.signature_to_bytes`).
+    """
+    __tablename__ = "song_sketch"
+
+    song_id = Column(
+        "song_id", ForeignKey("song.id"), primary_key=True,
+        autoincrement=False
+    )
+    signature = Column("signature", LargeBinary, nullable=False)
@@ -0,0 +1,94 @@
+import bisect
+
+import sqlalchemy
+
+# Fingerprint table of a shard database (see
+# youtube_audio_matcher.database.Database), which holds the fingerprints whose
+# hashes are in one range of the hash space. It's the Fingerprint table
+# without the surrogate id column and the foreign key to the song table, which
+# only exists in the primary database. (hash, song_id, offset) is the primary
+# key, so rows are clustered by hash on MySQL and SQLite; song_id is indexed
+# separately so that a song's fingerprints can be deleted without a scan.
+shard_metadata = sqlalchemy.MetaData()
+shard_fingerprint_table = sqlalchemy.Table(
+    "fingerprint", shard_metadata,
+    sqlalchemy.Column(
+        "song_id", sqlalchemy.Integer, nullable=False, index=True
+    ),
+    sqlalchemy.Column("hash", sqlalchemy.String(40), nullable=False),
+    sqlalchemy.Column("offset", sqlalchemy.Integer, nullable=False),
+    sqlalchemy.PrimaryKeyConstraint("hash", "song_id", "offset"),
+    sqlite_with_rowid=False
+)
+
+
+def shard_bounds(num_shards):
+    """
+    Split the (hex) hash space into ``num_shards`` contiguous ranges of
+    (roughly) equal size by the first four hex digits of the hash.
+
+    Args:
+        num_shards (int): Number of ranges (at most 65536).
+
+    Returns:
+        List[str]: The ``num_shards - 1`` boundaries between consecutive
+        ranges, in increasing order. Range ``i`` contains the hashes ``h``
+        with ``bounds[i - 1] <= h < bounds[i]`` (without a lower bound for
+        the first range and without an upper bound for the last).
+    """
+    return [
+        format(i * 0x10000 // num_shards, "04x")
+        for i in range(1, num_shards)
+    ]
+
+
+def shard_index(bounds, hash_):
+    """
+    Args:
+        bounds (List[str]): Range boundaries (see :func:`shard_bounds`).
+        hash_ (str): Fingerprint hash.
+
+    Returns:
+        int: Index of the range (shard) containing ``hash_``.
+    """
+    return bisect.bisect_right(bounds, hash_)
+
+
+def route_fingerprints(bounds, fingerprints):
+    """
+    Group fingerprints (or hashes) by the shard their hash belongs to.
+
+    Args:
+        bounds (List[str]): Range boundaries (see :func:`shard_bounds`).
+        fingerprints (List[tuple|str]): A list of (hash, offset)
+            fingerprints or a list of hashes.
+
+    Returns:
+        dict: Dict mapping the index of each shard to the list of its
+        fingerprints (in their original order). Shards without fingerprints
+        are omitted.
+    """
+    routed = {}
+    for fingerprint in fingerprints:
+        hash_ = fingerprint if isinstance(fingerprint, str) else fingerprint[0]
+        routed.setdefault(shard_index(bounds, hash_), []).append(fingerprint)
+    return routed
+
+
+def shards_in_range(bounds, lower=None, upper=None):
+    """
+    Get the shards whose ranges overlap a range of hashes.
+
+    Args:
+        bounds (List[str]): Range boundaries (see :func:`shard_bounds`).
+        lower (str): Inclusive lower bound of the hash range (``None`` for no
+            bound).
+        upper (str): Exclusive upper bound of the hash range (``None`` for no
+            bound).
+
+    Returns:
+        List[int]: Indices of the shards, in increasing (hash) order.
+    """
+    first = 0 if lower is None else shard_index(bounds, lower)
+    last = len(bounds) if upper is None else bisect.bisect_left(bounds, upper)
+    return list(range(first, last + 1))
@@ -0,0 +1,247 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+import numpy as np
+
+# Song keys stored in shard files (see write_shard).
+SHARD_SONG_KEYS = [
+    "duration", "path", "filehash", "title", "youtube_id", "num_peaks",
+]
+
+
+def _shard_checksum(metadata, hashes, offsets):
+    """
+    SHA1 checksum of the contents of a shard file (see :func:`write_shard`).
+    """
+    sha1 = hashlib.sha1(metadata.encode("utf-8"))
+    sha1.update(np.ascontiguousarray(hashes).tobytes())
+    sha1.update(np.ascontiguousarray(offsets, dtype="<f8").tobytes())
+    return sha1.hexdigest()
+
+
+def write_shard(fpath, songs, fingerprint_params=None):
+    """
+    Write fingerprinted songs to a shard file that can be loaded into a
+    database later (see :func:`youtube_audio_matcher.database.load_shards`),
+    e.g., by a machine without access to the database. A shard is a
+    compressed NumPy ``.npz`` file containing:
+
+    * ``metadata``: JSON string with the songs' metadata (the keys in
+      :data:`SHARD_SONG_KEYS` and their number of fingerprints), the
+      fingerprint parameters, and the hash length.
+    * ``hashes``: uint8 array of shape ``(num_fingerprints, num_bytes)``
+      with the bytes of each (hex) hash, for all songs in order.
+    * ``offsets``: float64 array of the offsets (in seconds).
+    * ``checksum``: SHA1 hash of the other three arrays (see
+      :func:`read_shard`).
+
+    The file is written to a temporary file first and renamed, so a shard
+    either exists in full or not at all.
+
+    Args:
+        fpath (str): Path to output file.
+        songs (List[dict]): Song dicts, each containing a ``fingerprints``
+            key (list of (hash, offset) fingerprints with offsets in
+            seconds) and any of the keys in :data:`SHARD_SONG_KEYS`.
+        fingerprint_params (dict): Fingerprinting parameters the songs were
+            fingerprinted with (see
+            :func:`youtube_audio_matcher.audio.fingerprint_params`).
+
+    Returns:
+        str: checksum
+            SHA1 checksum of the shard.
+
+    Raises:
+        ValueError: if the songs' hashes don't all have the same length.
+    """
+    all_hashes = [
+        hash_ for song in songs for hash_, _ in song["fingerprints"]
+    ]
+    hash_length = len(all_hashes[0]) if all_hashes else 40
+    if any(len(hash_) != hash_length for hash_ in all_hashes):
+        raise ValueError("All hashes in a shard must have the same length")
+
+    # Hashes with an odd number of hex digits are padded to whole bytes.
+    pad = "0" * (hash_length % 2)
+    num_bytes = (hash_length + 1) // 2
+    hashes = np.frombuffer(
+        bytes.fromhex(pad.join(all_hashes) + (pad if all_hashes else "")),
+        dtype=np.uint8
+    ).reshape(-1, num_bytes)
+    offsets = np.array(
+        [offset for song in songs for _, offset in song["fingerprints"]],
+        dtype="<f8"
+    )
+
+    metadata = json.dumps(
+        {
+            "format": "yamshard",
+            "version": 1,
+            "hash_length": hash_length,
+            "fingerprint_params": fingerprint_params,
+            "songs": [
+                dict(
+                    {k: song.get(k) for k in SHARD_SONG_KEYS},
+                    num_fingerprints=len(song["fingerprints"])
+                )
+                for song in songs
+            ],
+        },
+        sort_keys=True
+    )
+    checksum = _shard_checksum(metadata, hashes, offsets)
+
+    tmp_fpath = f"{fpath}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(tmp_fpath, "wb") as f:
+            np.savez_compressed(
+                f, metadata=np.array(metadata), hashes=hashes,
+                offsets=offsets, checksum=np.array(checksum)
+            )
+        os.replace(tmp_fpath, fpath)
+    finally:
+        if os.path.exists(tmp_fpath):
+            os.remove(tmp_fpath)
+    return checksum
+
+
+def read_shard(fpath):
+    """
+    Read and verify a shard file written by :func:`write_shard`.
+
+    Args:
+        fpath (str): Path to shard file.
+
+    Returns:
+        tuple: (songs, fingerprint_params, checksum)
+            - songs (List[dict]): Song dicts containing the keys in
+              :data:`SHARD_SONG_KEYS` and a ``fingerprints`` key (list of
+              (hash, offset) fingerprints with offsets in seconds).
+            - fingerprint_params (dict): Fingerprinting parameters the songs
+              were fingerprinted with, or ``None`` if unknown.
+            - checksum (str): SHA1 checksum of the shard.
+
+    Raises:
+        ValueError: if the file isn't a valid shard file or its checksum
+        doesn't match its contents.
+    """
+    try:
+        with np.load(fpath, allow_pickle=False) as data:
+            metadata = str(data["metadata"])
+            hashes = data["hashes"]
+            offsets = data["offsets"]
+            checksum = str(data["checksum"])
+    except (OSError, KeyError, ValueError) as e:
+        raise ValueError(f"{fpath} is not a valid shard file ({str(e)})")
+
+    if _shard_checksum(metadata, hashes, offsets) != checksum:
+        raise ValueError(f"Checksum mismatch in shard file {fpath}")
+    metadata = json.loads(metadata)
+    if metadata.get("format") != "yamshard":
+        raise ValueError(f"{fpath} is not a shard file")
+
+    hash_length = metadata["hash_length"]
+    hex_hashes = hashes.tobytes().hex()
+    step = 2 * hashes.shape[1]
+    offsets = offsets.tolist()
+
+    songs = []
+    start = 0
+    for song in metadata["songs"]:
+        end = start + song.pop("num_fingerprints")
+        song["fingerprints"] = [
+            (hex_hashes[i * step:i * step + hash_length], offsets[i])
+            for i in range(start, end)
+        ]
+        songs.append(song)
+        start = end
+    return songs, metadata["fingerprint_params"], checksum
+
+
+def _shard_path(shard_dir):
+    """
+    Generate a unique path for a new shard file in ``shard_dir``, so that
+    any number of processes or machines can write shards to the same
+    (e.g., shared) directory.
+    """
+    timestamp = datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    return os.path.join(
+        shard_dir, f"shard-{timestamp}-{uuid.uuid4().hex[:12]}.npz"
+    )
+
+
+async def write_shards(
+    loop, executor, in_queue, shard_dir, shard_rows=1000000,
+    shard_timeout=60000, fingerprint_params=None
+):
+    """
+    Consume fingerprinted songs from an async input queue and write them to
+    shard files (see :func:`write_shard`) in ``shard_dir`` instead of adding
+    them to a database, i.e., the offline equivalent of
+    :func:`youtube_audio_matcher.database.update_database`. Songs are
+    accumulated into shards of up to ``shard_rows`` fingerprints (or however
+    many songs arrive within ``shard_timeout`` milliseconds), each written
+    in ``executor``.
+
+    Args:
+        loop (asyncio.BaseEventLoop): asyncio EventLoop.
+        executor (concurrent.futures.Executor): `concurrent.futures`
+            ThreadPoolExecutor or ProcessPoolExecutor in which shards are
+            written.
+        in_queue (asyncio.queues.Queue): Queue containing fingerprinted song
+            dicts.
+        shard_dir (str): Directory to which shards are written (created if
+            it doesn't exist).
+        shard_rows (int): Number of fingerprints after which a shard is
+            written. A song with more fingerprints than this is written to
+            a shard by itself.
+        shard_timeout (float): Max time (in milliseconds) to wait for
+            additional songs after the first song of a shard is received.
+        fingerprint_params (dict): Fingerprinting parameters the songs were
+            fingerprinted with (see
+            :func:`youtube_audio_matcher.audio.fingerprint_params`).
+
+    Returns:
+        List[str]: Paths of the shard files written.
+    """
+    # Imported here to avoid a circular import.
+    from .database import _get_song_batch
+
+    os.makedirs(shard_dir, exist_ok=True)
+    start_t = time.time()
+    fpaths = []
+    done = False
+    while not done:
+        batch, done = await _get_song_batch(
+            in_queue, loop, shard_rows, shard_timeout
+        )
+        if not batch:
+            continue
+
+        fpath = _shard_path(shard_dir)
+        num_rows = sum(len(song["fingerprints"]) for song in batch)
+        try:
+            await loop.run_in_executor(
+                executor, write_shard, fpath, batch, fingerprint_params
+            )
+            fpaths.append(fpath)
+            logging.info(
+                f"Wrote {len(batch)} songs ({num_rows} fingerprints) to "
+                f"shard {fpath}"
+            )
+        except Exception as e:
+            logging.error(
+                f"Error writing {len(batch)} songs to shard {fpath} "
+                f"({str(e)})"
+            )
+        for song in batch:
+            del song["fingerprints"]
+
+    elapsed = time.time() - start_t
+    logging.info(f"Wrote {len(fpaths)} shards in {elapsed:.2f} s")
+    return fpaths
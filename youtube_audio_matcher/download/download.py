@@ -187,7 +187,9 @@ async def get_source(url, page_load_wait=1, scroll_by=5000):
         return source
 
 
-async def video_metadata_from_url(url, download_queue, **kwargs):
+async def video_metadata_from_url(
+    url, download_queue, video_filter=None, **kwargs
+):
     """
     Get the page source for a YouTube channel/user URL. This function
     combines :func:`get_source` and :func:`video_metadata_from_source`.
@@ -196,6 +198,10 @@ async def video_metadata_from_url(url, download_queue, **kwargs):
         url (str): Channel/user URL.
         download_queue (asyncio.queues.Queue): asyncio queue to which the
             extracted videos will be added.
+        video_filter (coroutine function): Optional coroutine function that
+            takes the list of videos extracted from the page and returns the
+            list of videos to add to the download queue (e.g., to skip videos
+            that have already been downloaded).
         **kwargs: Keyword arguments for :func:`get_source` and
             :func:`video_metadata_from_source`.
 
@@ -223,6 +229,8 @@ async def video_metadata_from_url(url, download_queue, **kwargs):
         videos = video_metadata_from_source(
             source, url=url, **video_metadata_from_source_kwargs
         )
+        if video_filter is not None:
+            videos = await video_filter(videos)
         for video in videos:
             video["channel_url"] = url
             logging.debug(f"Added to download queue: {video}")
@@ -232,7 +240,9 @@ async def video_metadata_from_url(url, download_queue, **kwargs):
     return videos
 
 
-async def video_metadata_from_urls(urls, loop, download_queue, **kwargs):
+async def video_metadata_from_urls(
+    urls, loop, download_queue, video_filter=None, **kwargs
+):
     """
     Asychronously get information on each video from the YouTube channels
     corresponding to the given YouTube URLs. This function acts as the producer
@@ -242,6 +252,8 @@ async def video_metadata_from_urls(urls, loop, download_queue, **kwargs):
         urls (List[str]): List of YouTube users/channels.
         download_queue (asyncio.queues.Queue): Queue to which video metadata
             for each video is added for download.
+        video_filter (coroutine function): See
+            :func:`video_metadata_from_url`.
         kwargs: Keyword args for :func:`get_source` and
             :func:`video_metadata_from_source`.
 
@@ -256,7 +268,9 @@ async def video_metadata_from_urls(urls, loop, download_queue, **kwargs):
     tasks = []
     for url in urls:
         task = loop.create_task(
-            video_metadata_from_url(url, download_queue, **kwargs)
+            video_metadata_from_url(
+                url, download_queue, video_filter=video_filter, **kwargs
+            )
         )
         tasks.append(task)
 
@@ -469,7 +483,8 @@ async def download_video_mp3s(
 
 
 def download_channels(
-    loop, urls, dst_dir, executor=None, out_queue=None, **kwargs
+    loop, urls, dst_dir, executor=None, out_queue=None, video_filter=None,
+    **kwargs
 ):
     """
     Asynchronously download all videos from one or more YouTube channels/users
@@ -486,6 +501,9 @@ def download_channels(
             will be pushed after download attempt. This can be used as a
             process queue for asynchronously post-processing each video after
             it has been downloaded.
+        video_filter (coroutine function): Optional coroutine function used
+            to drop videos before they're added to the download queue; see
+            :func:`video_metadata_from_url`.
         **kwargs: Keyword args for :func:`video_metadata_from_urls` and
             :func:`download_video_mp3`.
 
@@ -531,7 +549,8 @@ def download_channels(
     }
 
     get_videos_task = video_metadata_from_urls(
-        rectified_urls, loop, download_queue, **video_metadata_from_urls_kwargs
+        rectified_urls, loop, download_queue, video_filter=video_filter,
+        **video_metadata_from_urls_kwargs
     )
 
     download_video_mp3_kwarg_keys = [
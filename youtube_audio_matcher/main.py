@@ -1,23 +1,53 @@
 import asyncio
+import collections
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import functools
+import hashlib
 import json
 import logging
 import multiprocessing
 import os
+import sys
 import time
 
+import numpy as np
+
 import youtube_audio_matcher as yam
 
 # TODO: add max threads/max processes/max queue size arguments
 # TODO: summary of results (successful downloads, fingerprinting, etc.)
 # TODO: chunk long songs into segments and match segments in parallel
-# TODO: add duration (and actual file duration instead of YT duration) when
-#   adding songs to DB.
 
+# Keyword args (e.g., command line args) for
+# youtube_audio_matcher.database.Database.
+_DB_KEYS = [
+    "db_name", "dialect", "driver", "host", "password", "port", "user",
+    "bloom_filter_path", "pool_size", "max_overflow", "pool_pre_ping",
+    "insert_batch_size", "lookup_strategy", "lookup_threshold",
+    "lookup_chunk_size", "lookup_workers", "read_urls", "shard_urls",
+    "postings_cache_size",
+]
+
+# Keyword args for fingerprinting (see
+# youtube_audio_matcher.audio.fingerprint_from_signal).
+_FINGERPRINT_KEYS = [
+    "win_size", "win_overlap_ratio", "spectrogram_backend",
+    "filter_connectivity", "filter_dilation", "erosion_iterations",
+    "min_amplitude", "fanout", "min_time_delta", "max_time_delta",
+    "hash_length", "time_bin_size", "freq_bin_size",
+]
+
+# Keyword args for match_fingerprints_batch (other than fingerprint_kwargs).
+_MATCH_KEYS = [
+    "match_strategy", "max_candidates", "max_hash_frequency",
+    "max_query_hashes", "use_cache",
+]
 
-def match_fingerprints(song, db_kwargs):
+
+def match_fingerprints(song, db_kwargs, **kwargs):
     """
     Opens a database connection and matches a song against the database.
+    Wraps :func:`match_fingerprints_batch` for a single song.
 
     Args:
         song (dict): Dict corresponding to a fingerprinted song. Must contain
@@ -26,6 +56,7 @@ def match_fingerprints(song, db_kwargs):
             :func:`youtube_audio_matcher.audio.fingerprint_from_file`.
         db_kwargs (dict): Keyword arguments for instantiating a
             :class:`youtube_audio_matcher.database.Database` class instance.
+        **kwargs: Keyword arguments for :func:`match_fingerprints_batch`.
 
     Returns:
         dict: song
@@ -33,7 +64,9 @@ def match_fingerprints(song, db_kwargs):
             a ``matching_song`` key (containing the song dict for the matching
             song from the database) and a ``match_stats`` key (containing
             metrics/statistics related to the match) are added to the dict.
-            The ``fingerprints`` key is deleted. The resulting dict has the
+            A ``query_stats`` key (containing statistics related to the
+            database query) is always added, and the ``fingerprints`` key is
+            deleted. The resulting dict has the
             following structure::
 
                 {
@@ -51,98 +84,858 @@ def match_fingerprints(song, db_kwargs):
                         "filepath": str,
                         "title": str,
                         "youtube_id": str,
-                        "num_fingerprints": int
+                        "num_fingerprints": int,
+                        "num_peaks": int,
+                        "profile_id": int
                     },
                     "match_stats": {
                         "num_matching_fingerprints": int,
                         "confidence": float,
                         "iou": float,
                         "relative_offset": float
+                    },
+                    "query_stats": {
+                        "num_unique_hashes": int,
+                        "num_pruned_hashes": int,
+                        "cache_hit": bool,
+                        "num_filtered_hashes": int,
+                        "num_queried_hashes": int,
+                        "num_candidates": int
                     }
                 }
+
+            ``num_pruned_hashes`` is the number of unique hashes skipped due
+            to their document frequency, ``num_filtered_hashes`` is the
+            number of remaining hashes skipped because they're not in the
+            database Bloom filter, and ``num_queried_hashes`` is the number
+            of unique hashes queried. ``num_candidates`` is the number of
+            candidate songs the song was matched against (only included if
+            ``max_candidates`` is provided; ``None`` if no candidates were
+            found and the song was matched against all songs).
     """
-    db = yam.database.Database(**db_kwargs)
-    song["num_fingerprints"] = len(song["fingerprints"])
+    return match_fingerprints_batch([song], db_kwargs, **kwargs)[0]
 
-    # List of hashes (for the database query) and a list of dicts
-    # containing the hash and offset (to align matches).
-    hashes = []
-    fingerprints = []
 
-    for hash_, offset in song["fingerprints"]:
-        hashes.append(hash_)
-        fingerprints.append({"hash": hash_, "offset": offset})
+def _prune_hashes(hashes, hash_frequencies, max_count=None, max_hashes=None):
+    """
+    Helper function for :func:`match_fingerprints_batch`. Remove hashes whose
+    document frequency exceeds ``max_count`` and keep only the (up to)
+    ``max_hashes`` rarest of the remaining hashes.
+
+    Returns:
+        set: The hashes to be queried.
+    """
+    if max_count is not None:
+        hashes = [
+            hash_ for hash_ in hashes
+            if hash_frequencies.get(hash_, 0) <= max_count
+        ]
+    if max_hashes is not None and len(hashes) > max_hashes:
+        hashes = sorted(
+            hashes, key=lambda hash_: hash_frequencies.get(hash_, 0)
+        )[:max_hashes]
+    return set(hashes)
+
+
+def _params_hash(**params):
+    """
+    Helper function for :func:`match_fingerprints_batch`. Get the SHA1 hash
+    of a set of (JSON-serializable) parameters, independent of their order.
+    """
+    params_str = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(params_str.encode("utf-8")).hexdigest()
+
+
+def _cache_params_hash(
+    fingerprint_kwargs, max_hash_frequency, max_query_hashes,
+    max_candidates=None
+):
+    """
+    Helper function for :func:`match_fingerprints_batch`. Get the hash of the
+    parameters that affect the match result (used as part of the cache key).
+    """
+    # The "delete" fingerprint kwarg only determines whether the file is
+    # deleted afterward.
+    params = {
+        "fingerprint_kwargs": {
+            k: v for k, v in (fingerprint_kwargs or {}).items()
+            if k != "delete"
+        },
+        "max_hash_frequency": max_hash_frequency,
+        "max_query_hashes": max_query_hashes,
+    }
+    # Only included if provided so that results cached without it remain
+    # valid.
+    if max_candidates is not None:
+        params["max_candidates"] = max_candidates
+    return _params_hash(**params)
+
+
+def _pop_fingerprints(song, offset_unit=None):
+    """
+    Helper function for :func:`match_fingerprints_batch`. Remove the
+    ``fingerprints`` key from a song dict (and add ``num_fingerprints``).
+
+    Args:
+        song (dict): Song dict.
+        offset_unit (float): Database offset unit (see
+            :meth:`youtube_audio_matcher.database.Database.query_offset_unit`)
+            to which offsets (in seconds) are converted, if any.
+
+    Returns:
+        List[dict]: The song's fingerprints as dicts containing the hash and
+        offset.
+    """
+    fingerprints = [
+        {"hash": hash_, "offset": offset}
+        for hash_, offset in (song["fingerprints"] or [])
+    ]
+    if offset_unit is not None:
+        for fp in fingerprints:
+            fp["offset"] = int(round(fp["offset"] / offset_unit))
+    song["num_fingerprints"] = len(fingerprints)
 
     # Free up some memory
     del song["fingerprints"]
+    return fingerprints
 
-    unique_hashes = list(set(hashes))
-    db_matches = db.query_fingerprints(unique_hashes)
 
-    if db_matches:
-        # Filter out all input hashes that don't have a database match.
-        matching_hashes = set(fp["hash"] for fp in db_matches)
+def _use_cached_result(song, cached):
+    """
+    Helper function for :func:`match_fingerprints_batch`.
+    """
+    song.update(cached)
+    song["query_stats"]["cache_hit"] = True
+    logging.info(f"Using cached match result for {song['path']}")
+
+
+def _cacheable_results(songs):
+    """
+    Helper function for :func:`match_fingerprints_batch`. Get the
+    (filehash, result) pair to cache for each matched song.
+    """
+    cache_keys = ["matching_song", "match_stats", "query_stats"]
+    return [
+        (song["filehash"], {k: song[k] for k in cache_keys if k in song})
+        for song in songs if song.get("filehash")
+    ]
+
+
+def _get_query_hashes(
+    songs, songs_fingerprints, hash_frequencies, max_count, max_query_hashes,
+    bloom_filter
+):
+    """
+    Helper function for :func:`match_fingerprints_batch`. Determine the
+    hashes of each song to query (after pruning common hashes and hashes
+    that aren't in the Bloom filter, if any) and add ``query_stats`` to each
+    song.
+
+    Returns:
+        tuple: (songs_query_hashes, all_hashes)
+            - songs_query_hashes (List[set]): Hashes to query for each song.
+            - all_hashes (set): The union of all songs' query hashes, i.e.,
+              the hashes to query from the database.
+    """
+    songs_query_hashes = []
+    all_hashes = set()
+
+    for song, fingerprints in zip(songs, songs_fingerprints):
+        unique_hashes = set(fp["hash"] for fp in fingerprints)
+        query_hashes = _prune_hashes(
+            unique_hashes, hash_frequencies, max_count=max_count,
+            max_hashes=max_query_hashes
+        )
+        songs_query_hashes.append(query_hashes)
+        all_hashes.update(query_hashes)
+
+        song["query_stats"] = {
+            "num_unique_hashes": len(unique_hashes),
+            "num_pruned_hashes": len(unique_hashes) - len(query_hashes),
+            "cache_hit": False,
+        }
+        if song["query_stats"]["num_pruned_hashes"]:
+            logging.debug(
+                f"Pruned {song['query_stats']['num_pruned_hashes']} of "
+                f"{len(unique_hashes)} hashes for {song['path']}"
+            )
+
+    # Skip hashes that definitely don't exist in the database (if a Bloom
+    # filter of database hashes is available).
+    num_filtered_hashes = [0] * len(songs)
+    if bloom_filter is not None and all_hashes:
+        num_hashes = len(all_hashes)
+        all_hashes = set(bloom_filter.filter(all_hashes))
+        logging.debug(
+            f"Bloom filter hit rate {len(all_hashes) / num_hashes:.1%}; "
+            f"query reduced from {num_hashes} to {len(all_hashes)} hashes"
+        )
+        for i, query_hashes in enumerate(songs_query_hashes):
+            num_filtered_hashes[i] = len(query_hashes - all_hashes)
+            query_hashes &= all_hashes
+
+    for song, query_hashes, num_filtered in zip(
+        songs, songs_query_hashes, num_filtered_hashes
+    ):
+        song["query_stats"]["num_filtered_hashes"] = num_filtered
+        song["query_stats"]["num_queried_hashes"] = len(query_hashes)
+    return songs_query_hashes, all_hashes
+
+
+def _align_matches_batch(
+    paths, songs_fingerprints, songs_query_hashes, db_matches,
+    offset_unit=None, songs_candidates=None
+):
+    """
+    Helper function for :func:`match_fingerprints_batch`. Split the database
+    fingerprints (postings) matching the queried hashes back up per song and
+    align each song's matches. This is the CPU-bound part of matching.
+    ``offset_unit`` is passed to
+    :func:`youtube_audio_matcher.audio.align_matches`. If
+    ``songs_candidates`` is provided, each song's matches are restricted to
+    its candidate songs (see :func:`_get_candidates`).
+
+    Returns:
+        List[dict|None]: For each song, the result returned by
+        :func:`youtube_audio_matcher.audio.align_matches` or ``None`` if
+        the song has no matching hashes.
+    """
+    # Map each hash to the list of database fingerprints (postings) that
+    # contain it so the query results can be split back up per song.
+    hash_to_db_matches = collections.defaultdict(list)
+    for fp in db_matches:
+        hash_to_db_matches[fp["hash"]].append(fp)
+
+    if songs_candidates is None:
+        songs_candidates = [None] * len(paths)
+
+    results = []
+    for path, fingerprints, query_hashes, candidates in zip(
+        paths, songs_fingerprints, songs_query_hashes, songs_candidates
+    ):
+        result = None
+
+        # Filter out all input hashes that weren't queried or don't have a
+        # database match.
         fingerprints = [
-            fp for fp in fingerprints if fp["hash"] in matching_hashes
+            fp for fp in fingerprints
+            if fp["hash"] in query_hashes and fp["hash"] in hash_to_db_matches
         ]
+        song_db_matches = []
+        if fingerprints:
+            for hash_ in set(fp["hash"] for fp in fingerprints):
+                song_db_matches.extend(hash_to_db_matches[hash_])
+            if candidates is not None:
+                candidates = set(candidates)
+                song_db_matches = [
+                    fp for fp in song_db_matches
+                    if fp["song_id"] in candidates
+                ]
 
-        logging.info(f"Aligning hash matches for {song['path']}")
-        result = yam.audio.align_matches(fingerprints, db_matches)
-        if result is not None:
-            # Query the database for the matching song.
-            match_song = db.query_songs(
-                id_=result["song_id"], include_fingerprints=True
-            )[0]
-            del match_song["fingerprints"]
-            song["matching_song"] = match_song
-
-            num_matching_fingerprints = result["num_matching_fingerprints"]
-
-            # Compute confidence as number of matching hashes divided by
-            # number of song hashes.
-            confidence = num_matching_fingerprints / song["num_fingerprints"]
-
-            # Compute IOU as another metric.
-            inter = num_matching_fingerprints
-            union = (
-                (song["num_fingerprints"] + match_song["num_fingerprints"])
-                - num_matching_fingerprints
+        if song_db_matches:
+            logging.info(f"Aligning hash matches for {path}")
+            result = yam.audio.align_matches(
+                fingerprints, song_db_matches, offset_unit=offset_unit
             )
-            iou = inter / union
+            logging.info(f"Finished aligning hash matches for {path}")
+        results.append(result)
+    return results
+
+
+def _get_match_strategy(match_strategy, offset_unit, sharded=False):
+    """
+    Helper function for :func:`match_fingerprints_batch`. Validate the match
+    strategy, falling back to ``"client"`` if the database stores offsets
+    in seconds or is sharded (which can't be aligned in the database).
+    """
+    if match_strategy not in ("client", "sql"):
+        raise ValueError(f"Invalid match strategy {match_strategy}")
+    if match_strategy == "sql" and offset_unit is None:
+        logging.warning(
+            "Database stores offsets in seconds; aligning matches client-side"
+        )
+        match_strategy = "client"
+    elif match_strategy == "sql" and sharded:
+        logging.warning("Database is sharded; aligning matches client-side")
+        match_strategy = "client"
+    return match_strategy
 
-            song["match_stats"] = {
-                "num_matching_fingerprints": num_matching_fingerprints,
-                "confidence": confidence,
-                "iou": iou,
-                "relative_offset": result["relative_offset"],
-            }
-        logging.info(f"Finished aligning hash matches for {song['path']}")
-    del db
-    return song
 
+# Id that no fingerprint profile has (profile ids start at 1). Restricting
+# matches to it (see Database.query_fingerprints) leaves only the songs with
+# an unknown profile.
+_NO_PROFILE_ID = 0
 
-async def _match_song(song, loop, executor, db_kwargs):
+
+def _get_profile_id(profiles, num_songs, fingerprint_kwargs):
     """
-    Helper function for :func:`match_songs`.
+    Helper function for :func:`get_match_profile_id`.
+
+    Args:
+        profiles (List[dict]): Profiles returned by
+            :meth:`youtube_audio_matcher.database.Database.query_profiles`.
+        num_songs (int): Number of database songs.
+        fingerprint_kwargs (dict): See :func:`get_match_profile_id`.
     """
-    start_t = time.time()
-    logging.info(f"Matching fingerprints for {song['path']}")
-    matched_song = await loop.run_in_executor(
-        executor, match_fingerprints, song, db_kwargs
+    if fingerprint_kwargs is None:
+        return None
+    profiles = [profile for profile in profiles if profile["num_songs"]]
+    if not profiles:
+        return None
+
+    params = yam.audio.fingerprint_params(**fingerprint_kwargs)
+    for profile in profiles:
+        if profile["params"] == params:
+            return profile["id"] if len(profiles) > 1 else None
+
+    num_unknown = num_songs - sum(profile["num_songs"] for profile in profiles)
+    if num_unknown > 0:
+        logging.warning(
+            "No database songs were fingerprinted with the given fingerprint "
+            f"parameters ({params}); only matching the {num_unknown} songs "
+            "with unknown parameters"
+        )
+        return _NO_PROFILE_ID
+    raise ValueError(
+        "No database songs were fingerprinted with the given fingerprint "
+        f"parameters ({params}); refingerprint the database songs (see yamdb "
+        "--refingerprint) or use the parameters of one of its profiles "
+        "(see yamdb --profiles)"
     )
-    elapsed = time.time() - start_t
-    logging.info(
-        f"Finished matching fingerprints for {matched_song['path']} "
-        f"in {elapsed:.2f} s"
+
+
+def get_match_profile_id(db, fingerprint_kwargs):
+    """
+    Get the fingerprint profile (see
+    :meth:`youtube_audio_matcher.database.Database.query_profiles`) the
+    database songs must have been fingerprinted with (or whose profile must
+    be unknown) to be matched against songs fingerprinted with
+    ``fingerprint_kwargs``, e.g., to check it once before matching many
+    batches with :func:`match_fingerprints_batch`. If no songs were
+    fingerprinted with the query songs' profile, only songs with an unknown
+    profile (e.g., songs added by earlier versions) are matched.
+
+    Args:
+        db (youtube_audio_matcher.database.Database): Database connection.
+        fingerprint_kwargs (dict): Keyword arguments used to fingerprint the
+            query songs (see
+            :func:`youtube_audio_matcher.audio.fingerprint_from_file`), or
+            ``None`` to match all songs.
+
+    Returns:
+        int: Profile id to pass to :func:`match_fingerprints_batch`, or
+        ``None`` if all songs can be matched (no songs are tagged with a
+        profile, or all tagged songs have the query songs' profile).
+
+    Raises:
+        ValueError: if no database songs were fingerprinted with the query
+        songs' profile and none have an unknown profile.
+    """
+    if fingerprint_kwargs is None:
+        return None
+    return _get_profile_id(
+        db.query_profiles(), db.count_songs(), fingerprint_kwargs
     )
-    return matched_song
+
+
+def _get_query_fingerprints(songs_fingerprints, songs_query_hashes):
+    """
+    Helper function for :func:`match_fingerprints_batch`. Get the
+    fingerprints of each song whose hashes are queried, as (hash, offset)
+    tuples, for aligning matches in the database.
+    """
+    return [
+        [
+            (fp["hash"], fp["offset"]) for fp in fingerprints
+            if fp["hash"] in query_hashes
+        ]
+        for fingerprints, query_hashes in zip(
+            songs_fingerprints, songs_query_hashes
+        )
+    ]
+
+
+def _get_candidates(songs, songs_query_hashes, songs_candidates):
+    """
+    Helper function for :func:`match_fingerprints_batch`. Add the number of
+    candidate songs (see
+    :meth:`youtube_audio_matcher.database.Database.query_candidates`) to
+    each song's ``query_stats``. Songs that have hashes to query but no
+    candidates (e.g., if their matching songs were added without sketches)
+    fall back to being matched against all songs.
+
+    Returns:
+        tuple: (songs_candidates, song_ids)
+            - songs_candidates (List[List[int]|None]): Candidate song ids of
+              each song, or ``None`` for songs matched against all songs.
+            - song_ids (List[int]|None): The union of all songs' candidates,
+              i.e., the songs to query, or ``None`` if any song is matched
+              against all songs.
+    """
+    song_ids = set()
+    for i, (song, query_hashes, candidates) in enumerate(
+        zip(songs, songs_query_hashes, songs_candidates)
+    ):
+        if query_hashes and not candidates:
+            logging.debug(f"No candidate songs found for {song['path']}")
+            songs_candidates[i] = None
+            song_ids = None
+        elif song_ids is not None:
+            song_ids.update(candidates)
+        song["query_stats"]["num_candidates"] = (
+            len(candidates) if candidates else None
+        )
+
+    if song_ids is not None:
+        song_ids = sorted(song_ids)
+    return songs_candidates, song_ids
+
+
+def _add_match_stats(songs, results, matching_songs, fingerprint_counts):
+    """
+    Helper function for :func:`match_fingerprints_batch`. Add the matching
+    song and match statistics to each song with a match.
+
+    Args:
+        songs (List[dict]): Songs that were matched.
+        results (List[dict|None]): See :func:`_align_matches_batch`.
+        matching_songs (List[dict]): Database songs matched by
+            ``results``.
+        fingerprint_counts (dict): Number of fingerprints of any matching
+            songs whose ``num_fingerprints`` column isn't populated.
+    """
+    id_to_match_song = {
+        match_song["id"]: match_song for match_song in matching_songs
+    }
+    for song_id, count in fingerprint_counts.items():
+        id_to_match_song[song_id]["num_fingerprints"] = count
+
+    for song, result in zip(songs, results):
+        if result is None:
+            continue
+
+        match_song = id_to_match_song[result["song_id"]]
+        song["matching_song"] = match_song
+
+        num_matching_fingerprints = result["num_matching_fingerprints"]
+
+        # Compute confidence as number of matching hashes divided by
+        # number of song hashes.
+        confidence = num_matching_fingerprints / song["num_fingerprints"]
+
+        # Compute IOU as another metric.
+        inter = num_matching_fingerprints
+        union = (
+            (song["num_fingerprints"] + match_song["num_fingerprints"])
+            - num_matching_fingerprints
+        )
+        iou = inter / union
+
+        song["match_stats"] = {
+            "num_matching_fingerprints": num_matching_fingerprints,
+            "confidence": confidence,
+            "iou": iou,
+            "relative_offset": result["relative_offset"],
+        }
+
+
+def _call(name, *args, **kwargs):
+    """
+    Helper function for :func:`_match_batch`. A database method call (or,
+    if ``name`` is ``"align_matches"``, a call of
+    :func:`_align_matches_batch`) to be made by the caller.
+    """
+    return name, args, kwargs
+
+
+def _match_batch(
+    songs, db, max_hash_frequency, max_query_hashes, use_cache,
+    fingerprint_kwargs, match_strategy, max_candidates, profile_id
+):
+    """
+    Helper function for :func:`match_fingerprints_batch` and
+    :func:`match_fingerprints_batch_async`, which implements matching a
+    batch of songs independently of how the database is queried. It's a
+    generator that yields each database query (and the CPU-bound alignment
+    of matches) as a call (see :func:`_call`) and is sent its result, so
+    that the queries can either be made directly with a
+    :class:`youtube_audio_matcher.database.Database` or awaited with an
+    :class:`youtube_audio_matcher.database.AsyncDatabase`. ``db`` is only
+    used for attributes that don't query the database. See
+    :func:`match_fingerprints_batch` for the other arguments.
+    """
+    params_hash = None
+    content_version = None
+    if use_cache:
+        params_hash = _cache_params_hash(
+            fingerprint_kwargs, max_hash_frequency, max_query_hashes,
+            max_candidates
+        )
+        content_version = yield _call("query_content_version")
+    if profile_id == "auto":
+        profile_id = None
+        if fingerprint_kwargs is not None:
+            profile_id = _get_profile_id(
+                (yield _call("query_profiles")),
+                (yield _call("count_songs")),
+                fingerprint_kwargs
+            )
+    offset_unit = yield _call("query_offset_unit")
+    match_strategy = _get_match_strategy(
+        match_strategy, offset_unit,
+        sharded=getattr(db, "shard_engines", None) is not None
+    )
+
+    # Songs without a cached result (which must be matched against the
+    # database) and, for each such song, a list of dicts containing the hash
+    # and offset (to align matches).
+    uncached_songs = []
+    songs_fingerprints = []
+
+    for song in songs:
+        fingerprints = _pop_fingerprints(song, offset_unit)
+
+        cached = None
+        if use_cache and song.get("filehash"):
+            cached = yield _call(
+                "query_match_result", song["filehash"], params_hash,
+                content_version
+            )
+
+        if cached is not None:
+            _use_cached_result(song, cached)
+        else:
+            uncached_songs.append(song)
+            songs_fingerprints.append(fingerprints)
+
+    # Get the document frequency of each hash (if needed) to prune common
+    # hashes and/or query only the rarest hashes.
+    hash_frequencies = {}
+    max_count = None
+    all_hashes = set(fp["hash"] for fps in songs_fingerprints for fp in fps)
+    if all_hashes and (
+        max_hash_frequency is not None or max_query_hashes is not None
+    ):
+        hash_frequencies = yield _call(
+            "query_hash_frequencies", list(all_hashes)
+        )
+        if max_hash_frequency is not None:
+            max_count = max_hash_frequency * (yield _call("count_songs"))
+
+    songs_query_hashes, all_hashes = _get_query_hashes(
+        uncached_songs, songs_fingerprints, hash_frequencies, max_count,
+        max_query_hashes, db.bloom_filter
+    )
+
+    # Select candidate songs (if requested) to restrict the query to.
+    songs_candidates = None
+    candidate_song_ids = None
+    if max_candidates is not None and all_hashes:
+        songs_candidates, candidate_song_ids = _get_candidates(
+            uncached_songs, songs_query_hashes,
+            (
+                yield _call(
+                    "query_candidates", songs_query_hashes,
+                    max_candidates=max_candidates
+                )
+            )
+        )
+
+    if match_strategy == "sql":
+        songs_matches = [[] for _ in uncached_songs]
+        if all_hashes:
+            songs_matches = yield _call(
+                "query_matches",
+                _get_query_fingerprints(
+                    songs_fingerprints, songs_query_hashes
+                ),
+                song_ids=candidate_song_ids, profile_id=profile_id
+            )
+        results = [
+            matches[0] if matches else None for matches in songs_matches
+        ]
+    else:
+        db_matches = []
+        if all_hashes:
+            db_matches = yield _call(
+                "query_fingerprints", list(all_hashes),
+                song_ids=candidate_song_ids, profile_id=profile_id
+            )
+            cache_stats = db.postings_cache_stats()
+            if cache_stats is not None:
+                logging.debug(
+                    f"Postings cache: {cache_stats['hits']} hits, "
+                    f"{cache_stats['misses']} misses, "
+                    f"{cache_stats['evictions']} evictions, "
+                    f"{cache_stats['size'] / 2 ** 20:.1f} MiB"
+                )
+
+        results = yield _call(
+            "align_matches",
+            [song["path"] for song in uncached_songs], songs_fingerprints,
+            songs_query_hashes, db_matches, offset_unit, songs_candidates
+        )
+
+    # Query the database for all matching songs at once.
+    match_song_ids = list(
+        set(result["song_id"] for result in results if result is not None)
+    )
+    matching_songs = []
+    if match_song_ids:
+        matching_songs = yield _call("query_songs", id_=match_song_ids)
+
+    # Count the fingerprints of any songs whose num_fingerprints column hasn't
+    # been populated (see Database.backfill_song_stats).
+    missing_counts = [
+        match_song["id"] for match_song in matching_songs
+        if match_song["num_fingerprints"] is None
+    ]
+    fingerprint_counts = {}
+    if missing_counts:
+        fingerprint_counts = yield _call("count_fingerprints", missing_counts)
+
+    _add_match_stats(
+        uncached_songs, results, matching_songs, fingerprint_counts
+    )
+
+    if use_cache:
+        for filehash, result in _cacheable_results(uncached_songs):
+            yield _call(
+                "add_match_result", filehash, params_hash, content_version,
+                result
+            )
+
+
+def match_fingerprints_batch(
+    songs, db_kwargs, max_hash_frequency=None, max_query_hashes=None,
+    use_cache=False, fingerprint_kwargs=None, db=None,
+    match_strategy="client", max_candidates=None, profile_id="auto"
+):
+    """
+    Opens a single database connection and matches a batch of songs against
+    the database. The hashes of all songs in the batch are combined into a
+    single database query, after which the matching database fingerprints
+    (postings) are split back up per song and aligned. Alternatively, with
+    ``match_strategy="sql"``, matches are aligned in the database and only
+    the best match for each song is returned by the query.
+
+    Args:
+        songs (List[dict]): List of dicts corresponding to fingerprinted
+            songs. See :func:`match_fingerprints`.
+        db_kwargs (dict): Keyword arguments for instantiating a
+            :class:`youtube_audio_matcher.database.Database` class instance.
+        max_hash_frequency (float): If provided, hashes that occur in more
+            than this fraction (in the range [0, 1]) of database songs are
+            not queried. The ``hash_frequency`` table is updated as songs are
+            added, but must be rebuilt once for databases with songs added by
+            earlier versions; see
+            :meth:`youtube_audio_matcher.database.Database.rebuild_hash_frequencies`.
+        max_query_hashes (int): If provided, only the ``max_query_hashes``
+            rarest (by document frequency) unique hashes of each song are
+            queried.
+        use_cache (bool): Look up cached match results (keyed by file hash,
+            fingerprint/match parameters, and database content version)
+            before querying the database, and cache the results of songs
+            that aren't found. Songs with a cached result are not matched
+            against the fingerprint table. See
+            :meth:`youtube_audio_matcher.database.Database.query_match_result`.
+        fingerprint_kwargs (dict): Keyword arguments used to fingerprint
+            the songs (see
+            :func:`youtube_audio_matcher.audio.fingerprint_from_file`). If
+            provided, songs are only matched against database songs
+            fingerprinted with the same parameters (or with unknown
+            parameters) unless ``profile_id`` is provided; see
+            :func:`get_match_profile_id`, which raises a ValueError if there
+            are none. Also used to compute the cache key if
+            ``use_cache=True``.
+        db (youtube_audio_matcher.database.Database): Existing database
+            connection to use instead of opening a new one from
+            ``db_kwargs`` (e.g., a connection kept open by
+            :func:`youtube_audio_matcher.server.serve`).
+        match_strategy (str): ``"client"`` to query the matching
+            fingerprints and align them with
+            :func:`youtube_audio_matcher.audio.align_matches`, or ``"sql"``
+            to align them in the database (see
+            :meth:`youtube_audio_matcher.database.Database.query_matches`),
+            which avoids transferring the matching fingerprints but moves
+            the work of aligning them to the database server. ``"sql"``
+            requires integer offsets and an unsharded database; otherwise,
+            ``"client"`` is used instead.
+        max_candidates (int): If provided, each song is only matched against
+            the (up to) ``max_candidates`` database songs whose MinHash
+            sketches share the most LSH buckets with it (see
+            :meth:`youtube_audio_matcher.database.Database.query_candidates`),
+            and only the fingerprints of the candidates of the songs in the
+            batch are queried. Songs without any candidates are matched
+            against all songs. With ``match_strategy="sql"``, each song is
+            matched against the candidates of all songs in the batch.
+        profile_id (int): Profile id returned by
+            :func:`get_match_profile_id` for ``fingerprint_kwargs`` (e.g.,
+            computed once for all batches), or ``"auto"`` to get it for the
+            batch.
+
+    Returns:
+        List[dict]: songs
+            The input list of song dicts, each of which is updated as
+            described in :func:`match_fingerprints`.
+    """
+    close_db = db is None
+    if db is None:
+        db = yam.database.Database(**db_kwargs)
+
+    steps = _match_batch(
+        songs, db, max_hash_frequency, max_query_hashes, use_cache,
+        fingerprint_kwargs, match_strategy, max_candidates, profile_id
+    )
+    result = None
+    while True:
+        try:
+            name, args, kwargs = steps.send(result)
+        except StopIteration:
+            break
+        if name == "align_matches":
+            result = _align_matches_batch(*args, **kwargs)
+        else:
+            result = getattr(db, name)(*args, **kwargs)
+
+    if close_db:
+        del db
+    return songs
+
+
+async def match_fingerprints_batch_async(
+    songs, db, loop, executor=None, max_hash_frequency=None,
+    max_query_hashes=None, use_cache=False, fingerprint_kwargs=None,
+    match_strategy="client", max_candidates=None, profile_id="auto"
+):
+    """
+    Coroutine version of :func:`match_fingerprints_batch` that awaits
+    database queries directly via an
+    :class:`youtube_audio_matcher.database.AsyncDatabase` and only runs the
+    CPU-bound alignment of matches in an executor.
+
+    Args:
+        songs (List[dict]): See :func:`match_fingerprints_batch`.
+        db (youtube_audio_matcher.database.AsyncDatabase): Database
+            connection.
+        loop (asyncio.BaseEventLoop): asyncio EventLoop.
+        executor (concurrent.futures.Executor): ``concurrent.futures``
+            ProcessPoolExecutor in which matches are aligned. Defaults to the
+            event loop's default executor.
+        max_hash_frequency (float): See :func:`match_fingerprints_batch`.
+        max_query_hashes (int): See :func:`match_fingerprints_batch`.
+        use_cache (bool): See :func:`match_fingerprints_batch`.
+        fingerprint_kwargs (dict): See :func:`match_fingerprints_batch`.
+        match_strategy (str): See :func:`match_fingerprints_batch`.
+        max_candidates (int): See :func:`match_fingerprints_batch`.
+        profile_id (int): See :func:`match_fingerprints_batch`.
+
+    Returns:
+        List[dict]: songs
+            See :func:`match_fingerprints_batch`.
+    """
+    steps = _match_batch(
+        songs, db, max_hash_frequency, max_query_hashes, use_cache,
+        fingerprint_kwargs, match_strategy, max_candidates, profile_id
+    )
+    result = None
+    while True:
+        try:
+            name, args, kwargs = steps.send(result)
+        except StopIteration:
+            break
+        if name == "align_matches":
+            result = await loop.run_in_executor(
+                executor, functools.partial(
+                    _align_matches_batch, *args, **kwargs
+                )
+            )
+        else:
+            result = await getattr(db, name)(*args, **kwargs)
+    return songs
+
+
+async def _match_songs_batch(
+    songs, loop, executor, db_kwargs, db=None, **kwargs
+):
+    """
+    Helper function for :func:`match_songs`. If an
+    :class:`youtube_audio_matcher.database.AsyncDatabase` is provided, it's
+    used to query the database from the event loop (see
+    :func:`match_fingerprints_batch_async`).
+    """
+    start_t = time.time()
+    for song in songs:
+        logging.info(f"Matching fingerprints for {song['path']}")
+
+    if db is not None:
+        matched_songs = await match_fingerprints_batch_async(
+            songs, db, loop, executor, **kwargs
+        )
+    else:
+        # Make partial with kwargs since run_in_executor only takes *args.
+        match_fingerprints_batch_partial = functools.partial(
+            match_fingerprints_batch, songs, db_kwargs, **kwargs
+        )
+        matched_songs = await loop.run_in_executor(
+            executor, match_fingerprints_batch_partial
+        )
+    elapsed = time.time() - start_t
+    for matched_song in matched_songs:
+        logging.info(
+            f"Finished matching fingerprints for {matched_song['path']} "
+            f"in {elapsed:.2f} s"
+        )
+    return matched_songs
+
+
+async def _get_batch(in_queue, loop, batch_size, batch_timeout):
+    """
+    Helper function for :func:`match_songs`. Get up to ``batch_size`` items
+    from a queue, waiting at most ``batch_timeout`` milliseconds for
+    additional items after the first item has been received.
+
+    Returns:
+        tuple: (batch, done)
+            - batch (list): List of items from the queue.
+            - done (bool): Whether the end of the queue (``None``) was
+              reached.
+    """
+    item = await in_queue.get()
+    if item is None:
+        return [], True
+
+    batch = [item]
+    deadline = loop.time() + (batch_timeout / 1000)
+    while len(batch) < batch_size:
+        if in_queue.empty():
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(in_queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+        else:
+            item = in_queue.get_nowait()
+
+        if item is None:
+            return batch, True
+        batch.append(item)
+    return batch, False
 
 
 # TODO: Rename wrapper functions, helper functions, core algo functions?
-async def match_songs(loop, executor, db_kwargs, in_queue):
+async def match_songs(
+    loop, executor, db_kwargs, in_queue, batch_size=1, batch_timeout=0,
+    async_db=False, **kwargs
+):
     """
     Coroutine that consumes songs from a queue and matches them against
-    the database.
+    the database. Songs are matched in batches (see
+    :func:`match_fingerprints_batch`) of up to ``batch_size`` songs, where
+    each batch contains all songs received within ``batch_timeout``
+    milliseconds of the first song in the batch.
 
     Args:
         loop (asyncio.BaseEventLoop): asyncio EventLoop.
@@ -152,36 +945,318 @@ async def match_songs(loop, executor, db_kwargs, in_queue):
             :class:`youtube_audio_matcher.database.Database` class instance.
         in_queue (asyncio.queues.Queue): Download queue from which song
             data is fetched for each song to be matched.
+        batch_size (int): Maximum number of songs per batch.
+        batch_timeout (float): Maximum time (in milliseconds) to wait for
+            additional songs to fill a batch.
+        async_db (bool): Query the database from the event loop with an
+            :class:`youtube_audio_matcher.database.AsyncDatabase` (which
+            requires an asyncio driver for the database dialect) and only
+            align matches in ``executor``, instead of matching each batch
+            entirely in ``executor``.
+        **kwargs: Keyword arguments for :func:`match_fingerprints_batch`.
 
     Returns:
         List[dict]: results
             A list of dicts where each dict represents an input song and
             database match information returned by :func:`match_fingerprints`.
     """
-    tasks = []
-    while True:
-        song = await in_queue.get()
-        if song is None:
-            break
+    db = None
+    if async_db:
+        db = yam.database.AsyncDatabase(**db_kwargs)
 
-        task = loop.create_task(_match_song(song, loop, executor, db_kwargs))
-        tasks.append(task)
+    tasks = []
+    done = False
+    while not done:
+        songs, done = await _get_batch(
+            in_queue, loop, max(batch_size, 1), batch_timeout
+        )
+        if songs:
+            task = loop.create_task(
+                _match_songs_batch(
+                    songs, loop, executor, db_kwargs, db=db, **kwargs
+                )
+            )
+            tasks.append(task)
 
     # Wrap asyncio.wait() in if statement to avoid error if no tasks.
     if tasks:
         await asyncio.wait(tasks)
+    if db is not None:
+        await db.dispose()
+
+    return [song for task in tasks for song in task.result()]
+
+
+def match_stream(
+    stream, db_kwargs, sample_rate=44100, num_channels=1, window=10,
+    interval=2, follow=False, poll_interval=0.5, name=None, **kwargs
+):
+    """
+    Continuously match a raw PCM audio stream (e.g., piped from a capture
+    process or read from a growing recording file) against the database.
+    The stream is fingerprinted incrementally (see
+    :class:`youtube_audio_matcher.audio.StreamFingerprinter`), and the
+    fingerprints from the last ``window`` seconds of audio are matched
+    against the database every ``interval`` seconds of audio.
+
+    Args:
+        stream (io.BufferedIOBase): Binary file object containing
+            interleaved signed 16-bit little-endian PCM samples.
+        db_kwargs (dict): Keyword arguments for instantiating a
+            :class:`youtube_audio_matcher.database.Database` class instance.
+        sample_rate (int): Stream sample rate (Hz).
+        num_channels (int): Number of interleaved channels in the stream.
+        window (float): Duration (in seconds) of the sliding window of audio
+            matched against the database.
+        interval (float): Stream time (in seconds) between matches.
+        follow (bool): Wait for more data at the end of the stream instead
+            of stopping, i.e., to read a file that is still being written.
+        poll_interval (float): Time (in seconds) to wait before checking
+            for more data at the end of the stream if ``follow=True``.
+        name (str): Stream name, used as the ``path`` of each result.
+        **kwargs: Keyword arguments for
+            :class:`youtube_audio_matcher.audio.StreamFingerprinter` and
+            :func:`match_fingerprints_batch`.
+
+    Yields:
+        dict: song
+            The result of :func:`match_fingerprints` for each window, with an
+            additional ``stream_time`` key containing the stream time (in
+            seconds) at the end of the window.
+    """
+    fingerprint_kwargs = {
+        k: v for k, v in kwargs.items() if k in _FINGERPRINT_KEYS
+    }
+    match_kwargs = {k: v for k, v in kwargs.items() if k in _MATCH_KEYS}
+    match_kwargs["fingerprint_kwargs"] = fingerprint_kwargs
+
+    fingerprinters = [
+        yam.audio.StreamFingerprinter(
+            sample_rate=sample_rate, **fingerprint_kwargs
+        )
+        for _ in range(num_channels)
+    ]
+
+    # Hashes (hash/offset pairs) in the current window, for each channel.
+    # Each fingerprinter returns its hashes in offset order, so a channel's
+    # hashes can be trimmed from the left; hashes from different channels
+    # aren't in offset order relative to one another.
+    channel_hashes = [collections.deque() for _ in range(num_channels)]
 
-    return [task.result() for task in tasks]
+    def _match_window(stream_time):
+        hashes = []
+        for channel in channel_hashes:
+            while channel and channel[0][1] < stream_time - window:
+                channel.popleft()
+            hashes.extend(channel)
+        song = {
+            "path": name,
+            "stream_time": stream_time,
+            "fingerprints": hashes,
+        }
+        logging.debug(
+            f"Matching {len(hashes)} hashes from {name} at {stream_time:.2f} s"
+        )
+        return match_fingerprints(song, db_kwargs, **match_kwargs)
+
+    # Read whatever data is available (up to ~0.1 s of audio) at a time.
+    read = getattr(stream, "read1", stream.read)
+    bytes_per_frame = 2 * num_channels
+    read_size = max(sample_rate // 10, 1) * bytes_per_frame
+
+    buf = b""
+    next_match_time = interval
+    while True:
+        data = read(read_size)
+        if not data:
+            if follow:
+                time.sleep(poll_interval)
+                continue
+            break
+
+        # Only use complete frames (one sample per channel).
+        buf += data
+        num_bytes = len(buf) - (len(buf) % bytes_per_frame)
+        samples = np.frombuffer(buf[:num_bytes], dtype="<i2")
+        buf = buf[num_bytes:]
+
+        for i, fingerprinter in enumerate(fingerprinters):
+            channel_hashes[i].extend(
+                fingerprinter.update(samples[i::num_channels])
+            )
+
+        stream_time = fingerprinters[0].time
+        if stream_time >= next_match_time:
+            yield _match_window(stream_time)
+            next_match_time = stream_time + interval
+
+    for fingerprinter, channel in zip(fingerprinters, channel_hashes):
+        channel.extend(fingerprinter.flush())
+    yield _match_window(fingerprinters[0].time)
+
+
+def run_match_stream(source, conf_thresh=0.01, out_fpath=None, **kwargs):
+    """
+    Wrapper function for :func:`match_stream`. Opens a stream, matches it
+    against the database, and logs (and optionally writes) matches as they
+    are found.
+
+    Args:
+        source (str): Path to a raw PCM file, or ``-`` to read from stdin.
+        conf_thresh (float): Match confidence threshold; see :func:`main`.
+        out_fpath (str): Path to output file to which matches are appended
+            as JSON lines.
+        **kwargs: Any keyword arguments for
+            :class:`youtube_audio_matcher.database.Database` and
+            :func:`match_stream`.
+
+    Returns:
+        List[dict]: matches
+            List of dicts returned by :func:`match_stream` for each window
+            with a match in the database.
+    """
+    db_kwargs = {k: v for k, v in kwargs.items() if k in _DB_KEYS}
+    kwargs = {k: v for k, v in kwargs.items() if k not in _DB_KEYS}
+
+    if source == "-":
+        stream = sys.stdin.buffer
+    else:
+        stream = open(source, "rb")
+
+    out_file = open(out_fpath, "a") if out_fpath else None
+
+    matches = []
+    try:
+        for song in match_stream(stream, db_kwargs, name=source, **kwargs):
+            if (
+                "match_stats" in song
+                and song["match_stats"]["confidence"] > conf_thresh
+            ):
+                matches.append(song)
+                json_match = json.dumps(song, indent=4)
+                logging.info(
+                    f"Match at {song['stream_time']:.2f} s:\n" + json_match
+                )
+                if out_file is not None:
+                    out_file.write(json.dumps(song) + "\n")
+                    out_file.flush()
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+        if out_file is not None:
+            out_file.close()
+    return matches
+
+
+def _query_existing(db_kwargs, column, values):
+    """
+    Helper function for :func:`_skip_existing`. Run in an executor.
+    """
+    db = yam.database.Database(**db_kwargs)
+    try:
+        return db.query_existing(column, values)
+    finally:
+        db.session.close()
+
+
+async def _skip_existing(
+    items, column, loop, executor, db_kwargs, seen, skipped
+):
+    """
+    Helper function for :func:`main`. Drop songs/videos whose ``column``
+    value (``"youtube_id"`` or ``"filehash"``) is already in the database or
+    has already been seen in this run, using a single batched lookup.
+
+    Args:
+        items (List[dict]): Song/video dicts.
+        column (str): Song dict key and Song table column to check.
+        loop (asyncio.BaseEventLoop): asyncio EventLoop.
+        executor (concurrent.futures.Executor): Executor in which the
+            database is queried.
+        db_kwargs (dict): Keyword arguments for instantiating a
+            :class:`youtube_audio_matcher.database.Database` class instance.
+        seen (set): Values seen so far in this run; updated in place.
+        skipped (collections.Counter): Number of skipped items per column;
+            updated in place.
+
+    Returns:
+        List[dict]: The items that aren't in the database.
+    """
+    values = [item.get(column) for item in items]
+    existing = set()
+    if any(value is not None for value in values):
+        existing = await loop.run_in_executor(
+            executor, _query_existing, db_kwargs, column, values
+        )
+
+    new_items = []
+    for item, value in zip(items, values):
+        if value is None:
+            new_items.append(item)
+        elif value in existing or value in seen:
+            skipped[column] += 1
+            if value in existing:
+                reason = f"{column} {value} already in database"
+            else:
+                reason = f"duplicate {column} {value}"
+            logging.info(f"Skipping {item.get('path') or value} ({reason})")
+        else:
+            seen.add(value)
+            new_items.append(item)
+    return new_items
+
+
+async def _hash_song(song, loop, executor):
+    if song["path"]:
+        song["filehash"] = await loop.run_in_executor(
+            executor, yam.audio.hash_file, song["path"]
+        )
+    return song
+
+
+async def _skip_existing_files(
+    loop, executor, db_kwargs, in_queue, out_queue, skipped, batch_size=100,
+    batch_timeout=100
+):
+    """
+    Helper function for :func:`main`. Consume songs (local or downloaded
+    files) from a queue, compute their file hashes, and put those whose
+    files aren't already in the database into the output queue (e.g., the
+    fingerprint queue). File hashes are looked up in batches of up to
+    ``batch_size`` songs (see :func:`_get_batch`) and kept in the song dicts
+    (``filehash`` key), so files aren't hashed again when they're
+    fingerprinted.
+    """
+    seen = set()
+    done = False
+    while not done:
+        songs, done = await _get_batch(
+            in_queue, loop, batch_size, batch_timeout
+        )
+        if not songs:
+            continue
+
+        songs = await asyncio.gather(
+            *[_hash_song(song, loop, executor) for song in songs]
+        )
+        songs = await _skip_existing(
+            songs, "filehash", loop, executor, db_kwargs, seen, skipped
+        )
+        for song in songs:
+            await out_queue.put(song)
+    await out_queue.put(None)
 
 
 def main(
     inputs, add_to_database=False, conf_thresh=0.01, out_fpath=None,
-    max_processes=None, max_threads=None, **kwargs
+    max_processes=None, max_threads=None, skip_existing=True, shard_dir=None,
+    **kwargs
 ):
     """
     Fingerprint local files and/or the audio from videos on any number of
-    YouTube channels, and either add the songs to a database or match them
-    against existing songs in the database.
+    YouTube channels, and either add the songs to a database, match them
+    against existing songs in the database, or write them to shard files to
+    be loaded into a database later.
 
     Args:
         inputs (List[str]): List of input YouTube channel/user URLs and/or
@@ -201,17 +1276,35 @@ def main(
         max_threads (int): Maximum number of threads to spawn for concurrent
             tasks and downloads. Defaults to the maximum defined in
             `concurrent.futures.ThreadPoolExecutor`_.
+        skip_existing (bool): If ``add_to_database=True``, skip videos whose
+            YouTube ids are already in the database before downloading them
+            and skip files whose file hashes are already in the database
+            before fingerprinting them (as well as duplicates among the
+            inputs).
+        shard_dir (str): If provided, songs and their fingerprints are
+            written to shard files in this directory (see
+            :func:`youtube_audio_matcher.database.write_shards`) instead of
+            being added to or matched against the database, which isn't
+            accessed (``add_to_database`` and ``skip_existing`` are
+            ignored). ``shard_rows`` and ``shard_timeout`` are passed to
+            :func:`youtube_audio_matcher.database.write_shards`.
         **kwargs: Any keyword arguments for
             :class:`youtube_audio_matcher.database.Database`,
             :func:`youtube_audio_matcher.download.download_channels`,
-            and :func:`youtube_audio_matcher.audio.fingerprint_songs`.
+            :func:`youtube_audio_matcher.audio.fingerprint_songs`, and
+            :func:`match_songs`, as well as ``ingest_batch_rows`` and
+            ``ingest_batch_timeout``, which are passed to
+            :func:`youtube_audio_matcher.database.update_database` as
+            ``batch_rows`` and ``batch_timeout``. ``async_db`` is passed to
+            both :func:`youtube_audio_matcher.database.update_database` and
+            :func:`match_songs`.
 
     Returns:
         List[dict]|None: matches
-            If ``add_to_database=True``, a list of dicts returned by
-            :func:`match_fingerprints`, where each dict corresponds to a song
-            with a match in the database. If ``add_to_database=False``,
-            ``None``.
+            If ``add_to_database=False`` (and ``shard_dir`` isn't provided),
+            a list of dicts returned by :func:`match_fingerprints`, where
+            each dict corresponds to a song with a match in the database.
+            Otherwise, ``None``.
 
     .. _`concurrent.futures.ThreadPoolExecutor`:
         https://docs.python.org/3/library/concurrent.futures.html#concurrent.futures.ThreadPoolExecutor
@@ -241,6 +1334,29 @@ def main(
             )
             urls.append(inp)
 
+    # Keyword args for database and database functions/tasks.
+    db_kwargs = {k: v for k, v in kwargs.items() if k in _DB_KEYS}
+
+    # Keyword args for fingerprint-related functions/task, which also
+    # determine whether files are deleted after fingerprinting.
+    fingerprint_kwargs = {
+        k: v for k, v in kwargs.items()
+        if k in _FINGERPRINT_KEYS or k == "delete"
+    }
+
+    if shard_dir is not None:
+        add_to_database = False
+
+    # Check which database songs can be matched once, before fingerprinting,
+    # rather than for each batch.
+    profile_id = None
+    if shard_dir is None and not add_to_database:
+        db = yam.database.Database(**db_kwargs)
+        try:
+            profile_id = get_match_profile_id(db, fingerprint_kwargs)
+        finally:
+            db.session.close()
+
     if not max_processes:
         max_processes = multiprocessing.cpu_count()
 
@@ -262,15 +1378,32 @@ def main(
     # List of all async tasks to run.
     tasks = []
 
-    # Keyword args for database and database functions/tasks.
-    db_keys = [
-        "db_name", "dialect", "driver", "host", "password", "port", "user"
-    ]
-    db_kwargs = {k: v for k, v in kwargs.items() if k in db_keys}
+    # Number of videos/files skipped because they're already in the database.
+    skipped = collections.Counter()
+
+    # Queue to which local files and downloaded files are added. If skipping
+    # songs that are already in the database, files are hashed and filtered
+    # before being added to the fingerprint queue.
+    file_queue = fingerprint_queue
+    video_filter = None
+    skip_existing = add_to_database and skip_existing
+    if skip_existing:
+        file_queue = asyncio.Queue()
+        tasks.append(
+            _skip_existing_files(
+                loop, thread_pool, db_kwargs, file_queue, fingerprint_queue,
+                skipped
+            )
+        )
+        video_filter = functools.partial(
+            _skip_existing, column="youtube_id", loop=loop,
+            executor=thread_pool, db_kwargs=db_kwargs, seen=set(),
+            skipped=skipped
+        )
 
     # Add local files, if any, to fingerprint queue.
     for file_ in files:
-        fingerprint_queue.put_nowait(
+        file_queue.put_nowait(
             {
                 "youtube_id": None,
                 "title": None,
@@ -286,7 +1419,7 @@ def main(
     # This internally signifies to the async functions that no more items will
     # be added to the queue (else, async functions wait forever and hang).
     if files and not urls:
-        fingerprint_queue.put_nowait(None)
+        file_queue.put_nowait(None)
 
     # TODO: what happens if both files and urls but none of the URLs are valid?
 
@@ -306,22 +1439,11 @@ def main(
         # Tasks for the async pipeline: 1) task for getting video metadata from
         # YouTube channels and 2) task for downloading videos.
         get_videos_task, download_task = yam.download.download_channels(
-            loop, urls, executor=thread_pool,
-            out_queue=fingerprint_queue, **download_kwargs
+            loop, urls, executor=thread_pool, out_queue=file_queue,
+            video_filter=video_filter, **download_kwargs
         )
         tasks.extend([get_videos_task, download_task])
 
-    # Keyword args for fingerprint-related functions/task.
-    fingerprint_keys = [
-        "win_size", "win_overlap_ratio", "spectrogram_backend",
-        "filter_connectivity", "filter_dilation", "erosion_iterations",
-        "min_amplitude", "fanout", "min_time_delta", "max_time_delta",
-        "hash_length", "time_bin_size", "freq_bin_size", "delete",
-    ]
-    fingerprint_kwargs = {
-        k: v for k, v in kwargs.items() if k in fingerprint_keys
-    }
-
     # Add fingerprint task to the task list.
     fingerprint_task = yam.audio.fingerprint_songs(
         loop=loop, executor=proc_pool, in_queue=fingerprint_queue,
@@ -329,21 +1451,60 @@ def main(
     )
     tasks.append(fingerprint_task)
 
-    if add_to_database:
+    if shard_dir is not None:
+        shard_keys = ["shard_rows", "shard_timeout"]
+        shard_kwargs = {
+            k: v for k, v in kwargs.items()
+            if k in shard_keys and v is not None
+        }
+        write_shards_task = yam.database.write_shards(
+            loop, proc_pool, db_queue, shard_dir,
+            fingerprint_params=yam.audio.fingerprint_params(
+                **fingerprint_kwargs
+            ),
+            **shard_kwargs
+        )
+        tasks.append(write_shards_task)
+    elif add_to_database:
+        # Keyword args for the database writer task.
+        ingest_keys = ["ingest_batch_rows", "ingest_batch_timeout"]
+        ingest_kwargs = {
+            k[len("ingest_"):]: v for k, v in kwargs.items()
+            if k in ingest_keys and v is not None
+        }
+        ingest_kwargs["async_db"] = kwargs.get("async_db", False)
+
         update_db_task = yam.database.update_database(
-            loop, proc_pool, db_kwargs, in_queue=db_queue
+            loop, proc_pool, db_kwargs, in_queue=db_queue,
+            fingerprint_params=yam.audio.fingerprint_params(
+                **fingerprint_kwargs
+            ),
+            **ingest_kwargs
         )
         tasks.append(update_db_task)
     else:
+        # Keyword args for matching-related functions/task.
+        match_keys = _MATCH_KEYS + ["async_db", "batch_size", "batch_timeout"]
+        match_kwargs = {k: v for k, v in kwargs.items() if k in match_keys}
+        match_kwargs["fingerprint_kwargs"] = fingerprint_kwargs
+
+        match_kwargs["profile_id"] = profile_id
+
         match_task = match_songs(
-            loop, proc_pool, db_kwargs, in_queue=db_queue
+            loop, proc_pool, db_kwargs, in_queue=db_queue, **match_kwargs
         )
         tasks.append(match_task)
 
     task_group = asyncio.gather(*tasks)
     loop.run_until_complete(task_group)
 
-    if not add_to_database:
+    if skip_existing:
+        logging.info(
+            f"Skipped {skipped['youtube_id']} videos and "
+            f"{skipped['filehash']} files already in database"
+        )
+
+    if shard_dir is None and not add_to_database:
         matches = []
         for matched_song in task_group.result()[-1]:
             if (
@@ -0,0 +1,360 @@
+from concurrent.futures import ProcessPoolExecutor
+import http.server
+import json
+import logging
+import multiprocessing
+import os
+import socketserver
+import threading
+import time
+
+import youtube_audio_matcher as yam
+from .main import _DB_KEYS, _FINGERPRINT_KEYS, _MATCH_KEYS
+
+# Database connection kept open by each worker process of the server process
+# pool (see _init_worker).
+_db = None
+
+
+def _init_worker(db_kwargs):
+    """
+    Process pool initializer. Opens a database connection once per worker
+    process so that engine creation, ``create_all``, and schema checks
+    aren't repeated for every request.
+    """
+    global _db
+    _db = yam.database.Database(**db_kwargs)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _fingerprint_request(song, fingerprint_kwargs):
+    """
+    Helper function for :func:`_match_request` and :func:`_add_request`.
+    Fingerprint the file referred to by a request (if the request doesn't
+    already contain fingerprints).
+    """
+    song.setdefault("path", None)
+    if song.get("fingerprints") is not None:
+        return song
+
+    if not song.get("path"):
+        raise ValueError("Request must contain a path or fingerprints")
+    if not os.path.isfile(song["path"]):
+        raise ValueError(f"File {song['path']} not found")
+
+    hashes, filehash, stats = yam.audio.fingerprint_from_file(
+        song["path"], return_stats=True, **fingerprint_kwargs
+    )
+    song["fingerprints"] = hashes
+    song["filehash"] = filehash
+    song["num_peaks"] = stats["num_peaks"]
+    if song.get("duration") is None:
+        song["duration"] = stats["duration"]
+    return song
+
+
+def _match_request(song, fingerprint_kwargs, match_kwargs):
+    """
+    Run in a worker process. Fingerprint (if necessary) and match a song
+    against the database using the worker's database connection.
+    """
+    song = _fingerprint_request(song, fingerprint_kwargs)
+    try:
+        return yam.match_fingerprints_batch(
+            [song], None, db=_db, **match_kwargs
+        )[0]
+    finally:
+        # Return the connection to the engine's pool and end the transaction
+        # so subsequent requests see new data.
+        _db.session.close()
+
+
+def _add_request(song, fingerprint_kwargs):
+    """
+    Run in a worker process. Fingerprint (if necessary) and add a song and
+    its fingerprints to the database using the worker's database connection.
+    Songs fingerprinted by the server are tagged with the server's
+    fingerprint profile; the profile of fingerprints included in the request
+    is unknown.
+    """
+    fingerprinted = song.get("fingerprints") is None
+    song = _fingerprint_request(song, fingerprint_kwargs)
+    try:
+        profile_id = None
+        if fingerprinted:
+            profile_id = _db.get_profile_id(
+                yam.audio.fingerprint_params(**fingerprint_kwargs)
+            )
+        song["id"] = _db.add_song(
+            duration=song.get("duration"), filepath=song.get("path"),
+            filehash=song.get("filehash"), title=song.get("title"),
+            youtube_id=song.get("youtube_id"), num_peaks=song.get("num_peaks"),
+            profile_id=profile_id
+        )
+        _db.add_fingerprints(song["id"], song["fingerprints"])
+    finally:
+        _db.session.close()
+    song["num_fingerprints"] = len(song["fingerprints"])
+    del song["fingerprints"]
+    return song
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Handles requests to a :class:`MatchServer`. See :func:`serve`.
+    """
+
+    def address_string(self):
+        # Unix socket clients don't have an address.
+        if not self.client_address:
+            return self.server.server_address
+        return super().address_string()
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        match_server = self.server.match_server
+        routes = {"/add": match_server.add, "/match": match_server.match}
+        if self.path not in routes:
+            self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("Request body must be a JSON object")
+        except ValueError as e:
+            self._send_json(400, {"error": f"Invalid request: {e}"})
+            return
+
+        if not match_server.semaphore.acquire(blocking=False):
+            self._send_json(
+                503, {"error": "Max number of concurrent requests reached"}
+            )
+            return
+
+        try:
+            start_t = time.time()
+            result = routes[self.path](request)
+            elapsed = time.time() - start_t
+            logging.info(
+                f"{self.path} {request.get('path')} ({elapsed:.3f} s)"
+            )
+            self._send_json(200, result)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            logging.exception(f"Error handling {self.path} request")
+            self._send_json(500, {"error": str(e)})
+        finally:
+            match_server.semaphore.release()
+
+
+class _ThreadingUnixHTTPServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+
+
+class MatchServer:
+    """
+    Long-running match server that keeps a process pool (each of whose
+    worker processes holds an open database connection) warm between
+    requests, so that request latency reflects only fingerprinting and
+    matching. Requests are accepted over a local HTTP or Unix socket API;
+    see :func:`serve`.
+    """
+
+    def __init__(
+        self, db_kwargs, server_host="127.0.0.1", server_port=8000,
+        socket_path=None, max_processes=None, max_requests=None,
+        conf_thresh=0.01, fingerprint_kwargs=None, match_kwargs=None
+    ):
+        """
+        Args:
+            db_kwargs (dict): Keyword arguments for instantiating a
+                :class:`youtube_audio_matcher.database.Database` class
+                instance.
+            server_host (str): Host on which to listen for HTTP requests.
+            server_port (int): Port on which to listen for HTTP requests.
+            socket_path (str): Path to a Unix socket on which to listen for
+                requests instead of ``server_host`` and ``server_port``.
+            max_processes (int): Number of worker processes. Defaults to the
+                number of available CPUs.
+            max_requests (int): Max number of requests processed
+                concurrently; additional requests receive a 503 response.
+                Defaults to ``2 * max_processes``.
+            conf_thresh (float): Match confidence threshold; see
+                :func:`youtube_audio_matcher.main`.
+            fingerprint_kwargs (dict): Keyword arguments for
+                :func:`youtube_audio_matcher.audio.fingerprint_from_file`.
+            match_kwargs (dict): Keyword arguments for
+                :func:`youtube_audio_matcher.match_fingerprints_batch`.
+        """
+        if not max_processes:
+            max_processes = multiprocessing.cpu_count()
+        if not max_requests:
+            max_requests = 2 * max_processes
+
+        self.conf_thresh = conf_thresh
+        self.fingerprint_kwargs = fingerprint_kwargs or {}
+        self.match_kwargs = match_kwargs or {}
+        self.semaphore = threading.BoundedSemaphore(max_requests)
+
+        # Use spawn (see youtube_audio_matcher.main) and start all worker
+        # processes (and their database connections) up front.
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(db_kwargs,)
+        )
+        pings = [self.executor.submit(_ping) for _ in range(max_processes)]
+        for ping in pings:
+            ping.result()
+
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self.httpd = _ThreadingUnixHTTPServer(socket_path, _RequestHandler)
+        else:
+            self.httpd = http.server.ThreadingHTTPServer(
+                (server_host, server_port), _RequestHandler
+            )
+        self.httpd.match_server = self
+        self.socket_path = socket_path
+
+    def match(self, request):
+        """
+        Match a song against the database.
+
+        Args:
+            request (dict): Song dict containing either a ``path`` key (path
+                to an audio file to be fingerprinted) or a ``fingerprints``
+                key (list of hash/offset pairs), as well as any other song
+                metadata.
+
+        Returns:
+            dict: song
+                The song dict returned by
+                :func:`youtube_audio_matcher.match_fingerprints`. The
+                ``matching_song`` and ``match_stats`` keys are removed if the
+                match confidence doesn't exceed ``conf_thresh``.
+        """
+        song = self.executor.submit(
+            _match_request, request, self.fingerprint_kwargs,
+            self.match_kwargs
+        ).result()
+
+        if (
+            "match_stats" in song
+            and song["match_stats"]["confidence"] <= self.conf_thresh
+        ):
+            del song["matching_song"], song["match_stats"]
+        return song
+
+    def add(self, request):
+        """
+        Add a song and its fingerprints to the database.
+
+        Args:
+            request (dict): See :meth:`match`.
+
+        Returns:
+            dict: song
+                The input song dict with its database ``id`` and
+                ``num_fingerprints`` (the ``fingerprints`` key is deleted).
+        """
+        return self.executor.submit(
+            _add_request, request, self.fingerprint_kwargs
+        ).result()
+
+    def serve_forever(self):
+        """
+        Handle requests until interrupted, then shut down the server.
+        """
+        if self.socket_path is not None:
+            logging.info(f"Listening on {self.socket_path}")
+        else:
+            host, port = self.httpd.server_address[:2]
+            logging.info(f"Listening on http://{host}:{port}")
+
+        try:
+            self.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        self.httpd.server_close()
+        self.executor.shutdown()
+        if self.socket_path is not None and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def serve(
+    server_host="127.0.0.1", server_port=8000, socket_path=None,
+    max_processes=None, max_requests=None, conf_thresh=0.01, **kwargs
+):
+    """
+    Run a :class:`MatchServer` until interrupted. The server accepts the
+    following requests, each of which returns a JSON object:
+
+    - ``GET /health``: Returns ``{"status": "ok"}``.
+    - ``POST /match``: Match a song against the database. The JSON request
+      body is a song dict containing either a ``path`` (to an audio file on
+      the server's machine) or ``fingerprints`` (a list of ``[hash, offset]``
+      pairs); see :meth:`MatchServer.match`.
+    - ``POST /add``: Add a song to the database. The request body is the same
+      as for ``/match``; see :meth:`MatchServer.add`.
+
+    Invalid requests receive a 400 response and requests received while
+    ``max_requests`` requests are already being processed receive a 503
+    response, each with an ``error`` key describing the error.
+
+    Args:
+        server_host (str): See :class:`MatchServer`.
+        server_port (int): See :class:`MatchServer`.
+        socket_path (str): See :class:`MatchServer`.
+        max_processes (int): See :class:`MatchServer`.
+        max_requests (int): See :class:`MatchServer`.
+        conf_thresh (float): See :class:`MatchServer`.
+        **kwargs: Any keyword arguments for
+            :class:`youtube_audio_matcher.database.Database`,
+            :func:`youtube_audio_matcher.audio.fingerprint_from_file`, and
+            :func:`youtube_audio_matcher.match_fingerprints_batch`.
+    """
+    db_kwargs = {k: v for k, v in kwargs.items() if k in _DB_KEYS}
+    fingerprint_kwargs = {
+        k: v for k, v in kwargs.items() if k in _FINGERPRINT_KEYS
+    }
+    match_kwargs = {k: v for k, v in kwargs.items() if k in _MATCH_KEYS}
+    match_kwargs["fingerprint_kwargs"] = fingerprint_kwargs
+
+    match_server = MatchServer(
+        db_kwargs, server_host=server_host, server_port=server_port,
+        socket_path=socket_path,
+        max_processes=max_processes, max_requests=max_requests,
+        conf_thresh=conf_thresh, fingerprint_kwargs=fingerprint_kwargs,
+        match_kwargs=match_kwargs
+    )
+    match_server.serve_forever()